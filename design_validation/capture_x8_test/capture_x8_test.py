@@ -1,5 +1,6 @@
 import argparse
 import pathlib
+import random
 import sys
 from capturetest import CaptureTest
 
@@ -37,8 +38,12 @@ if __name__ == "__main__":
     parser.add_argument('--server-ipaddr')
     parser.add_argument('--labrad', action='store_true')
     parser.add_argument('--result-dir')
+    parser.add_argument('--seed', type=int)
     args = parser.parse_args()
 
+    if args.seed is not None:
+        random.seed(args.seed)
+
     num_tests = 10
     if args.num_tests is not None:
         num_tests = int(args.num_tests)
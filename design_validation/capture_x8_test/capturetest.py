@@ -7,7 +7,6 @@ from testutil import gen_random_int_list
 lib_path = str(pathlib.Path(__file__).resolve().parents[2])
 sys.path.append(lib_path)
 from e7awgsw import CaptureModule, AWG, AwgCtrl, CaptureCtrl, WaveSequence, CaptureParam
-from e7awgsw.labrad import RemoteAwgCtrl, RemoteCaptureCtrl
 
 class CaptureTest(object):
 
@@ -120,12 +119,15 @@ class CaptureTest(object):
 
     def __create_awg_ctrl(self):
         if self.__use_labrad:
+            # LabRAD を使わない場合 (エミュレータでのテストなど) は pylabrad を不要にするため, ここで読み込む
+            from e7awgsw.labrad import RemoteAwgCtrl
             return RemoteAwgCtrl(self.__server_ip_addr, self.__ip_addr)
         else:
             return AwgCtrl(self.__ip_addr)
 
     def __create_cap_ctrl(self):
         if self.__use_labrad:
+            from e7awgsw.labrad import RemoteCaptureCtrl
             return RemoteCaptureCtrl(self.__server_ip_addr, self.__ip_addr)
         else:
             return CaptureCtrl(self.__ip_addr)
@@ -8,13 +8,13 @@ lib_path = str(pathlib.Path(__file__).resolve().parents[2])
 sys.path.append(lib_path)
 from e7awgsw import CaptureModule, DspUnit
 
-def main(num_tests, ip_addr, capture_modules, use_labrad, server_ip_addr, only_all):
-    random.seed(10)
+def main(num_tests, ip_addr, capture_modules, use_labrad, server_ip_addr, only_all, res_root_dir, seed):
+    random.seed(seed)
 
     failed_tests = []
     for test_id in range(num_tests):
         print("---- test {:03d} / {:03d} ----".format(test_id, num_tests - 1))
-        res_dir = 'result/{:03d}'.format(test_id)
+        res_dir = '{}/{:03d}'.format(res_root_dir, test_id)
         test = CaptureTestDsp(res_dir, ip_addr, capture_modules, use_labrad, server_ip_addr)
 
         if not only_all:
@@ -97,8 +97,10 @@ def main(num_tests, ip_addr, capture_modules, use_labrad, server_ip_addr, only_a
     if failed_tests:
         for test_id in failed_tests:
             print("Test {} failed.".format(test_id))
+        return 1
     else:
         print("All tests succeeded.".format(failed_tests))
+        return 0
 
 
 if __name__ == "__main__":
@@ -109,6 +111,8 @@ if __name__ == "__main__":
     parser.add_argument('--server-ipaddr')
     parser.add_argument('--labrad', action='store_true')
     parser.add_argument('--only-all', action='store_true')
+    parser.add_argument('--result-dir', default='result')
+    parser.add_argument('--seed', type=int, default=10)
     args = parser.parse_args()
 
     num_tests = 1
@@ -127,10 +131,14 @@ if __name__ == "__main__":
     if args.server_ipaddr is not None:
         server_ip_addr = args.server_ipaddr
 
-    main(
+    status = main(
         num_tests,
         ip_addr,
         capture_modules,
         args.labrad,
         server_ip_addr,
-        args.only_all)
+        args.only_all,
+        args.result_dir,
+        args.seed)
+
+    sys.exit(status)
@@ -9,8 +9,7 @@ lib_path = str(pathlib.Path(__file__).resolve().parents[2])
 sys.path.append(lib_path)
 from e7awgsw import AWG, AwgCtrl, WaveSequence
 from e7awgsw import CaptureModule, CaptureCtrl, CaptureParam, DspUnit, CaptureUnit, DecisionFunc
-from e7awgsw.labrad import RemoteAwgCtrl, RemoteCaptureCtrl
-from emulator.dspmodule import dsp
+from e7awgsw.dspmodel import dsp, to_capture_data
 
 class CaptureTestDsp(object):
 
@@ -165,8 +164,8 @@ class CaptureTestDsp(object):
             for cap_unit_id in CaptureModule.get_units(capmod_id):
                 if cap_unit_id in capture_unit_to_capture_param.keys():
                     param = capture_unit_to_capture_param[cap_unit_id]
-                    samples = wave_seq.all_samples(False)
-                    capture_unit_to_exp_data[cap_unit_id] = dsp(samples, param)
+                    samples = wave_seq.all_sample_array(False)
+                    capture_unit_to_exp_data[cap_unit_id] = to_capture_data(dsp(samples, param))
         return capture_unit_to_exp_data        
 
     def __set_capture_params(self, cap_ctrl, *dsp_units):
@@ -182,12 +181,15 @@ class CaptureTestDsp(object):
 
     def __create_awg_ctrl(self):
         if self.__use_labrad:
+            # LabRAD を使わない場合 (エミュレータでのテストなど) は pylabrad を不要にするため, ここで読み込む
+            from e7awgsw.labrad import RemoteAwgCtrl
             return RemoteAwgCtrl(self.__server_ip_addr, self.__ip_addr)
         else:
             return AwgCtrl(self.__ip_addr)
 
     def __create_cap_ctrl(self):
         if self.__use_labrad:
+            from e7awgsw.labrad import RemoteCaptureCtrl
             return RemoteCaptureCtrl(self.__server_ip_addr, self.__ip_addr)
         else:
             return CaptureCtrl(self.__ip_addr)
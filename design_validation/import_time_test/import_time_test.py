@@ -0,0 +1,83 @@
+import argparse
+import sys
+import os
+import pathlib
+import statistics
+import subprocess
+
+lib_path = str(pathlib.Path(__file__).resolve().parents[2])
+
+
+def measure_import_time(stmt):
+    """新しいプロセスで stmt を python -X importtime 付きで実行し, インポートされたモジュールごとの時間を返す
+
+    Returns:
+        list of (str, int, int, int):
+            | (モジュール名, ネストの深さ, 自身のインポート時間 [us], 依存モジュールを含むインポート時間 [us]) のリスト
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([lib_path] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', stmt],
+        env = env,
+        stdout = subprocess.DEVNULL,
+        stderr = subprocess.PIPE,
+        universal_newlines = True,
+        check = True)
+
+    records = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue # ヘッダ行
+        # モジュール名の前の空白 2 つがネスト 1 段分
+        depth = (len(fields[2]) - len(fields[2].lstrip()) - 1) // 2
+        records.append((fields[2].strip(), depth, int(fields[0]), int(fields[1])))
+    return records
+
+
+def main(stmt, num_runs, num_slowest, max_time):
+    # インタプリタの起動時にインポートされるモジュールは測定対象から除く
+    startup_modules = {name for name, _, _, _ in measure_import_time('pass')}
+    total_times = []
+    module_to_self_times = {}
+    for _ in range(num_runs):
+        records = [record for record in measure_import_time(stmt) if record[0] not in startup_modules]
+        total_times.append(sum(cumulative for _, depth, _, cumulative in records if depth == 0))
+        for name, _, self_time, _ in records:
+            module_to_self_times.setdefault(name, []).append(self_time)
+
+    total_time = statistics.median(total_times) / 1e3
+    print('statement : {}'.format(stmt))
+    print('import time (median of {} runs) : {:.2f} ms  (min {:.2f} ms, max {:.2f} ms)'.format(
+        num_runs, total_time, min(total_times) / 1e3, max(total_times) / 1e3))
+
+    module_to_self_time = {
+        name : statistics.median(times) / 1e3 for name, times in module_to_self_times.items()}
+    print('\n---- slowest modules (self time) ----')
+    for name, self_time in sorted(
+        module_to_self_time.items(), key = lambda item: item[1], reverse = True)[:num_slowest]:
+        print('{:8.2f} ms  {}'.format(self_time, name))
+
+    lib_modules = sorted(name for name in module_to_self_time if name.split('.')[0] == 'e7awgsw')
+    print('\n---- imported e7awgsw modules ----')
+    print('\n'.join(lib_modules))
+    print('\nnumpy imported : {}'.format('numpy' in module_to_self_time))
+
+    if (max_time is not None) and (total_time > max_time):
+        print('\nThe import time exceeded {:.2f} ms.'.format(max_time))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stmt', default='import e7awgsw', help='statement whose import time is measured')
+    parser.add_argument('--num-runs', type=int, default=5, help='number of processes to measure')
+    parser.add_argument('--show-slowest', type=int, default=10, help='number of the slowest modules to show')
+    parser.add_argument('--max-time', type=float, default=None, help='fail if the median import time exceeds this [ms]')
+    args = parser.parse_args()
+
+    sys.exit(main(args.stmt, max(1, args.num_runs), args.show_slowest, args.max_time))
@@ -9,9 +9,8 @@ lib_path = str(pathlib.Path(__file__).resolve().parents[2])
 sys.path.append(lib_path)
 from e7awgsw import AWG, AwgCtrl, WaveSequence
 from e7awgsw import DspUnit, CaptureUnit, CaptureModule, DecisionFunc, CaptureCtrl, CaptureParam
-from e7awgsw.labrad import RemoteAwgCtrl, RemoteCaptureCtrl
 from e7awgsw import hwparam
-from emulator.dspmodule import classification, fixed_to_float
+from e7awgsw.dspmodel import classification, fixed_to_float
 
 class CaptureTest(object):
 
@@ -135,17 +134,12 @@ class CaptureTest(object):
     def __calc_expected_capture_data(self, samples, capture_param):
         """キャプチャユニットに samples を入力したときのキャプチャデータを算出する"""
         if DspUnit.CLASSIFICATION in capture_param.dsp_units_enabled:
-            i_samples = []
-            q_samples = []
-            for i_sample, q_sample in samples:
-                i_samples.append(fixed_to_float(i_sample, 0))
-                q_samples.append(fixed_to_float(q_sample, 0))
-
+            samples = np.asarray(samples, dtype = np.int64)
             return classification(
-                i_samples,
-                q_samples,
+                fixed_to_float(samples[:, 0], 0),
+                fixed_to_float(samples[:, 1], 0),
                 capture_param.get_decision_func_params(DecisionFunc.U0),
-                capture_param.get_decision_func_params(DecisionFunc.U1))
+                capture_param.get_decision_func_params(DecisionFunc.U1)).tolist()
         
         return [(float(i_data), float(q_data)) for i_data, q_data in samples]
 
@@ -163,12 +157,15 @@ class CaptureTest(object):
 
     def __create_awg_ctrl(self):
         if self.__use_labrad:
+            # LabRAD を使わない場合 (エミュレータでのテストなど) は pylabrad を不要にするため, ここで読み込む
+            from e7awgsw.labrad import RemoteAwgCtrl
             return RemoteAwgCtrl(self.__server_ip_addr, self.__ip_addr)
         else:
             return AwgCtrl(self.__ip_addr)
 
     def __create_cap_ctrl(self):
         if self.__use_labrad:
+            from e7awgsw.labrad import RemoteCaptureCtrl
             return RemoteCaptureCtrl(self.__server_ip_addr, self.__ip_addr)
         else:
             return CaptureCtrl(self.__ip_addr)
@@ -4,8 +4,8 @@ import sys
 from capturetest import CaptureTest
 
 
-def main(num_tests, ip_addr, use_labrad, server_ip_addr, res_root_dir):
-    random.seed(10)
+def main(num_tests, ip_addr, use_labrad, server_ip_addr, res_root_dir, seed):
+    random.seed(seed)
 
     failed_tests = []
     for test_id in range(num_tests):
@@ -39,6 +39,7 @@ if __name__ == "__main__":
     parser.add_argument('--server-ipaddr')
     parser.add_argument('--labrad', action='store_true')
     parser.add_argument('--result-dir')
+    parser.add_argument('--seed', type=int, default=10)
     args = parser.parse_args()
 
     num_tests = 1
@@ -62,6 +63,7 @@ if __name__ == "__main__":
         ip_addr,
         args.labrad,
         server_ip_addr,
-        res_root_dir)
+        res_root_dir,
+        args.seed)
 
     sys.exit(status)
@@ -0,0 +1,335 @@
+import argparse
+import sys
+import os
+import csv
+import time
+import queue
+import pathlib
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+lib_path = str(pathlib.Path(__file__).resolve().parents[1])
+sys.path.append(lib_path)
+from e7awgsw import CaptureModule
+
+VALIDATION_DIR = pathlib.Path(__file__).resolve().parent
+EMULATOR_SCRIPT = VALIDATION_DIR.parent / 'emulator' / 'emulator.py'
+# 1 つのテストのタイムアウトのデフォルト値 [s].
+# エミュレータでは max_capture_test と capture_x8_test_dsp (1 モジュールあたり 150 ~ 170 s) の実行時間が長い.
+DEFAULT_TIMEOUT = 900
+
+
+class TestSuite(object):
+    """design_validation 以下のテストスクリプト 1 つ分の情報
+
+    Args:
+        name (str): テストスイート名 (= スクリプトのあるディレクトリ名)
+        script (str): テストスクリプトのファイル名
+        per_capture_module (bool): キャプチャモジュールごとにテストケースを分けるかどうか
+        on_emulator (bool): エミュレータでテストできるかどうか
+        args (list of str): スクリプトに渡す追加の引数
+    """
+
+    def __init__(self, name, script, per_capture_module, on_emulator, args = ()):
+        self.name = name
+        self.script = VALIDATION_DIR / name / script
+        self.per_capture_module = per_capture_module
+        self.on_emulator = on_emulator
+        self.args = list(args)
+
+
+SUITES = {
+    suite.name : suite for suite in [
+        TestSuite('capture_x8_test', 'capture_x8_test.py', True, True),
+        TestSuite('capture_x8_test_dsp', 'capture_x8_test_dsp.py', True, True),
+        TestSuite('max_capture_test', 'max_capture_test.py', False, True),
+        # エミュレータはシーケンサを持たないので, シーケンサのテストは実機でのみ行う
+        TestSuite('sequencer_test', 'sequencer_test.py', True, False),
+    ]
+}
+
+
+class TestCase(object):
+    """テストスクリプトを 1 回実行する単位.  1 つのテストケースは 1 つのプロセスで実行される."""
+
+    def __init__(self, suite, test_id, seed, capture_module = None):
+        self.suite = suite
+        self.test_id = test_id
+        self.seed = seed
+        self.capture_module = capture_module
+        self.elapsed = None
+        self.status = None
+
+
+    @property
+    def name(self):
+        name = '{}/{:03d}'.format(self.suite.name, self.test_id)
+        if self.capture_module is not None:
+            name += '/module_{}'.format(int(self.capture_module))
+        return name
+
+
+    def command(self, target, res_dir):
+        cmd = [
+            sys.executable, str(self.suite.script),
+            '--num-tests=1',
+            '--seed={}'.format(self.seed),
+            '--result-dir={}'.format(res_dir),
+            '--ipaddr={}'.format(target.ip_addr)]
+        if self.capture_module is not None:
+            cmd.append('--capture-module={}'.format(int(self.capture_module)))
+        if target.seq_ip_addr is not None and self.suite.name == 'sequencer_test':
+            cmd.append('--seq-ipaddr={}'.format(target.seq_ip_addr))
+        return cmd + self.suite.args
+
+
+class Target(object):
+    """テストケースの実行先 (実機 or エミュレータ)"""
+
+    def __init__(self, ip_addr, seq_ip_addr = None):
+        self.ip_addr = ip_addr
+        self.seq_ip_addr = seq_ip_addr
+
+
+    def start(self):
+        pass
+
+
+    def stop(self):
+        pass
+
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+
+class EmulatorTarget(Target):
+    """テストケースの実行先となるエミュレータ.
+
+    | e7awg_hw の UDP ポート番号は固定なので, エミュレータごとに異なるループバックアドレス (127.0.0.x) を割り当てる.
+    | 127.0.0.1 以外のループバックアドレスが使えない OS では, 同時に 1 つのエミュレータしか起動できない.
+    """
+
+    START_TIMEOUT = 30 # エミュレータの起動を待つ時間 [s]
+
+    def __init__(self, ip_addr, log_dir, emulator_args = ()):
+        super().__init__(ip_addr)
+        self.__log_dir = pathlib.Path(log_dir)
+        self.__emulator_args = list(emulator_args)
+        self.__proc = None
+        self.__log_file = None
+
+
+    def start(self):
+        self.__log_dir.mkdir(parents = True, exist_ok = True)
+        log_path = self.__log_dir / 'emulator.txt'
+        self.__log_file = open(log_path, 'w')
+        self.__proc = subprocess.Popen(
+            [sys.executable, str(EMULATOR_SCRIPT), '--ipaddr={}'.format(self.ip_addr)] + self.__emulator_args,
+            cwd = self.__log_dir,
+            stdin = subprocess.PIPE,
+            stdout = self.__log_file,
+            stderr = subprocess.STDOUT)
+
+        deadline = time.monotonic() + self.START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.__proc.poll() is not None:
+                break
+            if 'The emulator has been started.' in log_path.read_text():
+                return
+            time.sleep(0.1)
+        self.stop()
+        raise RuntimeError('Failed to start the emulator at {}.  See {}'.format(self.ip_addr, log_path))
+
+
+    def stop(self):
+        if self.__proc is None:
+            return
+        try:
+            # エミュレータは Enter の入力で終了する
+            self.__proc.communicate(b'\n', timeout = 5)
+        except (subprocess.TimeoutExpired, BrokenPipeError, ValueError):
+            self.__proc.kill()
+            self.__proc.wait()
+        self.__log_file.close()
+        self.__proc = None
+
+
+def gen_test_cases(suites, num_tests, capture_modules, base_seed):
+    """テストケースを作る.  test_id が同じテストケースは同じ乱数シードを使う."""
+    test_cases = []
+    for suite in suites:
+        for test_id in range(num_tests):
+            seed = base_seed + test_id
+            if suite.per_capture_module:
+                test_cases += [TestCase(suite, test_id, seed, cap_mod) for cap_mod in capture_modules]
+            else:
+                test_cases.append(TestCase(suite, test_id, seed))
+    return test_cases
+
+
+def run_test_case(test_case, targets, res_root_dir, timeout, print_lock):
+    """空いているターゲットを 1 つ取り出して test_case を実行する"""
+    target = targets.get()
+    try:
+        res_dir = pathlib.Path(res_root_dir, test_case.name).resolve()
+        res_dir.mkdir(parents = True, exist_ok = True)
+        start = time.perf_counter()
+        with open(res_dir / 'stdout.txt', 'w') as out:
+            try:
+                # テストスクリプトが出力するログファイルが混ざらないように, 結果ディレクトリで実行する
+                proc = subprocess.run(
+                    test_case.command(target, res_dir),
+                    cwd = res_dir,
+                    stdin = subprocess.DEVNULL,
+                    stdout = out,
+                    stderr = subprocess.STDOUT,
+                    timeout = timeout)
+                test_case.status = 'pass' if proc.returncode == 0 else 'fail'
+            except subprocess.TimeoutExpired:
+                test_case.status = 'timeout'
+                # 途中で止めたテストの影響が次のテストに残らないようにする
+                target.restart()
+        test_case.elapsed = time.perf_counter() - start
+        with print_lock:
+            print('{:<7} {:8.2f} s  {}'.format(test_case.status.upper(), test_case.elapsed, test_case.name))
+    finally:
+        targets.put(target)
+
+
+def report(test_cases, res_root_dir, num_slowest, elapsed):
+    timing_file = pathlib.Path(res_root_dir, 'timing.csv')
+    with open(timing_file, 'w', newline = '') as f:
+        writer = csv.writer(f)
+        writer.writerow(['test', 'status', 'elapsed [s]'])
+        for test_case in test_cases:
+            writer.writerow([test_case.name, test_case.status, '{:.3f}'.format(test_case.elapsed)])
+
+    print('\n---- slowest tests ----')
+    for test_case in sorted(test_cases, key = lambda tc: tc.elapsed, reverse = True)[:num_slowest]:
+        print('{:8.2f} s  {}'.format(test_case.elapsed, test_case.name))
+
+    print('\n---- total time per suite ----')
+    suite_to_time = {}
+    for test_case in test_cases:
+        suite_to_time[test_case.suite.name] = suite_to_time.get(test_case.suite.name, 0) + test_case.elapsed
+    for suite_name, suite_time in suite_to_time.items():
+        print('{:8.2f} s  {}'.format(suite_time, suite_name))
+
+    print('\nwall clock time : {:.2f} s  (timing data : {})'.format(elapsed, timing_file))
+    failed_tests = [test_case for test_case in test_cases if test_case.status != 'pass']
+    if failed_tests:
+        for test_case in failed_tests:
+            print('Test {} failed ({}).'.format(test_case.name, test_case.status))
+        return 1
+
+    print('All tests succeeded.')
+    return 0
+
+
+def main(
+    suites,
+    num_tests,
+    capture_modules,
+    num_jobs,
+    use_emulator,
+    emulator_ip_addrs,
+    emulator_args,
+    ip_addr,
+    seq_ip_addr,
+    res_root_dir,
+    timeout,
+    base_seed,
+    num_slowest):
+    if use_emulator:
+        for suite in suites:
+            if not suite.on_emulator:
+                print('{} cannot run on the emulator.'.format(suite.name))
+                return 1
+        targets = [
+            EmulatorTarget(emu_ip_addr, pathlib.Path(res_root_dir, 'emulator', emu_ip_addr).resolve(), emulator_args)
+            for emu_ip_addr in emulator_ip_addrs]
+    else:
+        # 実機は 1 台しかなく, 複数のテストを同時に実行すると互いの設定を上書きしてしまうので, 1 つずつ実行する
+        if num_jobs > 1:
+            print('Tests on the real hardware run one at a time.  -j {} is ignored.'.format(num_jobs))
+        targets = [Target(ip_addr, seq_ip_addr)]
+
+    test_cases = gen_test_cases(suites, num_tests, capture_modules, base_seed)
+    target_queue = queue.Queue()
+    started_targets = []
+    print_lock = threading.Lock()
+    start = time.perf_counter()
+    try:
+        for target in targets:
+            target.start()
+            started_targets.append(target)
+            target_queue.put(target)
+
+        with ThreadPoolExecutor(len(targets)) as executor:
+            futures = [
+                executor.submit(run_test_case, test_case, target_queue, res_root_dir, timeout, print_lock)
+                for test_case in test_cases]
+            for future in futures:
+                future.result()
+    finally:
+        for target in started_targets:
+            target.stop()
+
+    return report(test_cases, res_root_dir, num_slowest, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--suite', action='append', choices=list(SUITES.keys()),
+        help='test suite to run.  all the suites which can run on the target are run by default')
+    parser.add_argument('--num-tests', type=int, default=1, help='number of tests per suite and capture module')
+    parser.add_argument('--capture-module', type=int, action='append')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of tests run in parallel')
+    parser.add_argument('--hw', action='store_true', help='run the tests on the real hardware instead of the emulator')
+    parser.add_argument('--ipaddr', default='10.1.0.255', help='IP address of the real hardware')
+    parser.add_argument('--seq-ipaddr', default='10.2.0.255', help='IP address of the sequencer of the real hardware')
+    parser.add_argument(
+        '--emulator-ipaddr-base', default='127.0.0.2',
+        help='loopback address of the first emulator.  the others use the following addresses')
+    parser.add_argument('--emulate-timing', action='store_true', help='pass --emulate-timing to the emulators')
+    parser.add_argument('--result-dir', default='result')
+    parser.add_argument(
+        '--timeout', type=float, default=DEFAULT_TIMEOUT,
+        help='timeout of a test [s].  0 disables the timeout')
+    parser.add_argument('--seed', type=int, default=10, help='random seed of the first test')
+    parser.add_argument('--show-slowest', type=int, default=10, help='number of the slowest tests to show')
+    args = parser.parse_args()
+
+    suite_names = args.suite
+    if suite_names is None:
+        suite_names = [name for name, suite in SUITES.items() if args.hw or suite.on_emulator]
+
+    capture_modules = CaptureModule.all()
+    if args.capture_module is not None:
+        capture_modules = [CaptureModule.of(cap_mod) for cap_mod in args.capture_module]
+
+    num_jobs = max(1, args.jobs)
+    base_octets = [int(octet) for octet in args.emulator_ipaddr_base.split('.')]
+    emulator_ip_addrs = [
+        '.'.join(map(str, base_octets[:3] + [base_octets[3] + i])) for i in range(num_jobs)]
+
+    status = main(
+        [SUITES[name] for name in suite_names],
+        args.num_tests,
+        capture_modules,
+        num_jobs,
+        not args.hw,
+        emulator_ip_addrs,
+        ['--emulate-timing'] if args.emulate_timing else [],
+        args.ipaddr,
+        args.seq_ipaddr,
+        args.result_dir,
+        args.timeout if args.timeout > 0 else None,
+        args.seed,
+        args.show_slowest)
+
+    sys.exit(status)
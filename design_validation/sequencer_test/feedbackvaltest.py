@@ -19,7 +19,7 @@ from e7awgsw.labrad import RemoteAwgCtrl, RemoteCaptureCtrl, RemoteSequencerCtrl
 from e7awgsw.hwparam import MAX_CAPTURE_SIZE, CAPTURE_DATA_ALIGNMENT_SIZE, WAVE_RAM_PORT
 from e7awgsw.logger import get_file_logger
 from e7awgsw.udpaccess import WaveRamAccess
-from emulator.dspmodule import dsp
+from e7awgsw.dspmodel import dsp, to_capture_data
 
 
 class FeedbackValTest(object):
@@ -228,8 +228,8 @@ class FeedbackValTest(object):
                     capture_param, test_name, 'fb_{}_elem_{}'.format(feedback_channel_id, elem_offset))
 
                 # 期待値データ算出
-                samples = wave_sequence.all_samples(False)
-                expected_data = dsp(samples, capture_param)
+                samples = wave_sequence.all_sample_array(False)
+                expected_data = to_capture_data(dsp(samples, capture_param))
                 # キャプチャデータ取得
                 cap_unit_to_capture_data = \
                     self.__get_capture_data(capture_param.calc_capture_samples(), 0, False)
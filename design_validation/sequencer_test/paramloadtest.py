@@ -17,7 +17,7 @@ from e7awgsw import AwgCtrl, CaptureCtrl, SequencerCtrl
 from e7awgsw import SinWave, IqWave
 from e7awgsw.labrad import RemoteAwgCtrl, RemoteCaptureCtrl, RemoteSequencerCtrl
 from e7awgsw.hwparam import MAX_CAPTURE_SIZE, CAPTURE_DATA_ALIGNMENT_SIZE
-from emulator.dspmodule import dsp
+from e7awgsw.dspmodel import dsp, to_capture_data
 
 class ParamLoadTest(object):
 
@@ -233,8 +233,8 @@ class ParamLoadTest(object):
 
         for i in range(len(wave_sequences)):
             # 期待値データ算出
-            samples = wave_sequences[i].all_samples(False)
-            expected_data = dsp(samples, capture_param)
+            samples = wave_sequences[i].all_sample_array(False)
+            expected_data = to_capture_data(dsp(samples, capture_param))
             # キャプチャデータ取得
             cls_result = DspUnit.CLASSIFICATION in capture_param.dsp_units_enabled
             cap_unit_to_capture_data = self.__get_capture_data(
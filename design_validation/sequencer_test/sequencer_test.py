@@ -116,8 +116,9 @@ def main(
     seq_ip_addr,
     server_ip_addr,
     use_labrad,
-    res_dir):
-    random.seed(10)
+    res_root_dir,
+    seed):
+    random.seed(seed)
     
     # 0 以外のキャプチャディレイは, DSP エミュレータが未対応なので,
     # 本テストではシーケンサコマンドによる設定が可能かどうかチェックしない.
@@ -129,7 +130,7 @@ def main(
     failed_tests = []
     for test_id in range(num_tests):
         print("\n---- test {:03d} / {:03d} ----".format(test_id, num_tests - 1))
-        res_dir = 'result/{:03d}'.format(test_id)
+        res_dir = '{}/{:03d}'.format(res_root_dir, test_id)
         test = ParamLoadTest(res_dir, awg_cap_ip_addr, seq_ip_addr, server_ip_addr, use_labrad)
 
         print('-- dsp units --')
@@ -317,8 +318,10 @@ def main(
     if failed_tests:
         for test_id in failed_tests:
             print("Test {} failed.".format(test_id))
+        return 1
     else:
         print("All tests succeeded.".format(failed_tests))
+        return 0
 
 
 if __name__ == "__main__":
@@ -330,17 +333,21 @@ if __name__ == "__main__":
     parser.add_argument('--seq-ipaddr', default='10.2.0.255')
     parser.add_argument('--labrad', action='store_true')
     parser.add_argument('--result-dir', default='result')
+    parser.add_argument('--seed', type=int, default=10)
     args = parser.parse_args()
 
     capture_modules = CaptureModule.all()
     if args.capture_module is not None:
         capture_modules = [CaptureModule.of(int(args.capture_module))]
 
-    main(
+    status = main(
         args.num_tests,
         capture_modules,
         args.ipaddr,
         args.seq_ipaddr,
         args.server_ipaddr,
         args.labrad,
-        args.result_dir)
+        args.result_dir,
+        args.seed)
+
+    sys.exit(status)
@@ -19,7 +19,6 @@ from e7awgsw.labrad import RemoteAwgCtrl, RemoteCaptureCtrl, RemoteSequencerCtrl
 from e7awgsw.hwparam import MAX_CAPTURE_SIZE, CAPTURE_DATA_ALIGNMENT_SIZE, WAVE_RAM_PORT
 from e7awgsw.logger import get_file_logger
 from e7awgsw.udpaccess import WaveRamAccess
-from emulator.dspmodule import dsp
 
 
 class WaitFlagTest(object):
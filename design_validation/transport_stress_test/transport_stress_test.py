@@ -0,0 +1,143 @@
+import argparse
+import sys
+import time
+import socket
+import pathlib
+import numpy as np
+
+lib_path = str(pathlib.Path(__file__).resolve().parents[2])
+sys.path.append(lib_path)
+from e7awgsw.udpaccess import WaveRamAccess, RetryPolicy, UdpRw
+from e7awgsw.hwparam import WAVE_RAM_PORT
+
+
+class TransferStats(object):
+    """1 種類の転送 (書き込み or 読み出し) の結果を集計する"""
+
+    def __init__(self, name):
+        self.__name = name
+        self.__latencies = []
+        self.__num_failures = 0
+        self.__num_corruptions = 0
+        self.__num_bytes = 0
+        self.__num_packets = 0
+        self.__elapsed = 0
+
+
+    def add(self, num_bytes, latency, succeeded, corrupted = False):
+        self.__latencies.append(latency)
+        self.__elapsed += latency
+        if not succeeded:
+            self.__num_failures += 1
+        elif corrupted:
+            self.__num_corruptions += 1
+        else:
+            self.__num_bytes += num_bytes
+            # 要求パケットと応答パケットの数 (再送したパケットは含まない)
+            self.__num_packets += 2 * -(-num_bytes // UdpRw.MAX_RW_SIZE)
+
+
+    @property
+    def num_failures(self):
+        return self.__num_failures
+
+
+    @property
+    def num_corruptions(self):
+        return self.__num_corruptions
+
+
+    def report(self):
+        latencies = np.array(self.__latencies) * 1e3
+        throughput = self.__num_bytes / self.__elapsed / 1e6 if self.__elapsed > 0 else 0
+        packet_rate = self.__num_packets / self.__elapsed if self.__elapsed > 0 else 0
+        print('{}:'.format(self.__name))
+        print('    transfers  : {} (failed {}, corrupted {})'.format(
+            len(latencies), self.__num_failures, self.__num_corruptions))
+        print('    throughput : {:.3f} MB/s,  {:.0f} packets/s'.format(throughput, packet_rate))
+        if latencies.size > 0:
+            print('    latency    : p50 {:.3f} ms,  p99 {:.3f} ms,  p99.9 {:.3f} ms,  max {:.3f} ms'.format(
+                *np.percentile(latencies, [50, 99, 99.9]), latencies.max()))
+
+
+def transfer(func, *args):
+    """func(*args) を実行し, (成功したかどうか, かかった時間) を返す"""
+    start = time.perf_counter()
+    try:
+        func(*args)
+        succeeded = True
+    except (socket.timeout, ValueError) as e:
+        print('transfer failed : {}'.format(e), file = sys.stderr)
+        succeeded = False
+    return succeeded, time.perf_counter() - start
+
+
+def read_into_buf(wave_ram, addr, buf):
+    """パイプライン化しない読み出しで buf を満たす"""
+    buf[:] = wave_ram.read(addr, len(buf))
+
+
+def main(ip_addr, num_transfers, transfer_size, addr, retry_policy, pipelined, batch_recv, seed):
+    rng = np.random.default_rng(seed)
+    write_stats = TransferStats('wave RAM write')
+    read_stats = TransferStats('wave RAM read')
+    wave_ram = WaveRamAccess(ip_addr, WAVE_RAM_PORT, retry_policy = retry_policy, batch_recv = batch_recv)
+    print('batch receive : {}'.format(wave_ram.uses_batch_recv))
+    try:
+        for _ in range(num_transfers):
+            data = rng.integers(0, 256, transfer_size, dtype = np.uint8).tobytes()
+            if pipelined:
+                succeeded, latency = transfer(wave_ram.pipelined_write, [(addr, data)])
+            else:
+                succeeded, latency = transfer(wave_ram.write, addr, data)
+            write_stats.add(transfer_size, latency, succeeded)
+            if not succeeded:
+                continue
+
+            buf = bytearray(transfer_size)
+            if pipelined:
+                succeeded, latency = transfer(wave_ram.read_into, addr, buf)
+            else:
+                succeeded, latency = transfer(read_into_buf, wave_ram, addr, buf)
+            read_stats.add(transfer_size, latency, succeeded, buf != data)
+    finally:
+        wave_ram.close()
+
+    write_stats.report()
+    read_stats.report()
+    num_errors = sum(stats.num_failures + stats.num_corruptions for stats in (write_stats, read_stats))
+    if num_errors > 0:
+        print('{} transfers failed or corrupted data.'.format(num_errors))
+        return 1
+    print('All transfers succeeded.')
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ipaddr', default = '10.1.0.255')
+    parser.add_argument('--num-transfers', type = int, default = 100)
+    parser.add_argument('--size', type = int, default = 1024 * 1024, help = 'bytes per transfer')
+    parser.add_argument('--addr', type = lambda val: int(val, 0), default = 0, help = 'wave RAM address to use')
+    parser.add_argument('--max-retries', type = int, default = 8, help = 'max number of retries per request')
+    parser.add_argument('--min-timeout', type = float, default = 0.05, help = 'min UDP reply timeout [s]')
+    parser.add_argument('--timeout', type = float, default = 25, help = 'max UDP reply timeout [s]')
+    parser.add_argument('--pipelined', action = 'store_true', help = 'use pipelined_write and read_into')
+    parser.add_argument('--no-batch-recv', action = 'store_true', help = 'receive replies one by one in pipelined mode')
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+
+    status = main(
+        args.ipaddr,
+        args.num_transfers,
+        args.size,
+        args.addr,
+        RetryPolicy(
+            max_retries = args.max_retries,
+            min_timeout = args.min_timeout,
+            max_timeout = args.timeout),
+        args.pipelined,
+        not args.no_batch_recv,
+        args.seed)
+
+    sys.exit(status)
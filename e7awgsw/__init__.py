@@ -19,6 +19,8 @@ __all__ = [
     'SquareWave',
     'GaussianPulse',
     'IqWave',
+    'WaveCache',
+    'get_wave_cache',
     'AwgStartCmd',
     'CaptureEndFenceCmd',
     'WaveSequenceSetCmd',
@@ -33,18 +35,55 @@ __all__ = [
     'CaptureAddrSetCmdErr',
     'FeedbackCalcOnClassificationCmdErr',
     'WaveGenEndFenceCmdErr',
+    'SequencerProgram',
     'SequencerCtrl',
+    'ShotLoop',
+    'ShotResult',
+    'RetryPolicy',
     'plot_graph',
-    'plot_samples']
+    'plot_samples',
+    'save_capture_data',
+    'load_capture_data',
+    'start_async_logging',
+    'stop_async_logging']
 
-from .hwdefs import DspUnit, CaptureUnit, CaptureModule, DecisionFunc, CaptureParamElem, AWG, FeedbackChannel, AwgErr, CaptureErr
-from .awgctrl import AwgCtrl
-from .capturectrl import CaptureCtrl
-from .wavesequence import WaveSequence
-from .captureparam import CaptureParam
-from .utiltool import plot_graph, plot_samples
-from .awgwave import SinWave, SawtoothWave, SquareWave, GaussianPulse, IqWave
-from .sequencercmd import AwgStartCmd, CaptureEndFenceCmd, WaveSequenceSetCmd, CaptureParamSetCmd, CaptureAddrSetCmd, FeedbackCalcOnClassificationCmd, WaveGenEndFenceCmd
-from .sequencercmd import AwgStartCmdErr, CaptureEndFenceCmdErr, WaveSequenceSetCmdErr, CaptureParamSetCmdErr, CaptureAddrSetCmdErr, FeedbackCalcOnClassificationCmdErr, WaveGenEndFenceCmdErr
-from .sequencerctrl import SequencerCtrl
-from .exception import AwgTimeoutError, CaptureUnitTimeoutError
+import importlib
+
+# 属性名 -> その属性を定義するサブモジュール.
+# サブモジュールは, その属性に初めてアクセスしたときに読み込む.
+_attr_to_module = {
+    **dict.fromkeys([
+        'DspUnit', 'CaptureUnit', 'CaptureModule', 'DecisionFunc', 'CaptureParamElem',
+        'AWG', 'FeedbackChannel', 'AwgErr', 'CaptureErr'], '.hwdefs'),
+    'AwgCtrl': '.awgctrl',
+    'CaptureCtrl': '.capturectrl',
+    'WaveSequence': '.wavesequence',
+    'CaptureParam': '.captureparam',
+    **dict.fromkeys(['plot_graph', 'plot_samples', 'save_capture_data', 'load_capture_data'], '.utiltool'),
+    **dict.fromkeys(['SinWave', 'SawtoothWave', 'SquareWave', 'GaussianPulse', 'IqWave'], '.awgwave'),
+    **dict.fromkeys(['WaveCache', 'get_wave_cache'], '.wavecache'),
+    **dict.fromkeys([
+        'AwgStartCmd', 'CaptureEndFenceCmd', 'WaveSequenceSetCmd', 'CaptureParamSetCmd',
+        'CaptureAddrSetCmd', 'FeedbackCalcOnClassificationCmd', 'WaveGenEndFenceCmd',
+        'AwgStartCmdErr', 'CaptureEndFenceCmdErr', 'WaveSequenceSetCmdErr', 'CaptureParamSetCmdErr',
+        'CaptureAddrSetCmdErr', 'FeedbackCalcOnClassificationCmdErr', 'WaveGenEndFenceCmdErr'],
+        '.sequencercmd'),
+    'SequencerProgram': '.sequencerprogram',
+    'SequencerCtrl': '.sequencerctrl',
+    **dict.fromkeys(['ShotLoop', 'ShotResult'], '.shotloop'),
+    'RetryPolicy': '.udpaccess',
+    **dict.fromkeys(['AwgTimeoutError', 'CaptureUnitTimeoutError'], '.exception'),
+    **dict.fromkeys(['start_async_logging', 'stop_async_logging'], '.logger'),
+}
+
+def __getattr__(name):
+    module_name = _attr_to_module.get(name)
+    if module_name is None:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+    attr = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = attr
+    return attr
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_attr_to_module))
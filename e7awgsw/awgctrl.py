@@ -1,14 +1,16 @@
 import time
 import socket
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from .wavesequence import WaveSequence
 from .hwparam import WAVE_RAM_PORT, AWG_REG_PORT, MAX_WAVE_REGISTRY_ENTRIES
 from .memorymap import AwgMasterCtrlRegs, AwgCtrlRegs, WaveParamRegs
 from .udpaccess import AwgRegAccess, WaveRamAccess, ParamRegistryAccess
 from .exception import AwgTimeoutError
-from .logger import get_file_logger, get_null_logger, log_error
+from .logger import get_loggers, get_null_logger, log_error
 from .lock import ReentrantFileLock
 from .hwdefs import AWG, AwgErr
+from .registry import RamAllocator, ParamRegistry
 
 class AwgCtrlBase(object, metaclass = ABCMeta):
     #: AWG のサンプリングレート (単位=サンプル数/秒)
@@ -18,9 +20,7 @@ class AwgCtrlBase(object, metaclass = ABCMeta):
 
     def __init__(self, ip_addr, validate_args, enable_lib_log, logger):
         self._validate_args = validate_args
-        self._loggers = [logger]
-        if enable_lib_log:
-            self._loggers.append(get_file_logger())
+        self._loggers = get_loggers(logger, enable_lib_log)
 
         if self._validate_args:
             try:
@@ -33,8 +33,6 @@ class AwgCtrlBase(object, metaclass = ABCMeta):
     def set_wave_sequence(self, awg_id, wave_seq):
         """波形シーケンスを AWG に設定する.
 
-        | この関数を呼んだ後で register_wave_sequences を呼ぶと, AWG に設定したデータが消えることに注意.
-
         Args:
             awg_id (AWG): 波形シーケンスを設定する AWG の ID
             wave_seq (WaveSequence): 設定する波形シーケンス
@@ -50,11 +48,36 @@ class AwgCtrlBase(object, metaclass = ABCMeta):
         self._set_wave_sequence(awg_id, wave_seq)
 
 
+    def set_wave_sequences(self, awg_id_to_wave_seq):
+        """複数の AWG に波形シーケンスを設定する.
+
+        | 各波形シーケンスのサンプルデータの変換を並列に行い, 変換が終わったものから応答を待たずに送信する.
+
+        Args:
+            awg_id_to_wave_seq ({AWG -> WaveSequence}):
+                | key = 波形シーケンスを設定する AWG の ID
+                | value = 設定する波形シーケンス
+        """
+        if self._validate_args:
+            try:
+                if not isinstance(awg_id_to_wave_seq, dict):
+                    raise ValueError("'awg_id_to_wave_seq' must be a dict.")
+                self._validate_awg_id(*awg_id_to_wave_seq.keys())
+                for wave_seq in awg_id_to_wave_seq.values():
+                    self._validate_wave_sequence(wave_seq)
+            except Exception as e:
+                log_error(e, *self._loggers)
+                raise
+
+        self._set_wave_sequences(awg_id_to_wave_seq)
+
+
     def register_wave_sequences(self, awg_id, key_to_wave_seq):
         """awg_id で指定した AWG が持つ波形レジストリに波形シーケンスを登録する
 
-        | 同じ awg_id で複数回呼ぶと, 前回レジストリに登録したデータが消えることに注意.
-        | この関数を呼んだ後で set_wave_sequence を呼ぶと, レジストリに登録したデータが消えることに注意.
+        | 指定したキーに同じ内容の波形シーケンスが登録済みの場合, そのキーへの登録は省略される.
+        | 波形 RAM に空きが無い場合, key_to_wave_seq 以外のキーの波形シーケンスのうち,
+        | 最も長い間使われていないものから順に追い出される.
 
         Args:
             awg_id (AWG): 登録先の波形レジストリを持つ AWG の ID
@@ -79,6 +102,37 @@ class AwgCtrlBase(object, metaclass = ABCMeta):
         self._register_wave_sequences(awg_id, key_to_wave_seq)
 
 
+    def load_wave_sequences(self, awg_id, wave_seq_list):
+        """awg_id で指定した AWG が持つ波形レジストリに波形シーケンスを登録し, 登録先のキーを返す
+
+        | 同じ内容の波形シーケンスがレジストリに登録済みの場合, それを再利用してデータは送らない.
+        | レジストリや波形 RAM に空きが無い場合, wave_seq_list 以外の波形シーケンスのうち,
+        | 最も長い間使われていないものから順に追い出す.
+        | レジストリの登録状況はこのオブジェクトが管理しているので,
+        | 同じ AWG のレジストリを他のオブジェクトやプロセスから変更しないこと.
+
+        Args:
+            awg_id (AWG): 登録先の波形レジストリを持つ AWG の ID
+            wave_seq_list (list of WaveSequence): 登録する波形シーケンスのリスト
+
+        Returns:
+            list of int: wave_seq_list の各波形シーケンスが登録されたレジストリのキー (WaveSequenceSetCmd に指定する値)
+        """
+        if self._validate_args:
+            try:
+                self._validate_awg_id(awg_id)
+                for wave_seq in wave_seq_list:
+                    self._validate_wave_sequence(wave_seq)
+                if len(set(wave_seq.fingerprint for wave_seq in wave_seq_list)) > self.MAX_WAVE_REGISTRY_ENTRIES:
+                    raise ValueError(
+                        'Too many wave sequences to register at once.  (max = {})'.format(self.MAX_WAVE_REGISTRY_ENTRIES))
+            except Exception as e:
+                log_error(e, *self._loggers)
+                raise
+
+        return self._load_wave_sequences(awg_id, wave_seq_list)
+
+
     def initialize(self, *awg_id_list):
         """引数で指定した AWG を初期化する.
 
@@ -306,10 +360,18 @@ class AwgCtrlBase(object, metaclass = ABCMeta):
     def _set_wave_sequence(self, awg_id, wave_seq):
         pass
 
+    @abstractmethod
+    def _set_wave_sequences(self, awg_id_to_wave_seq):
+        pass
+
     @abstractmethod
     def _register_wave_sequences(self, awg_id, key_to_wave_seq):
         pass
 
+    @abstractmethod
+    def _load_wave_sequences(self, awg_id, wave_seq_list):
+        pass
+
     @abstractmethod
     def _initialize(self, *awg_id_list):
         pass
@@ -369,6 +431,8 @@ class AwgCtrl(AwgCtrlBase):
     __AWG_REGISTRY_SIZE = 0x80000
     # 波形シーケンス 1 つ当たりのレジストリのサイズ (bytes)
     __WAVE_SEQ_REGISTRY_SIZE = 0x400
+    # set_wave_sequences でサンプルデータの変換に使うスレッドの最大数
+    __MAX_SERIALIZATION_WORKERS = 8
 
 
     def __init__(
@@ -377,7 +441,8 @@ class AwgCtrl(AwgCtrlBase):
         *,
         validate_args = True,
         enable_lib_log = True,
-        logger = get_null_logger()):
+        logger = get_null_logger(),
+        retry_policy = None):
         """
         Args:
             ip_addr (string): AWG 制御モジュールに割り当てられた IP アドレス (例 '10.0.0.16')
@@ -388,11 +453,26 @@ class AwgCtrl(AwgCtrlBase):
                 | True -> ライブラリの標準のログ機能を有効にする.
                 | False -> ライブラリの標準のログ機能を無効にする.
             logger (logging.Logger): ユーザ独自のログ出力に用いる Logger オブジェクト
+            retry_policy (RetryPolicy):
+                | 送った要求に対する応答待ちのタイムアウトと再送の方針.
+                | None の場合, デフォルトの RetryPolicy を使う.
         """
         super().__init__(ip_addr, validate_args, enable_lib_log, logger)
-        self.__reg_access = AwgRegAccess(ip_addr, AWG_REG_PORT, *self._loggers)
-        self.__wave_ram_access = WaveRamAccess(ip_addr, WAVE_RAM_PORT, *self._loggers)
-        self.__registry_access = ParamRegistryAccess(ip_addr, WAVE_RAM_PORT, *self._loggers)
+        self.__reg_access = AwgRegAccess(
+            ip_addr, AWG_REG_PORT, *self._loggers, retry_policy = retry_policy)
+        self.__wave_ram_access = WaveRamAccess(
+            ip_addr, WAVE_RAM_PORT, *self._loggers, retry_policy = retry_policy)
+        self.__registry_access = ParamRegistryAccess(
+            ip_addr, WAVE_RAM_PORT, *self._loggers, retry_policy = retry_policy)
+        # AWG ID -> 波形レジストリの登録状況と波形 RAM の割り当て状況
+        self.__wave_registries = {
+            awg_id : ParamRegistry(
+                self.MAX_WAVE_REGISTRY_ENTRIES,
+                RamAllocator(
+                    self.__AWG_WAVE_SRC_ADDR[awg_id],
+                    self.__MAX_RAM_SIZE_FOR_WAVE_SEQUENCE,
+                    self.__WAVE_RAM_WORD_SIZE))
+            for awg_id in AWG.all() }
         if ip_addr == 'localhost':
             ip_addr = '127.0.0.1'
         filepath = '/tmp/e7awg_{}.lock'.format(socket.inet_ntoa(socket.inet_aton(ip_addr)))
@@ -425,49 +505,166 @@ class AwgCtrl(AwgCtrlBase):
 
     def _set_wave_sequence(self, awg_id, wave_seq):
         self.__check_wave_seq_data_size(awg_id, wave_seq)
-        chunk_addr_list = self.__calc_chunk_addr(awg_id, wave_seq, 0)
+        # AWG に直接設定する波形シーケンスのサンプルデータも, レジストリのものと重ならない領域に置く
+        addr_offset = self.__alloc_wave_ram(awg_id, None, wave_seq, ())
+        chunk_addr_list = self.__calc_chunk_addr(awg_id, wave_seq, addr_offset)
         addr = WaveParamRegs.Addr.awg(awg_id)
-        self.__set_wave_params(self.__reg_access, addr, wave_seq, chunk_addr_list)
-        self.__send_wave_samples(wave_seq, chunk_addr_list)
+        try:
+            self.__set_wave_params(self.__reg_access, addr, wave_seq, chunk_addr_list)
+            self.__send_wave_samples(wave_seq, chunk_addr_list)
+        except:
+            self.__wave_registries[awg_id].invalidate(None)
+            raise
+
+
+    def _set_wave_sequences(self, awg_id_to_wave_seq):
+        for awg_id, wave_seq in awg_id_to_wave_seq.items():
+            self.__check_wave_seq_data_size(awg_id, wave_seq)
+        if not awg_id_to_wave_seq:
+            return
+
+        num_workers = min(len(awg_id_to_wave_seq), self.__MAX_SERIALIZATION_WORKERS)
+        with ThreadPoolExecutor(max_workers = num_workers) as serializer:
+            # サンプルデータの変換を先に始めておき, その間に波形パラメータを設定する
+            futures = [
+                serializer.submit(self.__serialize_wave_samples, wave_seq)
+                for wave_seq in awg_id_to_wave_seq.values()]
+            try:
+                chunk_addr_lists = []
+                for awg_id, wave_seq in awg_id_to_wave_seq.items():
+                    addr_offset = self.__alloc_wave_ram(awg_id, None, wave_seq, ())
+                    chunk_addr_list = self.__calc_chunk_addr(awg_id, wave_seq, addr_offset)
+                    self.__set_wave_params(
+                        self.__reg_access, WaveParamRegs.Addr.awg(awg_id), wave_seq, chunk_addr_list)
+                    chunk_addr_lists.append(chunk_addr_list)
+
+                def gen_segments():
+                    for wave_seq, chunk_addr_list, future in zip(
+                            awg_id_to_wave_seq.values(), chunk_addr_lists, futures):
+                        future.result()
+                        yield from self.__gen_wave_sample_segments(wave_seq, chunk_addr_list)
+
+                self.__wave_ram_access.pipelined_write(gen_segments())
+            except:
+                for future in futures:
+                    future.cancel()
+                for awg_id in awg_id_to_wave_seq.keys():
+                    self.__wave_registries[awg_id].invalidate(None)
+                raise
+
 
-    
     def _register_wave_sequences(self, awg_id, key_to_wave_seq):
         self.__check_wave_seq_data_size(awg_id, *key_to_wave_seq.values())
-        addr_offset = 0
+        registry = self.__wave_registries[awg_id]
+        pinned_keys = [key for key in key_to_wave_seq.keys() if key is not None]
         for key, wave_seq in key_to_wave_seq.items():
             if key is None:
                 self._set_wave_sequence(awg_id, wave_seq)
                 continue
-            
-            chunk_addr_list = self.__calc_chunk_addr(awg_id, wave_seq, addr_offset)
-            addr = (self.__WAVE_REGISTRY_ADDR +
-                    self.__AWG_REGISTRY_SIZE * awg_id +
-                    self.__WAVE_SEQ_REGISTRY_SIZE * key)
+
+            if registry.fingerprint(key) == wave_seq.fingerprint:
+                # 登録済み
+                registry.find(wave_seq.fingerprint)
+                continue
+            addr_offset = self.__alloc_wave_ram(awg_id, key, wave_seq, pinned_keys)
+            self.__register_wave_sequence(awg_id, key, wave_seq, addr_offset)
+
+
+    def _load_wave_sequences(self, awg_id, wave_seq_list):
+        self.__check_wave_seq_data_size(awg_id, *wave_seq_list)
+        registry = self.__wave_registries[awg_id]
+        keys = [registry.find(wave_seq.fingerprint) for wave_seq in wave_seq_list]
+        pinned_keys = set(key for key in keys if key is not None)
+        for i, wave_seq in enumerate(wave_seq_list):
+            if keys[i] is not None:
+                continue
+            # wave_seq_list 内に同じ内容の波形シーケンスがある場合は, 先に登録したものを使う
+            key = registry.find(wave_seq.fingerprint)
+            if key is None:
+                try:
+                    key, addr = registry.assign(
+                        wave_seq.fingerprint, self.__calc_wave_seq_data_size(wave_seq), pinned_keys)
+                except ValueError as e:
+                    log_error(e, *self._loggers)
+                    raise
+                self.__register_wave_sequence(
+                    awg_id, key, wave_seq, addr - self.__AWG_WAVE_SRC_ADDR[awg_id])
+            keys[i] = key
+            pinned_keys.add(key)
+        return keys
+
+
+    def __alloc_wave_ram(self, awg_id, key, wave_seq, pinned_keys):
+        """wave_seq のサンプルデータを置く波形 RAM の領域を割り当てて, その AWG の波形データ格納先からのオフセットを返す"""
+        try:
+            addr = self.__wave_registries[awg_id].put(
+                key, wave_seq.fingerprint, self.__calc_wave_seq_data_size(wave_seq), pinned_keys)
+        except ValueError as e:
+            log_error(e, *self._loggers)
+            raise
+        return addr - self.__AWG_WAVE_SRC_ADDR[awg_id]
+
+
+    def __register_wave_sequence(self, awg_id, key, wave_seq, addr_offset):
+        chunk_addr_list = self.__calc_chunk_addr(awg_id, wave_seq, addr_offset)
+        addr = (self.__WAVE_REGISTRY_ADDR +
+                self.__AWG_REGISTRY_SIZE * awg_id +
+                self.__WAVE_SEQ_REGISTRY_SIZE * key)
+        try:
             self.__set_wave_params(self.__registry_access, addr, wave_seq, chunk_addr_list)
             self.__send_wave_samples(wave_seq, chunk_addr_list)
-            addr_offset += self.__calc_wave_seq_data_size(wave_seq)
+        except:
+            # 登録に失敗したエントリの内容は不明とする
+            self.__wave_registries[awg_id].invalidate(key)
+            raise
 
 
     def __set_wave_params(self, accessor, addr, wave_seq, chunk_addr_list):
-        accessor.write(addr, WaveParamRegs.Offset.NUM_WAIT_WORDS, wave_seq.num_wait_words)
-        accessor.write(addr, WaveParamRegs.Offset.NUM_REPEATS, wave_seq.num_repeats)
-        accessor.write(addr, WaveParamRegs.Offset.NUM_CHUNKS, wave_seq.num_chunks)
+        """波形パラメータを, 連続したレジスタの範囲ごとにまとめて書き込む"""
+        for offset, data in self.__gen_wave_param_image(wave_seq, chunk_addr_list):
+            accessor.write_bytes(addr, offset, data)
+
+
+    def __gen_wave_param_image(self, wave_seq, chunk_addr_list):
+        """波形パラメータのレジスタ値を, 連続したレジスタの範囲ごとに (offset, bytes) のリストにして返す
+
+        | WAVE_STARTABLE_BLOCK_INTERVAL は波形シーケンスのパラメータではないので含まない.
+        """
+        header = [wave_seq.num_wait_words, wave_seq.num_repeats, wave_seq.num_chunks]
+        image = [(WaveParamRegs.Offset.NUM_WAIT_WORDS, self.__to_reg_bytes(header))]
 
+        chunk_params = []
         for chunk_idx in range(wave_seq.num_chunks):
-            chunk_offs = WaveParamRegs.Offset.chunk(chunk_idx)
             chunk = wave_seq.chunk(chunk_idx)
-            accessor.write(
-                addr, chunk_offs + WaveParamRegs.Offset.CHUNK_START_ADDR, chunk_addr_list[chunk_idx] >> 4)
-            wave_part_words = chunk.num_words - chunk.num_blank_words
-            accessor.write(addr, chunk_offs + WaveParamRegs.Offset.NUM_WAVE_PART_WORDS, wave_part_words)
-            accessor.write(addr, chunk_offs + WaveParamRegs.Offset.NUM_BLANK_WORDS, chunk.num_blank_words)
-            accessor.write(addr, chunk_offs + WaveParamRegs.Offset.NUM_CHUNK_REPEATS, chunk.num_repeats)
+            # CHUNK_START_ADDR, NUM_WAVE_PART_WORDS, NUM_BLANK_WORDS, NUM_CHUNK_REPEATS の順に並ぶ
+            chunk_params += [
+                chunk_addr_list[chunk_idx] >> 4,
+                chunk.num_words - chunk.num_blank_words,
+                chunk.num_blank_words,
+                chunk.num_repeats]
+        if chunk_params:
+            # 各チャンクのパラメータのレジスタは CHUNK_0 から隙間なく並んでいる
+            image.append((WaveParamRegs.Offset.chunk(0), self.__to_reg_bytes(chunk_params)))
+        return image
+
+
+    def __to_reg_bytes(self, vals):
+        return b''.join((val & 0xFFFFFFFF).to_bytes(AwgRegAccess.REG_SIZE, 'little') for val in vals)
 
 
     def __send_wave_samples(self, wave_seq, chunk_addr_list):
-        for chunk_idx in range(wave_seq.num_chunks):
-            wave_data = wave_seq.chunk(chunk_idx).wave_data
-            self.__wave_ram_access.write(chunk_addr_list[chunk_idx], wave_data.serialize())
+        self.__wave_ram_access.pipelined_write(self.__gen_wave_sample_segments(wave_seq, chunk_addr_list))
+
+
+    def __gen_wave_sample_segments(self, wave_seq, chunk_addr_list):
+        """wave_seq の各チャンクのサンプルデータとその格納先アドレスの組を返すイテレータを作成する"""
+        for chunk_data, chunk_addr in zip(wave_seq.serialize_chunks(), chunk_addr_list):
+            yield chunk_addr, chunk_data
+
+
+    def __serialize_wave_samples(self, wave_seq):
+        """wave_seq の全チャンクのサンプルデータを送信用のバイト列に変換しておく"""
+        wave_seq.serialize_chunks()
 
 
     def __calc_chunk_addr(self, awg_id, wave_seq, addr_offset):
@@ -1,5 +1,8 @@
-from abc import ABCMeta, abstractmethod
+from abc import ABCMeta
 import math
+import numpy as np
+from .hwparam import NUM_SAMPLES_IN_WAVE_BLOCK
+from .wavecache import get_wave_cache
 
 class ParameterizedWave(object, metaclass = ABCMeta):
     """パラメータで表される波形のベースクラス"""
@@ -84,9 +87,87 @@ class ParameterizedWave(object, metaclass = ABCMeta):
         """
         return self.__offset
 
-    @abstractmethod
     def gen_samples(self, sampling_rate):
-        pass
+        """このオブジェクトのパラメータに従う波形のサンプルリストを生成する
+
+        Args:
+            sampling_rate (int or float): サンプリングレート (単位: サンプル数/秒)
+
+        Returns:
+            list of int: 波形のサンプルリスト
+        """
+        return self.gen_sample_array(sampling_rate).tolist()
+
+    def gen_sample_array(self, sampling_rate):
+        """このオブジェクトのパラメータに従う波形のサンプル配列を生成する
+
+        | 各サンプル値は gen_samples と同じく小数点以下を 0 方向に切り捨てた整数となる.
+        | cache_key が None でない場合, 波形の種類, パラメータ, サンプリングレートが同じであれば, キャッシュされた同じ配列を返す.
+
+        Args:
+            sampling_rate (int or float): サンプリングレート (単位: サンプル数/秒)
+
+        Returns:
+            numpy.ndarray: 波形の読み取り専用のサンプル配列 (dtype = numpy.int64)
+        """
+        if not isinstance(sampling_rate, (int, float)):
+            raise ValueError(
+                "The 'sampling_rate' must be a number greater than zero.  ({})".format(sampling_rate))
+
+        if type(self).gen_samples is not ParameterizedWave.gen_samples:
+            # gen_samples を実装したサブクラスの波形は gen_samples の結果に従う
+            return self.__to_read_only(np.array(self.gen_samples(sampling_rate), dtype = np.int64))
+
+        key = self.cache_key(sampling_rate)
+        if key is None:
+            return self.__to_read_only(self._gen_sample_array(sampling_rate))
+        return get_wave_cache().get_or_create(
+            key, lambda: self.__to_read_only(self._gen_sample_array(sampling_rate)))
+
+    def cache_key(self, sampling_rate):
+        """このオブジェクトのパラメータで生成される波形を識別するキー
+
+        | _params と _gen_sample_array の両方を定義したクラスの波形だけをキャッシュの対象とする.
+        | それ以外のクラスは _params に含まれない状態を持つかもしれないので, キーを作らない.
+
+        Args:
+            sampling_rate (int or float): サンプリングレート (単位: サンプル数/秒)
+
+        Returns:
+            tuple or None:
+                | 波形の種類, パラメータ, サンプリングレートからなるタプル.
+                | この波形をキャッシュできない場合は None.
+        """
+        cls = type(self)
+        if not ('_params' in vars(cls) and '_gen_sample_array' in vars(cls)):
+            return None
+        if cls.gen_samples is not ParameterizedWave.gen_samples:
+            return None
+        return (cls, self._params(), sampling_rate)
+
+    def _params(self):
+        return (self.num_cycles, self.frequency, self.amplitude, self.phase, self.offset)
+
+    @classmethod
+    def __to_read_only(cls, samples):
+        samples.flags.writeable = False
+        return samples
+
+    def _gen_sample_array(self, sampling_rate):
+        # gen_samples だけを実装したサブクラスのために, gen_samples の結果を配列にする.
+        # 組み込みの波形クラスはこのメソッドをオーバーライドして, ベクトル化された計算で配列を作る.
+        if type(self).gen_samples is ParameterizedWave.gen_samples:
+            raise NotImplementedError(
+                '{} must override gen_samples or _gen_sample_array.'.format(type(self).__name__))
+        return np.array(self.gen_samples(sampling_rate), dtype = np.int64)
+
+    def _num_samples(self, sampling_rate):
+        return int(sampling_rate * self.num_cycles / self.frequency)
+
+    @classmethod
+    def _to_int_samples(cls, samples):
+        # int() と同じく 0 方向に丸める
+        return np.trunc(samples).astype(np.int64)
 
 class SinWave(ParameterizedWave):
     """正弦波クラス"""
@@ -109,23 +190,26 @@ class SinWave(ParameterizedWave):
         """
         super().__init__(num_cycles, frequency, amplitude, phase, offset)
 
-    def gen_samples(self, sampling_rate):
-        """このオブジェクトのパラメータに従う sin 波のサンプルリストを生成する
+    def _params(self):
+        return super()._params()
+
+    def _gen_sample_array(self, sampling_rate):
+        """このオブジェクトのパラメータに従う sin 波のサンプル配列を生成する
 
         Args:
             sampling_rate (int or float): サンプリングレート (単位: サンプル数/秒)
         
         Returns:
-            list of int: sin 波のサンプルリスト
+            numpy.ndarray: sin 波のサンプル配列 (dtype = numpy.int64)
         """
         if not isinstance(sampling_rate, (int, float)):
             raise ValueError(
                 "The 'sampling_rate' must be a number greater than zero.  ({})".format(sampling_rate))
 
-        num_samples = int(sampling_rate * self.num_cycles / self.frequency)
+        idx = np.arange(self._num_samples(sampling_rate), dtype = np.float64)
         ang_freq = 2 * math.pi * self.frequency
-        return [int(self.amplitude * math.sin(ang_freq * i / sampling_rate + self.phase) + self.offset)
-                for i in range(num_samples)]
+        return self._to_int_samples(
+            self.amplitude * np.sin(ang_freq * idx / sampling_rate + self.phase) + self.offset)
 
 
 class SawtoothWave(ParameterizedWave):
@@ -168,40 +252,45 @@ class SawtoothWave(ParameterizedWave):
         """
         return self.__crest_pos
 
-    def gen_samples(self, sampling_rate):
-        """このオブジェクトのパラメータに従うノコギリ波のサンプルリストを生成する
+    def _params(self):
+        return super()._params() + (self.crest_pos,)
+
+    def _gen_sample_array(self, sampling_rate):
+        """このオブジェクトのパラメータに従うノコギリ波のサンプル配列を生成する
         
         Args:
             sampling_rate (int or float): サンプリングレート (単位: サンプル数/秒)
 
         Returns:
-            list of int: ノコギリ波のサンプルリスト
+            numpy.ndarray: ノコギリ波のサンプル配列 (dtype = numpy.int64)
         """
         if not (isinstance(sampling_rate, (int, float)) and (sampling_rate > 0)):
             raise ValueError(
                 "The 'sampling_rate' must be a number greater than zero.  ({})".format(sampling_rate))
 
-        num_samples = int(sampling_rate * self.num_cycles / self.frequency)
-        samples = []
+        idx = np.arange(self._num_samples(sampling_rate), dtype = np.float64)
         x_offset = self.phase / (2 * math.pi * self.frequency)
         x_crest = self.crest_pos / self.frequency
         x_crest_rev = (1.0 - self.crest_pos) / self.frequency
-
-        for i in range(num_samples):
-            x_val = i / sampling_rate + x_offset
-            if x_val >= 0:
-                x_val = x_val - int(x_val * self.frequency) / self.frequency
-            else:
-                x_val = math.ceil(-x_val * self.frequency) / self.frequency + x_val
-
-            if (x_val < x_crest) or (self.crest_pos == 1):
-                y_val = x_val * (2 * self.amplitude) / x_crest - self.amplitude
-            else:
-                y_val = -x_val * (2 * self.amplitude) / x_crest_rev \
-                        + self.amplitude * (1.0 + self.crest_pos) / (1.0 - self.crest_pos)
-            samples.append(int(y_val + self.offset))
-
-        return samples
+        x_vals = idx / sampling_rate + x_offset
+        x_vals = np.where(
+            x_vals >= 0,
+            x_vals - np.trunc(x_vals * self.frequency) / self.frequency,
+            np.ceil(-x_vals * self.frequency) / self.frequency + x_vals)
+
+        # 0 除算を避けるため, 頂点の前後で使わない側の式は計算しない
+        if self.crest_pos == 1:
+            y_vals = x_vals * (2 * self.amplitude) / x_crest - self.amplitude
+        elif self.crest_pos == 0:
+            y_vals = -x_vals * (2 * self.amplitude) / x_crest_rev \
+                     + self.amplitude * (1.0 + self.crest_pos) / (1.0 - self.crest_pos)
+        else:
+            y_vals = np.where(
+                x_vals < x_crest,
+                x_vals * (2 * self.amplitude) / x_crest - self.amplitude,
+                -x_vals * (2 * self.amplitude) / x_crest_rev
+                + self.amplitude * (1.0 + self.crest_pos) / (1.0 - self.crest_pos))
+        return self._to_int_samples(y_vals + self.offset)
 
 
 class SquareWave(ParameterizedWave):
@@ -241,38 +330,33 @@ class SquareWave(ParameterizedWave):
         """
         return self.__duty_cycle
 
-    def gen_samples(self, sampling_rate):
-        """このオブジェクトのパラメータに従う方形波のサンプルリストを生成する
+    def _params(self):
+        return super()._params() + (self.duty_cycle,)
+
+    def _gen_sample_array(self, sampling_rate):
+        """このオブジェクトのパラメータに従う方形波のサンプル配列を生成する
         
         Args:
             sampling_rate (int or float): サンプリングレート (単位: サンプル数/秒)
 
         Returns:
-            list of int: 方形波のサンプルリスト
+            numpy.ndarray: 方形波のサンプル配列 (dtype = numpy.int64)
         """
         if not (isinstance(sampling_rate, (int, float)) and (sampling_rate > 0)):
             raise ValueError(
                 "The 'sampling_rate' must be a number greater than zero.  ({})".format(sampling_rate))
 
-        num_samples = int(sampling_rate * self.num_cycles / self.frequency)
-        samples = []
+        idx = np.arange(self._num_samples(sampling_rate), dtype = np.float64)
         x_offset = self.phase / (2 * math.pi * self.frequency)
         x_border = self.duty_cycle / self.frequency
-
-        for i in range(num_samples):
-            x_val = i / sampling_rate + x_offset
-            if x_val >= 0:
-                x_val = x_val - int(x_val * self.frequency) / self.frequency
-            else:
-                x_val = math.ceil(-x_val * self.frequency) / self.frequency + x_val
-
-            if (x_val < x_border) or (self.duty_cycle == 1):
-                y_val = self.amplitude
-            else:
-                y_val = -self.amplitude
-            samples.append(int(y_val + self.offset))
-
-        return samples
+        x_vals = idx / sampling_rate + x_offset
+        x_vals = np.where(
+            x_vals >= 0,
+            x_vals - np.trunc(x_vals * self.frequency) / self.frequency,
+            np.ceil(-x_vals * self.frequency) / self.frequency + x_vals)
+        high = (x_vals < x_border) | (self.duty_cycle == 1)
+        y_vals = np.where(high, float(self.amplitude), float(-self.amplitude))
+        return self._to_int_samples(y_vals + self.offset)
 
 
 class GaussianPulse(ParameterizedWave):
@@ -329,36 +413,34 @@ class GaussianPulse(ParameterizedWave):
         """
         return self.__variance
 
-    def gen_samples(self, sampling_rate):
-        """このオブジェクトのパラメータに従うガウスパルスのサンプルリストを生成する
+    def _params(self):
+        return super()._params() + (self.duration, self.variance)
+
+    def _gen_sample_array(self, sampling_rate):
+        """このオブジェクトのパラメータに従うガウスパルスのサンプル配列を生成する
         
         Args:
             sampling_rate (int or float): サンプリングレート (単位: サンプル数/秒)
 
         Returns:
-            list of int: ガウスパルスのサンプルリスト
+            numpy.ndarray: ガウスパルスのサンプル配列 (dtype = numpy.int64)
         """
         if not (isinstance(sampling_rate, (int, float)) and (sampling_rate > 0)):
             raise ValueError(
                 "The 'sampling_rate' must be a number greater than zero.  ({})".format(sampling_rate))
 
-        num_samples = int(sampling_rate * self.num_cycles / self.frequency)
-        samples = []
+        num_samples = self._num_samples(sampling_rate)
+        idx = np.arange(num_samples, dtype = np.float64)
         x_offset = self.duration * self.phase / (2 * math.pi)
         whole_duration = self.duration * self.num_cycles
-
-        for i in range(num_samples):
-            x_val = i * whole_duration / num_samples + x_offset
-            if x_val >= 0:
-                x_val = x_val - int(x_val / self.duration) * self.duration
-            else:
-                x_val = math.ceil(-x_val / self.duration) * self.duration + x_val
-
-            tmp = x_val - (self.duration / 2)
-            y_val = self.amplitude * math.exp(-0.5 * tmp * tmp / self.variance)
-            samples.append(int(y_val + self.offset))
-
-        return samples
+        x_vals = idx * whole_duration / num_samples + x_offset
+        x_vals = np.where(
+            x_vals >= 0,
+            x_vals - np.trunc(x_vals / self.duration) * self.duration,
+            np.ceil(-x_vals / self.duration) * self.duration + x_vals)
+        tmp = x_vals - (self.duration / 2)
+        y_vals = self.amplitude * np.exp(-0.5 * tmp * tmp / self.variance)
+        return self._to_int_samples(y_vals + self.offset)
 
 class IqWave(object):
     """I/Q 波形クラス"""
@@ -429,28 +511,67 @@ class IqWave(object):
                 | I 相と Q 相のサンプルのタプルのリスト.
                 | タプルの 0 番目に I データが格納され, 1 番目に Q データが格納される.
         """
+        self.__check_args(sampling_rate, padding_size)
+        return list(map(tuple, self.__gen_iq_samples(sampling_rate, padding_size).tolist()))
+
+    def gen_sample_array(self, sampling_rate, padding_size = NUM_SAMPLES_IN_WAVE_BLOCK):
+        """I/Q 波形を NumPy 配列として生成する
+
+        | 戻り値はそのまま WaveSequence.add_chunk に渡すことができる.
+
+        Args:
+            sampling_rate (int or float): サンプリングレート (単位: サンプル数/秒)
+            padding_size (int):
+                | 戻り値の I/Q 波形データのサンプル数が, この値の倍数になるように I/Q サンプル配列に 0 データを追加する.
+                | デフォルトは送信波形の 1 ブロックに含まれるサンプル数 (= 64).
+
+        Returns:
+            numpy.ndarray:
+                | shape = (サンプル数, 2), dtype = numpy.int16 の I/Q サンプル配列.
+                | [:, 0] に I データが格納され, [:, 1] に Q データが格納される.
+                | 0x8000 ~ 0xFFFF の値は 2 の補数表現として負の値に変換される.
+                | I/Q 各相の波形がどちらもキャッシュできる場合, 波形とサンプリングレートが同じであれば,
+                | キャッシュされた同じ読み取り専用の配列を返す.
+        """
+        self.__check_args(sampling_rate, padding_size)
+        i_key = self.__i_wave.cache_key(sampling_rate)
+        q_key = self.__q_wave.cache_key(sampling_rate)
+        if i_key is None or q_key is None:
+            return self.__gen_iq_sample_array(sampling_rate, padding_size)
+        return get_wave_cache().get_or_create(
+            (IqWave, i_key, q_key, padding_size),
+            lambda: self.__gen_iq_sample_array(sampling_rate, padding_size))
+
+    @classmethod
+    def __check_args(cls, sampling_rate, padding_size):
         if not isinstance(sampling_rate, (int, float)):
             raise ValueError("The 'sampling_rate' must be a number.  ({})".format(sampling_rate))
 
-        if not isinstance(padding_size, int):
-            raise ValueError("The 'padding_size' must be an integer.  ({})".format(padding_size))
+        if not (isinstance(padding_size, int) and padding_size > 0):
+            raise ValueError("The 'padding_size' must be an integer greater than zero.  ({})".format(padding_size))
+
+    def __gen_iq_sample_array(self, sampling_rate, padding_size):
+        iq_samples = self.__gen_iq_samples(sampling_rate, padding_size)
+        if iq_samples.size > 0 and (iq_samples.min() < -32768 or 0xFFFF < iq_samples.max()):
+            raise ValueError(
+                'An AWG sample value must be an integer that can be expressed in 2 bytes.  (min = {}, max = {})'
+                .format(iq_samples.min(), iq_samples.max()))
+        iq_samples = iq_samples.astype(np.int16)
+        iq_samples.flags.writeable = False
+        return iq_samples
 
-        i_samples = self.__i_wave.gen_samples(sampling_rate)
-        q_samples = self.__q_wave.gen_samples(sampling_rate)
+    def __gen_iq_samples(self, sampling_rate, padding_size):
+        i_samples = self.__i_wave.gen_sample_array(sampling_rate)
+        q_samples = self.__q_wave.gen_sample_array(sampling_rate)
         diff = abs(len(i_samples) - len(q_samples))
         if diff != 0:
             long, short = ('I', 'Q') if len(q_samples) < len(i_samples) else ('Q', 'I')
             print('[WARNING] The length of the {} wave is shorter than the one of the {} wave.  '.format(short, long) +
                   '{} zero sample(s) are added to the end of the {} wave.'.format(diff, short))
-        
-        if len(i_samples) < len(q_samples):
-            i_samples.extend(diff * [0])
-        if len(q_samples) < len(i_samples):
-            q_samples.extend(diff * [0])        
-
-        for samples in (i_samples, q_samples):
-            if len(samples) % padding_size != 0:
-                additional_samples = padding_size - (len(samples) % padding_size)
-                samples.extend([0] * additional_samples)
-        
-        return list(zip(i_samples, q_samples))
+
+        num_samples = max(len(i_samples), len(q_samples))
+        num_samples = (num_samples + padding_size - 1) // padding_size * padding_size
+        iq_samples = np.zeros((num_samples, 2), dtype = np.int64)
+        iq_samples[:len(i_samples), 0] = i_samples
+        iq_samples[:len(q_samples), 1] = q_samples
+        return iq_samples
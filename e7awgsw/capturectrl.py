@@ -1,16 +1,19 @@
 import socket
 import time
-import struct
+import numpy as np
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from .hwparam import NUM_SAMPLES_IN_ADC_WORD, CAPTURED_SAMPLE_SIZE, CLASSIFICATION_RESULT_SIZE, MAX_CAPTURE_SIZE, MAX_INTEG_VEC_ELEMS, WAVE_RAM_PORT, CAPTURE_REG_PORT, CAPTURE_RAM_WORD_SIZE, CAPTURE_DATA_ALIGNMENT_SIZE, MAX_CAPTURE_PARAM_REGISTRY_ENTRIES
 from .memorymap import CaptureMasterCtrlRegs, CaptureCtrlRegs, CaptureParamRegs
 from .udpaccess import CaptureRegAccess, WaveRamAccess, ParamRegistryAccess
 from .hwdefs import DspUnit, CaptureUnit, CaptureModule, AWG, CaptureErr
 from .captureparam import CaptureParam
 from .exception import CaptureUnitTimeoutError
-from .logger import get_file_logger, get_null_logger, log_error, log_warning
+from .logger import get_loggers, get_null_logger, log_error, log_warning
 from .lock import ReentrantFileLock
 from .classification import ClassificationResult
+from .registry import ParamRegistry
+from .utiltool import create_capture_data_file
 
 class CaptureCtrlBase(object, metaclass = ABCMeta):
     #: 1 キャプチャモジュールが保存可能なサンプル数
@@ -26,9 +29,7 @@ class CaptureCtrlBase(object, metaclass = ABCMeta):
 
     def __init__(self, ip_addr, validate_args, enable_lib_log, logger):
         self._validate_args = validate_args
-        self._loggers = [logger]
-        if enable_lib_log:
-            self._loggers.append(get_file_logger())
+        self._loggers = get_loggers(logger, enable_lib_log)
 
         if self._validate_args:
             try:
@@ -41,6 +42,10 @@ class CaptureCtrlBase(object, metaclass = ABCMeta):
     def set_capture_params(self, capture_unit_id, param):
         """引数で指定したキャプチャユニットにキャプチャパラメータを設定する
 
+        | このコントローラが前回設定した値から変わったレジスタのみを書き換える.
+        | シーケンサや他のコントローラを使ってキャプチャパラメータを変更した場合は,
+        | reset_capture_units もしくは initialize を呼んでから, このメソッドを呼ぶこと.
+
         Args:
             capture_unit_id (CaptureUnit): キャプチャパラメータを設定するキャプチャユニットの ID 
             param (CaptureParam): 設定するキャプチャパラメータ
@@ -58,6 +63,8 @@ class CaptureCtrlBase(object, metaclass = ABCMeta):
 
     def register_capture_params(self, key, param):
         """キャプチャパラメータを専用のレジストリに登録する
+
+        | key に同じ内容のキャプチャパラメータが登録済みの場合, 登録は省略される.
         
         Args:
             key (int): キャプチャパラメータレジストリの登録場所を示すキー (0 ~ 511).
@@ -74,6 +81,36 @@ class CaptureCtrlBase(object, metaclass = ABCMeta):
         self._register_capture_params(key, param)
 
 
+    def load_capture_params(self, param_list):
+        """キャプチャパラメータを専用のレジストリに登録し, 登録先のキーを返す
+
+        | 同じ内容のキャプチャパラメータがレジストリに登録済みの場合, それを再利用してデータは送らない.
+        | レジストリに空きが無い場合, param_list 以外のキャプチャパラメータのうち,
+        | 最も長い間使われていないものから順に追い出す.
+        | レジストリの登録状況はこのオブジェクトが管理しているので,
+        | レジストリを他のオブジェクトやプロセスから変更しないこと.
+
+        Args:
+            param_list (list of CaptureParam): 登録するキャプチャパラメータのリスト
+
+        Returns:
+            list of int: param_list の各キャプチャパラメータが登録されたレジストリのキー (CaptureParamSetCmd に指定する値)
+        """
+        if self._validate_args:
+            try:
+                for param in param_list:
+                    self._validate_capture_param(param)
+                if len(set(param.fingerprint for param in param_list)) > self.MAX_CAPTURE_PARAM_REGISTRY_ENTRIES:
+                    raise ValueError(
+                        'Too many capture parameters to register at once.  (max = {})'
+                        .format(self.MAX_CAPTURE_PARAM_REGISTRY_ENTRIES))
+            except Exception as e:
+                log_error(e, *self._loggers)
+                raise
+
+        return self._load_capture_params(param_list)
+
+
     def initialize(self, *capture_unit_id_list):
         """引数で指定したキャプチャユニットを初期化する
 
@@ -113,6 +150,105 @@ class CaptureCtrlBase(object, metaclass = ABCMeta):
         return self._get_capture_data(capture_unit_id, num_samples, addr_offset)
 
 
+    def get_capture_data_array(self, capture_unit_id, num_samples, addr_offset = 0):
+        """引数で指定したキャプチャユニットが保存したサンプルデータを NumPy 配列として取得する.
+
+        Args:
+            capture_unit_id (int): この ID のキャプチャユニットが保存したサンプルデータを取得する
+            num_samples (int): 取得するサンプル数 (I と Q はまとめて 1 サンプル)
+            addr_offset (int): 取得するサンプルデータのバイトアドレスオフセット
+
+        Returns:
+            numpy.ndarray:
+                | shape = (num_samples, 2), dtype = numpy.float32 の配列.
+                | [:, 0] に I データが格納され, [:, 1] に Q データが格納される.
+        """
+        if self._validate_args:
+            try:
+                self._validate_capture_unit_id(capture_unit_id)
+                self._validate_num_capture_samples(num_samples)
+                self._validate_addr_offset(addr_offset)
+            except Exception as e:
+                log_error(e, *self._loggers)
+                raise
+
+        return self._get_capture_data_array(capture_unit_id, num_samples, addr_offset)
+
+
+    def set_capture_addr_offset(self, byte_offset, *capture_unit_id_list):
+        """引数で指定したキャプチャユニットが, 次のキャプチャのデータを保存するアドレスを変更する.
+
+        | 各キャプチャユニットのキャプチャ領域の先頭アドレス + byte_offset が, 次のキャプチャのデータの格納先となる.
+        | キャプチャしたデータを取得する際は, 同じ値を addr_offset に指定すること.
+        | set_capture_params を呼ぶと, byte_offset は 0 に戻る.
+
+        Args:
+            byte_offset (int): キャプチャ領域の先頭からのバイトオフセット.  CAPTURE_DATA_ALIGNMENT_SIZE の倍数でなければならない.
+            *capture_unit_id_list (list of CaptureUnit): キャプチャデータの格納先を変更するキャプチャユニットの ID
+        """
+        if self._validate_args:
+            try:
+                self._validate_capture_unit_id(*capture_unit_id_list)
+                if not (isinstance(byte_offset, int) and (0 <= byte_offset and byte_offset < MAX_CAPTURE_SIZE)):
+                    raise ValueError(
+                        "'byte_offset' must be an integer between {} and {} inclusive.  '{}' was set."
+                        .format(0, MAX_CAPTURE_SIZE - 1, byte_offset))
+                if (byte_offset % CAPTURE_DATA_ALIGNMENT_SIZE) != 0:
+                    raise ValueError(
+                        "'byte_offset' must be a multiple of {}.  '{}' was set."
+                        .format(CAPTURE_DATA_ALIGNMENT_SIZE, byte_offset))
+            except Exception as e:
+                log_error(e, *self._loggers)
+                raise
+
+        self._set_capture_addr_offset(byte_offset, *capture_unit_id_list)
+
+
+    def read_capture_to_file(self, capture_unit_id, filepath, num_samples = None, addr_offset = 0):
+        """引数で指定したキャプチャユニットが保存したサンプルデータを .npy ファイルに直接書き込む.
+
+        | サンプルデータは一定サイズずつ読み出してファイルに書き込むので, データ全体をメモリ上に保持しない.
+        | 作成したファイルは load_capture_data で読み込める.
+
+        Args:
+            capture_unit_id (int): この ID のキャプチャユニットが保存したサンプルデータを書き込む
+            filepath (string): サンプルデータを書き込むファイルのパス.  拡張子が .npy でない場合, .npy が付加される.
+            num_samples (int):
+                | 書き込むサンプル数 (I と Q はまとめて 1 サンプル).
+                | None の場合, キャプチャユニットが保存したサンプル数となる.
+            addr_offset (int): 書き込むサンプルデータのバイトアドレスオフセット
+        """
+        self.read_captures_to_files({capture_unit_id : filepath}, num_samples, addr_offset)
+
+
+    def read_captures_to_files(self, capture_unit_id_to_filepath, num_samples = None, addr_offset = 0):
+        """引数で指定した各キャプチャユニットが保存したサンプルデータを, それぞれ .npy ファイルに直接書き込む.
+
+        Args:
+            capture_unit_id_to_filepath ({CaptureUnit -> string}):
+                | key = キャプチャユニット ID
+                | value = そのキャプチャユニットが保存したサンプルデータを書き込むファイルのパス
+            num_samples (int):
+                | 各キャプチャユニットについて書き込むサンプル数 (I と Q はまとめて 1 サンプル).
+                | None の場合, 各キャプチャユニットが保存したサンプル数となる.
+            addr_offset (int): 書き込むサンプルデータのバイトアドレスオフセット
+        """
+        if self._validate_args:
+            try:
+                if not isinstance(capture_unit_id_to_filepath, dict):
+                    raise ValueError(
+                        "Invalid capture unit ID to file path dict.  '{}'".format(capture_unit_id_to_filepath))
+                self._validate_capture_unit_id(*capture_unit_id_to_filepath.keys())
+                if num_samples is not None:
+                    self._validate_num_capture_samples(num_samples)
+                self._validate_addr_offset(addr_offset)
+            except Exception as e:
+                log_error(e, *self._loggers)
+                raise
+
+        self._read_captures_to_files(capture_unit_id_to_filepath, num_samples, addr_offset)
+
+
     def get_classification_results(self, capture_unit_id, num_results, addr_offset = 0):
         """引数で指定したキャプチャユニットが保存した四値化結果を取得する.
 
@@ -371,6 +507,10 @@ class CaptureCtrlBase(object, metaclass = ABCMeta):
     def _set_capture_params(self, capture_unit_id, param):
         pass
 
+    @abstractmethod
+    def _load_capture_params(self, param_list):
+        pass
+
     @abstractmethod
     def _initialize(self, *capture_unit_id_list):
         pass
@@ -379,10 +519,22 @@ class CaptureCtrlBase(object, metaclass = ABCMeta):
     def _get_capture_data(self, capture_unit_id, num_samples, addr_offset):
         pass
 
+    @abstractmethod
+    def _get_capture_data_array(self, capture_unit_id, num_samples, addr_offset):
+        pass
+
+    @abstractmethod
+    def _set_capture_addr_offset(self, byte_offset, *capture_unit_id_list):
+        pass
+
     @abstractmethod
     def _get_classification_results(self, capture_unit_id, num_results, addr_offset):
         pass
 
+    @abstractmethod
+    def _read_captures_to_files(self, capture_unit_id_to_filepath, num_samples, addr_offset):
+        pass
+
     @abstractmethod
     def _num_captured_samples(self, capture_unit_id):
         pass
@@ -433,6 +585,11 @@ class CaptureCtrl(CaptureCtrlBase):
     __CAP_PARAM_REGISTRY_ADDR = 0x1F0000000
     # キャプチャパラメータ 1つ当たりのレジストリのサイズ (bytes)
     __CAP_PARAM_REGISTRY_SIZE = 0x10000
+    # キャプチャデータをファイルに書き込む際に, 1 度に読み出すデータのサイズ (bytes)
+    __FILE_WRITE_CHUNK_SIZE = 4 * 1024 * 1024
+    # キャプチャパラメータの差分を書き込む際, 変更されたレジスタの間にある変更されていないレジスタがこの数以下なら,
+    # それらもまとめて 1 回で書き込む
+    __MAX_UNCHANGED_REGS_TO_REWRITE = 64
 
     def __init__(
         self,
@@ -440,7 +597,8 @@ class CaptureCtrl(CaptureCtrlBase):
         *,
         validate_args = True,
         enable_lib_log = True,
-        logger = get_null_logger()):
+        logger = get_null_logger(),
+        retry_policy = None):
         """
         Args:
             ip_addr (string): キャプチャユニット制御モジュールに割り当てられた IP アドレス (例 '10.0.0.16')
@@ -451,11 +609,23 @@ class CaptureCtrl(CaptureCtrlBase):
                 | True -> ライブラリの標準のログ機能を有効にする.
                 | False -> ライブラリの標準のログ機能を無効にする.
             logger (logging.Logger): ユーザ独自のログ出力に用いる Logger オブジェクト
+            retry_policy (RetryPolicy):
+                | 送った要求に対する応答待ちのタイムアウトと再送の方針.
+                | None の場合, デフォルトの RetryPolicy を使う.
         """
         super().__init__(ip_addr, validate_args, enable_lib_log, logger)
-        self.__reg_access = CaptureRegAccess(ip_addr, CAPTURE_REG_PORT, *self._loggers)
-        self.__wave_ram_access = WaveRamAccess(ip_addr, WAVE_RAM_PORT, *self._loggers)
-        self.__registry_access = ParamRegistryAccess(ip_addr, WAVE_RAM_PORT, *self._loggers)
+        self.__reg_access = CaptureRegAccess(
+            ip_addr, CAPTURE_REG_PORT, *self._loggers, retry_policy = retry_policy)
+        self.__wave_ram_access = WaveRamAccess(
+            ip_addr, WAVE_RAM_PORT, *self._loggers, retry_policy = retry_policy)
+        self.__registry_access = ParamRegistryAccess(
+            ip_addr, WAVE_RAM_PORT, *self._loggers, retry_policy = retry_policy)
+        # キャプチャパラメータレジストリの登録状況
+        self.__cap_param_registry = ParamRegistry(self.MAX_CAPTURE_PARAM_REGISTRY_ENTRIES)
+        # キャプチャユニット ID -> そのキャプチャユニットに最後に書き込んだキャプチャパラメータのレジスタイメージ
+        self.__param_images = {}
+        # キャプチャユニット ID -> そのキャプチャユニットに最後に書き込んだキャプチャアドレス
+        self.__capture_addrs = {}
         if ip_addr == 'localhost':
             ip_addr = '127.0.0.1'
         filepath = '/tmp/e7capture_{}.lock'.format(socket.inet_ntoa(socket.inet_aton(ip_addr))) 
@@ -489,106 +659,107 @@ class CaptureCtrl(CaptureCtrlBase):
     def _set_capture_params(self, capture_unit_id, param):
         self.__check_capture_size('Capture unit {}'.format(capture_unit_id), param)
         addr = CaptureParamRegs.Addr.capture(capture_unit_id)
-        self.__set_sum_sec_len(self.__reg_access, addr, param.sum_section_list)
-        self.__set_num_integ_sectinos(self.__reg_access, addr, param.num_integ_sections)
-        self.__enable_dsp_units(self.__reg_access, addr, param.dsp_units_enabled)
-        self.__set_capture_delay(self.__reg_access, addr, param.capture_delay)
-        self.__set_capture_addr(self.__reg_access, addr, self.__CAPTURE_ADDR[capture_unit_id])
-        self.__set_comp_fir_coefs(self.__reg_access, addr, param.complex_fir_coefs)
-        self.__set_real_fir_coefs(self.__reg_access, addr, param.real_fir_i_coefs, param.real_fir_q_coefs)
-        self.__set_comp_window_coefs(self.__reg_access, addr, param.complex_window_coefs)
-        self.__set_sum_range(self.__reg_access, addr, param.sum_start_word_no, param.num_words_to_sum)
-        self.__set_decision_func_params(
-            self.__reg_access,
-            addr,
-            [*param.get_decision_func_params(0), *param.get_decision_func_params(1)])
+        image = param.register_image
+        # 書き込みに失敗した場合, レジスタの値は不明とする
+        prev_image = self.__param_images.pop(capture_unit_id, ())
+        for offset, data in self.__diff_register_images(image, prev_image):
+            self.__reg_access.write_bytes(addr, offset, data)
+        self.__param_images[capture_unit_id] = image
+        self.__set_capture_addr(capture_unit_id, self.__CAPTURE_ADDR[capture_unit_id])
 
 
     def _register_capture_params(self, key, param):
         self.__check_capture_size('Capture param entry {}'.format(key), param)
+        fingerprint = param.fingerprint
+        if self.__cap_param_registry.fingerprint(key) == fingerprint:
+            # 登録済み
+            self.__cap_param_registry.find(fingerprint)
+            return
+
+        self.__cap_param_registry.put(key, fingerprint)
+        try:
+            self.__write_capture_params_to_registry(key, param)
+        except:
+            # 登録に失敗したエントリの内容は不明とする
+            self.__cap_param_registry.invalidate(key)
+            raise
+
+
+    def _load_capture_params(self, param_list):
+        for param in param_list:
+            self.__check_capture_size('Capture param', param)
+        fingerprints = [param.fingerprint for param in param_list]
+        keys = [self.__cap_param_registry.find(fingerprint) for fingerprint in fingerprints]
+        pinned_keys = set(key for key in keys if key is not None)
+        for i, param in enumerate(param_list):
+            if keys[i] is not None:
+                continue
+            # param_list 内に同じ内容のキャプチャパラメータがある場合は, 先に登録したものを使う
+            key = self.__cap_param_registry.find(fingerprints[i])
+            if key is None:
+                try:
+                    key, _ = self.__cap_param_registry.assign(fingerprints[i], 0, pinned_keys)
+                except ValueError as e:
+                    log_error(e, *self._loggers)
+                    raise
+                try:
+                    self.__write_capture_params_to_registry(key, param)
+                except:
+                    self.__cap_param_registry.invalidate(key)
+                    raise
+            keys[i] = key
+            pinned_keys.add(key)
+        return keys
+
+
+    def __write_capture_params_to_registry(self, key, param):
         addr = self.__CAP_PARAM_REGISTRY_ADDR + self.__CAP_PARAM_REGISTRY_SIZE * key
-        self.__set_sum_sec_len(self.__registry_access, addr, param.sum_section_list)
-        self.__set_num_integ_sectinos(self.__registry_access, addr, param.num_integ_sections)
-        self.__enable_dsp_units(self.__registry_access, addr, param.dsp_units_enabled)
-        self.__set_capture_delay(self.__registry_access, addr, param.capture_delay)
-        self.__set_comp_fir_coefs(self.__registry_access, addr, param.complex_fir_coefs)
-        self.__set_real_fir_coefs(
-            self.__registry_access, addr, param.real_fir_i_coefs, param.real_fir_q_coefs)
-        self.__set_comp_window_coefs(self.__registry_access, addr, param.complex_window_coefs)
-        self.__set_sum_range(self.__registry_access, addr, param.sum_start_word_no, param.num_words_to_sum)
-        self.__set_decision_func_params(
-            self.__registry_access,
-            addr,
-            [*param.get_decision_func_params(0), *param.get_decision_func_params(1)])
-
-
-    def __set_sum_sec_len(self, accessor, addr, sum_sec_list):
-        """総和区間長とポストブランク長の設定"""
-        num_sum_secs = len(sum_sec_list)
-        accessor.write(addr, CaptureParamRegs.Offset.NUM_SUM_SECTIONS, num_sum_secs)
-        sum_sec_len_list = [sum_sec[0] for sum_sec in sum_sec_list]
-        accessor.multi_write(addr, CaptureParamRegs.Offset.sum_section_length(0), *sum_sec_len_list)
-        post_blank_len_list = [sum_sec[1] for sum_sec in sum_sec_list]
-        accessor.multi_write(addr, CaptureParamRegs.Offset.post_blank_length(0), *post_blank_len_list)
-
-
-    def __set_num_integ_sectinos(self, accessor, addr, num_integ_sectinos):
-        """統合区間数の設定"""
-        accessor.write(addr, CaptureParamRegs.Offset.NUM_INTEG_SECTIONS, num_integ_sectinos)
-
-
-    def __enable_dsp_units(self, accessor, addr, dsp_units):
-        """DSP ユニットの有効化フラグの設定"""
-        reg_val = 0
-        for dsp_unit in dsp_units:
-            reg_val |= 1 << dsp_unit
-        accessor.write(addr, CaptureParamRegs.Offset.DSP_MODULE_ENABLE, reg_val)
-
-
-    def __set_capture_delay(self, accessor, addr, capture_delay):
-        """キャプチャディレイの設定"""
-        accessor.write(addr, CaptureParamRegs.Offset.CAPTURE_DELAY, capture_delay)
-
-
-    def __set_capture_addr(self, accessor, addr, capture_addr):
+        self.__write_register_image(self.__registry_access, addr, param)
+
+
+    def __write_register_image(self, accessor, addr, param):
+        """キャプチャアドレス以外のキャプチャパラメータをまとめて書き込む"""
+        for offset, data in param.register_image:
+            accessor.write_bytes(addr, offset, data)
+
+
+    def __diff_register_images(self, image, prev_image):
+        """image のうち, prev_image と値が異なるか prev_image に含まれないレジスタの範囲を (offset, bytes) のリストで返す"""
+        diff = []
+        for offset, data in image:
+            vals = np.frombuffer(data, dtype = '<u4')
+            changed = np.ones(len(vals), dtype = bool)
+            seg_end = offset + len(data)
+            for prev_offset, prev_data in prev_image:
+                lo = max(offset, prev_offset)
+                hi = min(seg_end, prev_offset + len(prev_data))
+                if lo < hi:
+                    prev_vals = np.frombuffer(
+                        prev_data, dtype = '<u4', count = (hi - lo) // 4, offset = lo - prev_offset)
+                    changed[(lo - offset) // 4 : (hi - offset) // 4] = \
+                        vals[(lo - offset) // 4 : (hi - offset) // 4] != prev_vals
+
+            # 変更されたレジスタが連続する範囲 [begin, end) を求める
+            edges = np.flatnonzero(np.diff(changed.astype(np.int8), prepend = 0, append = 0))
+            runs = edges.reshape(-1, 2).tolist()
+            merged = []
+            for begin, end in runs:
+                if merged and begin - merged[-1][1] <= self.__MAX_UNCHANGED_REGS_TO_REWRITE:
+                    merged[-1][1] = end
+                else:
+                    merged.append([begin, end])
+            diff.extend((offset + begin * 4, data[begin * 4 : end * 4]) for begin, end in merged)
+        return diff
+
+
+    def __set_capture_addr(self, capture_unit_id, capture_addr):
         """キャプチャアドレスの設定"""
-        accessor.write(
-            addr, CaptureParamRegs.Offset.CAPTURE_ADDR, capture_addr // 32)
-
-
-    def __set_comp_fir_coefs(self, accessor, addr, comp_fir_coefs):
-        """複素 FIR フィルタの係数を設定する"""
-        coef_list = [int(coef.real) for coef in comp_fir_coefs]
-        accessor.multi_write(addr, CaptureParamRegs.Offset.comp_fir_re_coef(0), *coef_list)
-        coef_list = [int(coef.imag) for coef in comp_fir_coefs]
-        accessor.multi_write(addr, CaptureParamRegs.Offset.comp_fir_im_coef(0), *coef_list)
-
-
-    def __set_real_fir_coefs(self, accessor, addr, real_fir_i_coefs, real_fir_q_coefs):
-        """実数 FIR フィルタの係数を設定する"""
-        accessor.multi_write(addr, CaptureParamRegs.Offset.real_fir_i_coef(0), *real_fir_i_coefs)
-        accessor.multi_write(addr, CaptureParamRegs.Offset.real_fir_q_coef(0), *real_fir_q_coefs)
-
-
-    def __set_comp_window_coefs(self, accessor, addr, complex_window_coefs):
-        """複素窓関数の係数を設定する"""
-        coef_list = [int(coef.real) for coef in complex_window_coefs]
-        accessor.multi_write(addr, CaptureParamRegs.Offset.comp_window_re_coef(0), *coef_list)
-        coef_list = [int(coef.imag) for coef in complex_window_coefs]
-        accessor.multi_write(addr, CaptureParamRegs.Offset.comp_window_im_coef(0), *coef_list)
-
-
-    def __set_sum_range(self, accessor, addr, sum_start_word_no, num_words_to_sum):
-        """総和区間内の総和範囲を設定する"""
-        end_start_word_no = min(sum_start_word_no + num_words_to_sum - 1, CaptureParam.MAX_SUM_SECTION_LEN)
-        accessor.write(addr, CaptureParamRegs.Offset.SUM_START_TIME, sum_start_word_no)
-        accessor.write(addr, CaptureParamRegs.Offset.SUM_END_TIME, end_start_word_no)
-
-
-    def __set_decision_func_params(self, accessor, addr, params):
-        """四値化判定式のパラメータを設定する"""
-        coef_list = [int.from_bytes(param.tobytes(), 'little') for param in params]
-        accessor.multi_write(addr, CaptureParamRegs.Offset.decision_func_params(0), *coef_list)
+        if self.__capture_addrs.get(capture_unit_id) == capture_addr:
+            return
+        self.__capture_addrs.pop(capture_unit_id, None)
+        self.__reg_access.write(
+            CaptureParamRegs.Addr.capture(capture_unit_id), CaptureParamRegs.Offset.CAPTURE_ADDR, capture_addr // 32)
+        self.__capture_addrs[capture_unit_id] = capture_addr
 
 
     def _initialize(self, *capture_unit_id_list):
@@ -603,16 +774,61 @@ class CaptureCtrl(CaptureCtrlBase):
 
 
     def _get_capture_data(self, capture_unit_id, num_samples, addr_offset):
-        num_bytes = num_samples * CAPTURED_SAMPLE_SIZE
-        num_bytes = (num_bytes + CAPTURE_RAM_WORD_SIZE - 1) // CAPTURE_RAM_WORD_SIZE
-        num_bytes *= CAPTURE_RAM_WORD_SIZE
-        rd_addr = self.__CAPTURE_ADDR[capture_unit_id] + addr_offset
-        rd_data = self.__wave_ram_access.read(rd_addr, num_bytes)
-        part_size = CAPTURED_SAMPLE_SIZE // 2
-        samples = [rd_data[i : i + part_size] for i in range(0, num_bytes, part_size)]
-        samples = [struct.unpack('<f', sample)[0] for sample in samples]
-        samples = samples[0:num_samples * 2]
-        return list(zip(samples[0::2], samples[1::2]))
+        samples = self._get_capture_data_array(capture_unit_id, num_samples, addr_offset)
+        return list(zip(samples[:, 0].tolist(), samples[:, 1].tolist()))
+
+
+    def _get_capture_data_array(self, capture_unit_id, num_samples, addr_offset):
+        start_addr = self.__CAPTURE_ADDR[capture_unit_id] + addr_offset
+        # キャプチャ RAM のワード境界に揃えた範囲を読む
+        rd_start_addr = start_addr // CAPTURE_RAM_WORD_SIZE * CAPTURE_RAM_WORD_SIZE
+        rd_end_addr = start_addr + num_samples * CAPTURED_SAMPLE_SIZE
+        rd_end_addr = (rd_end_addr + CAPTURE_RAM_WORD_SIZE - 1) // CAPTURE_RAM_WORD_SIZE * CAPTURE_RAM_WORD_SIZE
+        rd_data = bytearray(rd_end_addr - rd_start_addr)
+        self.__wave_ram_access.read_into(rd_start_addr, rd_data)
+        samples = np.frombuffer(
+            rd_data, dtype = '<f4', count = num_samples * 2, offset = start_addr - rd_start_addr)
+        return samples.reshape(num_samples, 2)
+
+
+    def _set_capture_addr_offset(self, byte_offset, *capture_unit_id_list):
+        for capture_unit_id in capture_unit_id_list:
+            self.__set_capture_addr(capture_unit_id, self.__CAPTURE_ADDR[capture_unit_id] + byte_offset)
+
+
+    def _read_captures_to_files(self, capture_unit_id_to_filepath, num_samples, addr_offset):
+        # ネットワークからの読み出しとファイルへの書き込みを並行して行う
+        with ThreadPoolExecutor(max_workers = 1) as file_writer:
+            for capture_unit_id, filepath in capture_unit_id_to_filepath.items():
+                if num_samples is None:
+                    num_samples_to_read = self._num_captured_samples(capture_unit_id)
+                else:
+                    num_samples_to_read = num_samples
+                self.__read_capture_to_file(
+                    capture_unit_id, filepath, num_samples_to_read, addr_offset, file_writer)
+
+
+    def __read_capture_to_file(self, capture_unit_id, filepath, num_samples, addr_offset, file_writer):
+        start_addr = self.__CAPTURE_ADDR[capture_unit_id] + addr_offset
+        end_addr = start_addr + num_samples * CAPTURED_SAMPLE_SIZE
+        # キャプチャ RAM のワード境界に揃えた範囲を一定サイズずつ読む
+        rd_start_addr = start_addr // CAPTURE_RAM_WORD_SIZE * CAPTURE_RAM_WORD_SIZE
+        rd_end_addr = (end_addr + CAPTURE_RAM_WORD_SIZE - 1) // CAPTURE_RAM_WORD_SIZE * CAPTURE_RAM_WORD_SIZE
+        bufs = [bytearray(self.__FILE_WRITE_CHUNK_SIZE) for _ in range(2)]
+        with create_capture_data_file(filepath, num_samples) as f:
+            writing = None
+            for i, rd_addr in enumerate(range(rd_start_addr, rd_end_addr, self.__FILE_WRITE_CHUNK_SIZE)):
+                # 2 つのバッファを交互に使い, 一方をファイルに書いている間にもう一方に読み出す
+                buf = memoryview(bufs[i % 2])
+                rd_size = min(self.__FILE_WRITE_CHUNK_SIZE, rd_end_addr - rd_addr)
+                self.__wave_ram_access.read_into(rd_addr, buf[0 : rd_size])
+                if writing is not None:
+                    writing.result()
+                data_start = max(start_addr, rd_addr) - rd_addr
+                data_end = min(end_addr, rd_addr + rd_size) - rd_addr
+                writing = file_writer.submit(f.write, buf[data_start : data_end])
+            if writing is not None:
+                writing.result()
 
 
     def _get_classification_results(self, capture_unit_id, num_results, addr_offset):
@@ -644,6 +860,9 @@ class CaptureCtrl(CaptureCtrlBase):
 
 
     def _reset_capture_units(self, *capture_unit_id_list):
+        for capture_unit_id in capture_unit_id_list:
+            self.__param_images.pop(capture_unit_id, None)
+            self.__capture_addrs.pop(capture_unit_id, None)
         with self.__flock:
             self.__select_ctrl_target(*capture_unit_id_list)
             self.__reg_access.write_bits(
@@ -1,8 +1,10 @@
 import copy
+import hashlib
 import numpy as np
 from .hwparam import NUM_SAMPLES_IN_ADC_WORD, MAX_INTEG_VEC_ELEMS, CLASSIFICATION_RESULT_SIZE, CAPTURED_SAMPLE_SIZE, CAPTURE_DATA_ALIGNMENT_SIZE
 from .hwdefs import DspUnit, DecisionFunc
-from .logger import get_file_logger, get_null_logger, log_error
+from .memorymap import CaptureParamRegs
+from .logger import get_loggers, get_null_logger, log_error
 
 
 class CaptureParam(object):
@@ -44,18 +46,17 @@ class CaptureParam(object):
         self.__sumsections = []
         self.__dsp_units = []
         self.__capture_delay = 0
-        self.__comp_fir_coefs = [0 + 0j] * self.NUM_COMPLEX_FIR_COEFS
-        self.__real_fir_i_coefs = [0] * self.NUM_REAL_FIR_COEFS
-        self.__real_fir_q_coefs = [0] * self.NUM_REAL_FIR_COEFS
-        self.__comp_window_coefs = [0 + 0j] * self.NUM_COMPLEXW_WINDOW_COEFS
+        self.__comp_fir_coefs = np.zeros(self.NUM_COMPLEX_FIR_COEFS, dtype = np.complex128)
+        self.__real_fir_i_coefs = np.zeros(self.NUM_REAL_FIR_COEFS, dtype = np.int64)
+        self.__real_fir_q_coefs = np.zeros(self.NUM_REAL_FIR_COEFS, dtype = np.int64)
+        self.__comp_window_coefs = np.zeros(self.NUM_COMPLEXW_WINDOW_COEFS, dtype = np.complex128)
         self.__sum_start_word_no = 0
         self.__num_words_to_sum = self.MAX_SUM_SECTION_LEN
         self.__decision_func_params = [
             (np.float32(0), np.float32(0), np.float32(0)),
             (np.float32(0), np.float32(0), np.float32(0))]
-        self.__loggers = [logger]
-        if enable_lib_log:
-            self.__loggers.append(get_file_logger())
+        self.__loggers = get_loggers(logger, enable_lib_log)
+        self.__clear_cache()
 
     @property
     def num_integ_sections(self):
@@ -77,6 +78,7 @@ class CaptureParam(object):
             raise ValueError(msg)
         
         self.__num_integ_sections = val
+        self.__clear_cache()
 
     def add_sum_section(self, num_words, num_post_blank_words):
         """総和区間を追加する
@@ -110,6 +112,7 @@ class CaptureParam(object):
             raise
 
         self.__sumsections.append((num_words, num_post_blank_words))
+        self.__clear_cache()
 
     def del_sum_section(self, index):
         """引数で指定したインデックスの総和区間を削除する
@@ -124,10 +127,12 @@ class CaptureParam(object):
             raise ValueError(msg)
 
         del self.__sumsections[index]
+        self.__clear_cache()
 
     def clear_sum_sections(self):
         """登録済みの全ての総和区間を削除する"""
         self.__sumsections = []
+        self.__clear_cache()
 
     @property
     def num_sum_sections(self):
@@ -185,6 +190,7 @@ class CaptureParam(object):
             log_error(msg, *self.__loggers)
             raise ValueError(msg)
         self.__dsp_units = dsp_units
+        self.__clear_cache()
 
     @property
     def dsp_units_enabled(self):
@@ -224,167 +230,137 @@ class CaptureParam(object):
             log_error(msg, *self.__loggers)
             raise ValueError(msg)
         self.__capture_delay = val
+        self.__clear_cache()
 
     @property
     def complex_fir_coefs(self):
         """複素 FIR フィルタの係数のリスト
 
         Args:
-            val (list of [complex | float | int]):
-                | 複素係数のリスト. 
+            val (list of [complex | float | int] or numpy.ndarray):
+                | 複素係数のリストもしくは 1 次元配列. 
                 | 各係数の実数および虚数成分は整数値とすること.
                 | 指定しなかった分の係数は全て 0 + 0j となる.
         Returns:
             list of complex: 複素 FIR フィルタの係数のリスト
         """
-        return copy.copy(self.__comp_fir_coefs)
+        return self.__comp_fir_coefs.tolist()
 
     @complex_fir_coefs.setter
     def complex_fir_coefs(self, val):
-        try:
-            if not isinstance(val, list):
-                raise ValueError('Invalid coefficient list  ({})'.format(val))
-
-            num_coefs = len(val)
-            if num_coefs == 0:
-                raise ValueError('Empty coefficient list was set.')
-
-            if num_coefs > self.NUM_COMPLEX_FIR_COEFS:
-                raise ValueError(
-                    'Complex FIR filter has up to {} coefficients.  {} coefficients were set.'
-                    .format(self.NUM_COMPLEX_FIR_COEFS, num_coefs))
-            
-            if not all([isinstance(coef, (float, int, complex)) for coef in val]):
-                raise ValueError("The type of complex FIR coefficients must be 'complex', 'float' or 'int'.")
-
-            val = [complex(coef) for coef in val] + [0 + 0j] * (self.NUM_COMPLEX_FIR_COEFS - num_coefs)
-            if not all([coef.real.is_integer() and coef.imag.is_integer() for coef in val]):
-                raise ValueError('Each part of a complex FIR coefficient must be an integer.')
-
-            if not all([self.__is_in_range(self.MIN_FIR_COEF_VAL, self.MAX_FIR_COEF_VAL, coef.real) and 
-                        self.__is_in_range(self.MIN_FIR_COEF_VAL, self.MAX_FIR_COEF_VAL, coef.imag)
-                        for coef in val]):
-                raise ValueError('Each part of a complex FIR coefficient must be {} ~ {}.'
-                    .format(self.MIN_FIR_COEF_VAL, self.MAX_FIR_COEF_VAL))
-        except Exception as e:
-            log_error(e, *self.__loggers)
-            raise
-
-        self.__comp_fir_coefs = val
+        self.__comp_fir_coefs = self.__to_coef_array(
+            val, self.NUM_COMPLEX_FIR_COEFS, self.MIN_FIR_COEF_VAL, self.MAX_FIR_COEF_VAL,
+            True, 'Complex FIR filter', 'complex FIR')
+        self.__clear_cache()
 
     @property
     def real_fir_i_coefs(self):
         """I データ用実数 FIR フィルタの係数
         
         Args:
-            val (list of [float | int]):
-                | 係数のリスト.
+            val (list of [float | int] or numpy.ndarray):
+                | 係数のリストもしくは 1 次元配列.
                 | 各係数は整数値とすること.
                 | 指定しなかった分の係数は全て 0 となる.
         Returns:
             list of int: I データ用実数 FIR フィルタの係数リスト
         """
-        return copy.copy(self.__real_fir_i_coefs)
+        return self.__real_fir_i_coefs.tolist()
 
     @real_fir_i_coefs.setter
     def real_fir_i_coefs(self, val):
-        self.__check_real_fir_coef_set(val)
-        self.__real_fir_i_coefs = [int(coef) for coef in val] + [0] * (self.NUM_REAL_FIR_COEFS - len(val))
+        self.__real_fir_i_coefs = self.__to_coef_array(
+            val, self.NUM_REAL_FIR_COEFS, self.MIN_FIR_COEF_VAL, self.MAX_FIR_COEF_VAL,
+            False, 'Real FIR filter', 'real FIR')
+        self.__clear_cache()
 
     @property
     def real_fir_q_coefs(self):
         """Q データ用実数 FIR フィルタの係数を設定する.
         
         Args:
-            val (list of [float | int]):
-                | 係数のリスト.
+            val (list of [float | int] or numpy.ndarray):
+                | 係数のリストもしくは 1 次元配列.
                 | 各係数は整数値とすること.
                 | 指定しなかった分の係数は全て 0 となる.
         Returns:
             list of int: Q データ用実数 FIR フィルタの係数リスト
         """
-        return copy.copy(self.__real_fir_q_coefs)
+        return self.__real_fir_q_coefs.tolist()
 
     @real_fir_q_coefs.setter
     def real_fir_q_coefs(self, val):
-        self.__check_real_fir_coef_set(val)
-        self.__real_fir_q_coefs = [int(coef) for coef in val] + [0] * (self.NUM_REAL_FIR_COEFS - len(val))
+        self.__real_fir_q_coefs = self.__to_coef_array(
+            val, self.NUM_REAL_FIR_COEFS, self.MIN_FIR_COEF_VAL, self.MAX_FIR_COEF_VAL,
+            False, 'Real FIR filter', 'real FIR')
+        self.__clear_cache()
 
-    def __check_real_fir_coef_set(self, val):
-        """実数 FIR の係数が正常かどうかチェック"""
+    def __to_coef_array(self, val, max_coefs, min_val, max_val, is_complex, filter_name, coef_name):
+        """係数のリストもしくは配列をチェックし, 指定されなかった分を 0 で埋めた max_coefs 個の係数の配列に変換する"""
         try:
-            if not isinstance(val, list):
+            if not isinstance(val, (list, np.ndarray)):
+                raise ValueError('Invalid coefficient list  ({})'.format(val))
+
+            coefs = np.asarray(val)
+            if coefs.ndim != 1:
                 raise ValueError('Invalid coefficient list  ({})'.format(val))
-            
-            num_coefs = len(val)
+
+            num_coefs = coefs.size
             if num_coefs == 0:
                 raise ValueError('Empty coefficient list was set.')
 
-            if num_coefs > self.NUM_REAL_FIR_COEFS:
+            if num_coefs > max_coefs:
+                raise ValueError(
+                    '{} has up to {} coefficients.  {} coefficients were set.'
+                    .format(filter_name, max_coefs, num_coefs))
+
+            if coefs.dtype.kind not in ('biufc' if is_complex else 'biuf'):
+                raise ValueError(
+                    "The type of {} coefficients must be {}."
+                    .format(coef_name, "'complex', 'float' or 'int'" if is_complex else "'int' or 'float'"))
+
+            if is_complex:
+                parts = (coefs.real, coefs.imag)
+                subject = 'Each part of a {} coefficient'.format(coef_name)
+            else:
+                parts = (coefs,)
+                subject = '{}{} coefficients'.format(coef_name[0].upper(), coef_name[1:])
+
+            # NaN は整数でないものとして, 無限大は範囲外として扱われる
+            if not all(np.all(part == np.trunc(part)) for part in parts):
                 raise ValueError(
-                    'Real FIR filter has up to {} coefficients.  {} coefficients were set.'
-                    .format(self.NUM_REAL_FIR_COEFS, num_coefs))
-            
-            if not all([isinstance(coef, (int, float)) for coef in val]):
-                raise ValueError("The type of real FIR coefficients must be 'int' or 'float'.")
-
-            if not all([float(coef).is_integer() for coef in val]):
-                raise ValueError('Real FIR coefficients must be integers.')
-
-            if not all([self.__is_in_range(self.MIN_FIR_COEF_VAL, self.MAX_FIR_COEF_VAL, coef) for coef in val]):
-                raise ValueError('Real FIR coefficients must be {} ~ {}.'
-                    .format(self.MIN_FIR_COEF_VAL, self.MAX_FIR_COEF_VAL))
+                    '{} must be {}.'.format(subject, 'an integer' if is_complex else 'integers'))
+
+            if not all(np.all((min_val <= part) & (part <= max_val)) for part in parts):
+                raise ValueError('{} must be {} ~ {}.'.format(subject, min_val, max_val))
         except Exception as e:
             log_error(e, *self.__loggers)
             raise
 
+        padded = np.zeros(max_coefs, dtype = np.complex128 if is_complex else np.int64)
+        padded[:num_coefs] = coefs
+        return padded
+
     @property
     def complex_window_coefs(self):
         """複素窓関数の係数リスト
 
         Args:
-            val (list of [complex | floar | int]):
-                | 複素係数のリスト. 
+            val (list of [complex | floar | int] or numpy.ndarray):
+                | 複素係数のリストもしくは 1 次元配列. 
                 | 各係数の実数および虚数成分は整数値とすること.
                 | 指定しなかった分の係数は全て 0 + 0j となる.
         Returns:
             list of complex: 複素窓関数の係数リスト
         """
-        return copy.copy(self.__comp_window_coefs)
+        return self.__comp_window_coefs.tolist()
 
     @complex_window_coefs.setter
     def complex_window_coefs(self, val):
-        try:
-            if not isinstance(val, list):
-                raise ValueError('Invalid coefficient list  ({})'.format(val))
-
-            num_coefs = len(val)
-            if num_coefs == 0:
-                raise ValueError('Empty coefficient list was set.')
-
-            if num_coefs > self.NUM_COMPLEXW_WINDOW_COEFS:
-                raise ValueError(
-                    'Complex window has up to {} coefficients.  {} coefficients were set.'
-                    .format(self.NUM_COMPLEXW_WINDOW_COEFS, num_coefs))
-            
-            if not all([isinstance(coef, (float, int, complex)) for coef in val]):
-                raise ValueError("The type of complex window coefficients must be 'complex', 'float' or 'int'.")
-
-            val = [complex(coef) for coef in val] + [0 + 0j] * (self.NUM_COMPLEXW_WINDOW_COEFS - num_coefs)
-            if not all([coef.real.is_integer() and coef.imag.is_integer() for coef in val]):
-                raise ValueError('Each part of a complex window coefficient must be an integer.')
-
-            if not all([self.__is_in_range(self.MIN_WINDOW_COEF_VAL, self.MAX_WINDOW_COEF_VAL, coef.real) and 
-                        self.__is_in_range(self.MIN_WINDOW_COEF_VAL, self.MAX_WINDOW_COEF_VAL, coef.imag)
-                        for coef in val]):
-                raise ValueError(
-                    'Each part of a complex window coefficient must be {} ~ {}.'
-                    .format(self.MIN_WINDOW_COEF_VAL, self.MAX_WINDOW_COEF_VAL))
-        except Exception as e:
-            log_error(e, *self.__loggers)
-            raise
-
-        self.__comp_window_coefs = val
+        self.__comp_window_coefs = self.__to_coef_array(
+            val, self.NUM_COMPLEXW_WINDOW_COEFS, self.MIN_WINDOW_COEF_VAL, self.MAX_WINDOW_COEF_VAL,
+            True, 'Complex window', 'complex window')
+        self.__clear_cache()
     
 
     def calc_capture_samples(self):
@@ -483,6 +459,7 @@ class CaptureParam(object):
             log_error(msg, *self.__loggers)
             raise ValueError(msg)
         self.__sum_start_word_no = val
+        self.__clear_cache()
 
     @property
     def num_words_to_sum(self):
@@ -512,6 +489,7 @@ class CaptureParam(object):
             log_error(msg, *self.__loggers)
             raise ValueError(msg)
         self.__num_words_to_sum = val
+        self.__clear_cache()
 
     def set_decision_func_params(self, func_sel, coef_a, coef_b, const_c):
         """四値化に使用する判定式のパラメータを設定する
@@ -551,6 +529,7 @@ class CaptureParam(object):
             raise ValueError(msg)
 
         self.__decision_func_params[int(func_sel)] = (coef_a, coef_b, const_c)
+        self.__clear_cache()
 
     def get_decision_func_params(self, func_sel):
         """四値化に使用する判定式のパラメータを取得する
@@ -570,6 +549,79 @@ class CaptureParam(object):
         
         return self.__decision_func_params[int(func_sel)]
 
+    @property
+    def fingerprint(self):
+        """このキャプチャパラメータの内容から計算したハッシュ値
+
+        | キャプチャアドレス以外のキャプチャユニットに設定される値が全て同じキャプチャパラメータは同じ値を持つ.
+
+        Returns:
+            string: このキャプチャパラメータの内容を表す 16 進数文字列
+        """
+        if self.__fingerprint is None:
+            h = hashlib.blake2b(digest_size = 16)
+            for offset, data in self.register_image:
+                h.update(offset.to_bytes(4, 'little'))
+                h.update(data)
+            self.__fingerprint = h.hexdigest()
+        return self.__fingerprint
+
+    @property
+    def register_image(self):
+        """このキャプチャパラメータをキャプチャユニットのパラメータレジスタに書き込む際のデータ
+
+        | キャプチャアドレスと読み出し専用のレジスタの値は含まない.
+        | 一度作成したデータは, このキャプチャパラメータが変更されるまで再利用される.
+
+        Returns:
+            tuple of (int, bytes):
+                | (書き込み先の先頭レジスタのオフセット, リトルエンディアンで並べたレジスタの値) のタプル.
+                | オフセットの昇順に並び, 連続するレジスタの値は 1 つにまとめられている.
+        """
+        if self.__register_image is None:
+            self.__register_image = self.__gen_register_image()
+        return self.__register_image
+
+    def __gen_register_image(self):
+        dsp_module_enable = 0
+        for dsp_unit in self.__dsp_units:
+            dsp_module_enable |= 1 << dsp_unit
+        sum_end_word_no = min(self.__sum_start_word_no + self.__num_words_to_sum - 1, self.MAX_SUM_SECTION_LEN)
+        sumsections = np.array(self.__sumsections, dtype = '<u4').reshape(-1, 2)
+        decision_func_params = [param for params in self.__decision_func_params for param in params]
+        Offset = CaptureParamRegs.Offset
+        segments = [
+            (Offset.DSP_MODULE_ENABLE,
+             np.array([dsp_module_enable, self.__capture_delay], dtype = '<u4')),
+            (Offset.NUM_INTEG_SECTIONS,
+             np.array([self.__num_integ_sections, len(self.__sumsections), self.__sum_start_word_no, sum_end_word_no],
+                      dtype = '<u4')),
+            (Offset.sum_section_length(0), sumsections[:, 0]),
+            (Offset.post_blank_length(0), sumsections[:, 1]),
+            (Offset.comp_fir_re_coef(0), self.__comp_fir_coefs.real.astype('<i4')),
+            (Offset.comp_fir_im_coef(0), self.__comp_fir_coefs.imag.astype('<i4')),
+            (Offset.real_fir_i_coef(0), self.__real_fir_i_coefs.astype('<i4')),
+            (Offset.real_fir_q_coef(0), self.__real_fir_q_coefs.astype('<i4')),
+            (Offset.comp_window_re_coef(0), self.__comp_window_coefs.real.astype('<i4')),
+            (Offset.comp_window_im_coef(0), self.__comp_window_coefs.imag.astype('<i4')),
+            (Offset.decision_func_params(0), np.array(decision_func_params, dtype = '<f4'))]
+
+        # 連続するレジスタへの書き込みをまとめる
+        image = []
+        for offset, vals in segments:
+            data = vals.tobytes()
+            if not data:
+                continue
+            if image and image[-1][0] + len(image[-1][1]) == offset:
+                image[-1] = (image[-1][0], image[-1][1] + data)
+            else:
+                image.append((offset, data))
+        return tuple(image)
+
+    def __clear_cache(self):
+        self.__register_image = None
+        self.__fingerprint = None
+
     def __is_in_range(self, min, max, val):
         return (min <= val) and (val <= max)
 
@@ -1,4 +1,6 @@
 
+import numpy as np
+
 class ClassificationResult:
     """四値化結果を保持するクラス"""
 
@@ -7,6 +9,47 @@ class ClassificationResult:
         self.__len = num_results
 
 
+    def save(self, filepath):
+        """四値化結果を 1 つ 2 bits に詰めたままバイナリデータとして保存する
+
+        | filepath の拡張子が .npz でない場合, .npz が付加される.
+        | 保存したファイルは load で読み込める.
+
+        Args:
+            filepath (string): 保存するファイルのパス
+        """
+        num_bytes = (self.__len + 3) // 4
+        np.savez(
+            filepath,
+            num_results = np.uint64(self.__len),
+            result = np.frombuffer(bytes(self.__result[0 : num_bytes]), dtype = np.uint8))
+
+
+    @classmethod
+    def load(cls, filepath):
+        """save で保存した四値化結果を読み込む
+
+        Args:
+            filepath (string): 読み込むファイルのパス
+
+        Returns:
+            ClassificationResult: 読み込んだ四値化結果
+        """
+        with np.load(filepath) as data:
+            return ClassificationResult(data['result'].tobytes(), int(data['num_results']))
+
+
+    def to_array(self):
+        """四値化結果を NumPy 配列として返す
+
+        Returns:
+            numpy.ndarray: 各要素に 1 つの四値化結果 (0 ~ 3) を格納した dtype = numpy.uint8 の配列
+        """
+        packed = np.frombuffer(bytes(self.__result[0 : (self.__len + 3) // 4]), dtype = np.uint8)
+        results = (packed[:, np.newaxis] >> np.array([0, 2, 4, 6], dtype = np.uint8)) & 0x3
+        return results.reshape(-1)[0 : self.__len]
+
+
     def __repr__(self):
         return self.__str__()
 
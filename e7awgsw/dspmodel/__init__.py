@@ -0,0 +1,17 @@
+__all__ = [
+    'dsp',
+    'to_capture_data',
+    'complex_fir',
+    'decimation',
+    'real_fir',
+    'sum_section_layout',
+    'extract_sections',
+    'complex_window',
+    'summation',
+    'integration',
+    'fixed_to_float',
+    'classification']
+
+from .pipeline import dsp, to_capture_data
+from .pipeline import complex_fir, decimation, real_fir, sum_section_layout, extract_sections
+from .pipeline import complex_window, summation, integration, fixed_to_float, classification
@@ -0,0 +1,322 @@
+import numpy as np
+from . import wideint
+from ..hwdefs import DspUnit, DecisionFunc
+from ..hwparam import NUM_SAMPLES_IN_ADC_WORD
+
+ACCUMULATOR_BITS = 121        #: DSP の積算器のビット幅
+DECIMATION_RATIO = 4          #: 間引き後のサンプル数の比
+WINDOW_FRAC_BITS = 30         #: 窓関数を適用したデータの小数部のビット数
+_MAX_INT64 = (1 << 63) - 1
+
+
+def dsp(samples, capture_param):
+    """キャプチャユニットに samples を入力したときのキャプチャデータを計算する
+
+    | キャプチャユニットの DSP (複素 FIR, 間引き, 実数 FIR, 窓関数, 総和, 積算, 四値化) をビット単位で再現する.
+
+    Args:
+        samples (numpy.ndarray or list of (int, int)):
+            | キャプチャユニットに入力される I/Q サンプルのリスト or shape = (サンプル数, 2) の配列.
+            | capture_param.num_samples_to_process より少ない場合は, 足りない分を 0 とみなす.
+        capture_param (CaptureParam): キャプチャパラメータ
+
+    Returns:
+        numpy.ndarray:
+            | 四値化が有効な場合, 四値化結果 (0 ~ 3) を格納した dtype = numpy.uint8 の配列.
+            | それ以外の場合, shape = (サンプル数, 2), dtype = numpy.float32 の配列.
+            | [:, 0] に I データが格納され, [:, 1] に Q データが格納される.
+    """
+    num_samples = capture_param.num_samples_to_process
+    samples = np.asarray(samples, dtype = np.int64).reshape(-1, 2)[:num_samples]
+    i_samples = np.zeros(num_samples, dtype = np.int64)
+    q_samples = np.zeros(num_samples, dtype = np.int64)
+    i_samples[:len(samples)] = samples[:, 0]
+    q_samples[:len(samples)] = samples[:, 1]
+    dsp_units_enabled = capture_param.dsp_units_enabled
+
+    if DspUnit.COMPLEX_FIR in dsp_units_enabled:
+        i_samples, q_samples = complex_fir(i_samples, q_samples, capture_param.complex_fir_coefs)
+
+    # 間引きと実数 FIR はポストブランクを含むサンプル列全体に適用し, 後で各総和区間のサンプルを取り出す.
+    # 総和区間の直前のサンプルも FIR の入力となるため.
+    is_decimated = DspUnit.DECIMATION in dsp_units_enabled
+    if is_decimated:
+        i_samples = decimation(i_samples)
+        q_samples = decimation(q_samples)
+
+    if DspUnit.REAL_FIR in dsp_units_enabled:
+        i_samples = real_fir(i_samples, capture_param.real_fir_i_coefs)
+        q_samples = real_fir(q_samples, capture_param.real_fir_q_coefs)
+
+    starts, lengths = sum_section_layout(capture_param, is_decimated)
+    i_samples = extract_sections(i_samples, starts, lengths)
+    q_samples = extract_sections(q_samples, starts, lengths)
+
+    if DspUnit.COMPLEX_WINDOW in dsp_units_enabled:
+        i_samples, q_samples = complex_window(
+            i_samples, q_samples, lengths, capture_param.complex_window_coefs)
+    elif _may_overflow(i_samples, q_samples, lengths, capture_param):
+        i_samples = wideint.from_int64(i_samples)
+        q_samples = wideint.from_int64(q_samples)
+
+    if DspUnit.SUM in dsp_units_enabled:
+        i_samples, _ = summation(
+            i_samples, lengths, capture_param.sum_start_word_no, capture_param.num_words_to_sum)
+        q_samples, _ = summation(
+            q_samples, lengths, capture_param.sum_start_word_no, capture_param.num_words_to_sum)
+
+    if DspUnit.INTEGRATION in dsp_units_enabled:
+        i_samples = integration(i_samples, capture_param.num_integ_sections)
+        q_samples = integration(q_samples, capture_param.num_integ_sections)
+
+    num_frac_bits = WINDOW_FRAC_BITS if DspUnit.COMPLEX_WINDOW in dsp_units_enabled else 0
+    i_samples = fixed_to_float(i_samples, num_frac_bits)
+    q_samples = fixed_to_float(q_samples, num_frac_bits)
+
+    if DspUnit.CLASSIFICATION in dsp_units_enabled:
+        return classification(
+            i_samples,
+            q_samples,
+            capture_param.get_decision_func_params(DecisionFunc.U0),
+            capture_param.get_decision_func_params(DecisionFunc.U1))
+
+    return np.stack([i_samples, q_samples], axis = 1)
+
+
+def to_capture_data(result):
+    """dsp の戻り値を CaptureCtrl.get_capture_data (or get_classification_results) の戻り値と同じ形式に変換する
+
+    Returns:
+        list of (float, float) or list of int: I データと Q データのタプルのリスト or 四値化結果のリスト
+    """
+    if result.ndim == 1:
+        return result.tolist()
+    return list(map(tuple, result.tolist()))
+
+
+def complex_fir(i_samples, q_samples, coefs):
+    """複素 FIR フィルタを適用する
+
+    Args:
+        i_samples (numpy.ndarray): I データの整数配列
+        q_samples (numpy.ndarray): Q データの整数配列
+        coefs (numpy.ndarray): 複素 FIR フィルタの係数.  実部と虚部は整数.
+
+    Returns:
+        tuple of numpy.ndarray: (フィルタを適用した I データ, フィルタを適用した Q データ).  dtype = numpy.int64.
+    """
+    coefs = np.asarray(coefs)
+    re_coefs = np.real(coefs).astype(np.int64)
+    im_coefs = np.imag(coefs).astype(np.int64)
+    return (_fir(i_samples, re_coefs) - _fir(q_samples, im_coefs),
+            _fir(q_samples, re_coefs) + _fir(i_samples, im_coefs))
+
+
+def real_fir(samples, coefs):
+    """実数 FIR フィルタを適用する
+
+    Args:
+        samples (numpy.ndarray): 整数配列
+        coefs (numpy.ndarray): 実数 FIR フィルタの係数 (整数)
+
+    Returns:
+        numpy.ndarray: フィルタを適用したデータ.  dtype = numpy.int64.
+    """
+    return _fir(samples, np.asarray(coefs, dtype = np.int64))
+
+
+def _fir(samples, coefs):
+    """先頭のサンプルより前を 0 とみなして, 整数の FIR フィルタを適用する"""
+    samples = np.asarray(samples, dtype = np.int64)
+    result = np.zeros_like(samples)
+    for k, coef in enumerate(coefs.tolist()):
+        if coef != 0 and k < len(samples):
+            result[k:] += coef * samples[:len(samples) - k]
+    return result
+
+
+def decimation(samples):
+    """サンプル列を 1/4 に間引く
+
+    | 総和区間は 4 サンプル境界から始まるので, サンプル列全体を間引いてから総和区間を取り出しても結果は変わらない.
+    """
+    return samples[::DECIMATION_RATIO]
+
+
+def sum_section_layout(capture_param, is_decimated):
+    """DSP の入力サンプル列における各総和区間の位置を求める
+
+    Args:
+        capture_param (CaptureParam): キャプチャパラメータ
+        is_decimated (bool): 間引き後のサンプル列における位置を求める場合 True
+
+    Returns:
+        tuple of numpy.ndarray:
+            | (各総和区間の先頭のサンプルのインデックス, 各総和区間のサンプル数).
+            | 全統合区間の総和区間が順に並ぶ.
+    """
+    sum_sections = np.array(capture_param.sum_section_list, dtype = np.int64).reshape(-1, 2)
+    sum_section_lens = sum_sections[:, 0] * NUM_SAMPLES_IN_ADC_WORD
+    post_blank_lens = sum_sections[:, 1] * NUM_SAMPLES_IN_ADC_WORD
+    lengths = np.tile(sum_section_lens, capture_param.num_integ_sections)
+    intervals = np.tile(sum_section_lens + post_blank_lens, capture_param.num_integ_sections)
+    starts = np.concatenate([[0], np.cumsum(intervals[:-1])]).astype(np.int64)
+    if is_decimated:
+        # 間引きは総和区間ごとに 16 サンプル単位で行われる
+        starts //= DECIMATION_RATIO
+        lengths = lengths // (DECIMATION_RATIO * NUM_SAMPLES_IN_ADC_WORD) * NUM_SAMPLES_IN_ADC_WORD
+    return starts, lengths
+
+
+def extract_sections(samples, starts, lengths):
+    """samples から各総和区間のサンプルを取り出して連結する"""
+    return samples[_section_indices(starts, lengths)]
+
+
+def _section_indices(starts, lengths):
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(np.sum(lengths), dtype = np.int64)
+
+
+def _positions_in_sections(lengths):
+    """連結された総和区間の各サンプルの, 総和区間内の位置を返す"""
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(np.sum(lengths), dtype = np.int64) - np.repeat(offsets, lengths)
+
+
+def complex_window(i_samples, q_samples, lengths, coefs):
+    """各総和区間に複素窓関数を適用する
+
+    Args:
+        i_samples (numpy.ndarray): 連結された総和区間の I データの整数配列
+        q_samples (numpy.ndarray): 連結された総和区間の Q データの整数配列
+        lengths (numpy.ndarray): 各総和区間のサンプル数
+        coefs (numpy.ndarray): 複素窓関数の係数.  実部と虚部は整数.
+
+    Returns:
+        tuple of numpy.ndarray: (I データ, Q データ).  int64 に収まらないので wideint のリム配列で返す.
+    """
+    coefs = np.asarray(coefs)
+    coef_idx = _positions_in_sections(lengths) % len(coefs)
+    re_coefs = np.real(coefs).astype(np.int64)[coef_idx]
+    im_coefs = np.imag(coefs).astype(np.int64)[coef_idx]
+    return (wideint.sub(wideint.mul_int64(i_samples, re_coefs), wideint.mul_int64(q_samples, im_coefs)),
+            wideint.add(wideint.mul_int64(i_samples, im_coefs), wideint.mul_int64(q_samples, re_coefs)))
+
+
+def summation(samples, lengths, sum_start_word_no, num_words_to_sum):
+    """各総和区間の総和範囲のサンプルの総和を求める
+
+    | 総和範囲にサンプルが無い総和区間は, 結果から取り除かれる.
+
+    Args:
+        samples (numpy.ndarray): 連結された総和区間の int64 配列 or wideint のリム配列
+        lengths (numpy.ndarray): 各総和区間のサンプル数
+        sum_start_word_no (int): 総和範囲の先頭のワード番号
+        num_words_to_sum (int): 総和範囲のワード数
+
+    Returns:
+        tuple of numpy.ndarray: (総和, 総和後の各総和区間のサンプル数 (0 or 1))
+    """
+    lengths = np.asarray(lengths, dtype = np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    first = sum_start_word_no * NUM_SAMPLES_IN_ADC_WORD
+    # 総和範囲の末尾は int64 に収まらないことがあるので, 総和区間のサンプル数で先に制限する
+    last = min((sum_start_word_no + num_words_to_sum) * NUM_SAMPLES_IN_ADC_WORD - 1, int(np.max(lengths, initial = 0)))
+    last = np.minimum(last, lengths - 1)
+    has_samples = last >= first
+    starts = (offsets + first)[has_samples]
+    stops = (offsets + last + 1)[has_samples]
+    if samples.ndim > 1:
+        summed = wideint.segment_sum(samples, starts, stops)
+    elif len(starts) == 0:
+        summed = np.zeros(0, dtype = np.int64)
+    else:
+        # stops の最後の要素が len(samples) でも reduceat に渡せるように, 末尾に 0 を付け足す
+        summed = np.add.reduceat(np.append(samples, 0), np.stack([starts, stops], axis = 1).ravel())[0::2]
+    return summed, has_samples.astype(np.int64)
+
+
+def integration(samples, num_integ_sections):
+    """統合区間の間で, 同じ総和区間の同じ位置のサンプルを積算する
+
+    Args:
+        samples (numpy.ndarray): 全統合区間の総和区間を連結した int64 配列 or wideint のリム配列
+        num_integ_sections (int): 統合区間数
+
+    Returns:
+        numpy.ndarray: 1 統合区間分の積算結果
+    """
+    samples = samples.reshape((num_integ_sections, -1) + samples.shape[1:])
+    if samples.ndim == 2:
+        return np.sum(samples, axis = 0)
+    return wideint.reduce_sum(samples, axis = 0)
+
+
+def _may_overflow(i_samples, q_samples, lengths, capture_param):
+    """総和と積算の結果が int64 に収まらない可能性があるかどうか"""
+    if len(i_samples) == 0:
+        return False
+    max_abs = max(int(np.max(np.abs(i_samples))), int(np.max(np.abs(q_samples))))
+    num_terms = int(np.max(lengths)) * capture_param.num_integ_sections
+    return max_abs * num_terms > _MAX_INT64
+
+
+def fixed_to_float(samples, num_frac_bits):
+    """積算器の固定小数点数を DSP と同じ手順で単精度浮動小数点数に変換する
+
+    | 積算器の値の下位 64 bit と上位 57 bit を別々に単精度浮動小数点数に変換し, 指数部を調整してから足し合わせる.
+
+    Args:
+        samples (numpy.ndarray): int64 配列 or wideint のリム配列
+        num_frac_bits (int): 小数部のビット数
+
+    Returns:
+        numpy.ndarray: dtype = numpy.float32 の配列
+    """
+    if samples.ndim == 1:
+        negative = samples < 0
+        low = np.abs(samples).view(np.uint64)
+        high = np.zeros_like(low)
+    else:
+        negative, low, high = wideint.split_sign_magnitude(samples, ACCUMULATOR_BITS)
+
+    # np.float32(int) と同じく倍精度を経由して丸める
+    low = _scale_float32(low.astype(np.float64).astype(np.float32), -num_frac_bits)
+    high = _scale_float32(high.astype(np.float64).astype(np.float32), 64 - num_frac_bits)
+    result = low + high
+    return np.where(negative, -result, result)
+
+
+def _scale_float32(vals, exp_offset):
+    """単精度浮動小数点数の指数部に exp_offset を足す.  指数部はオーバーフローしても 8 bit で折り返す."""
+    raw = vals.view(np.uint32).astype(np.int64)
+    exps = np.where(vals != 0, ((raw >> 23) + exp_offset) & 0xFF, 0)
+    raw = (raw & 0x80000000) | (exps << 23) | (raw & 0x7FFFFF)
+    return raw.astype(np.uint32).view(np.float32)
+
+
+def classification(i_samples, q_samples, decision_func_params_0, decision_func_params_1):
+    """四値化を行う
+
+    | 判定式 f(i, q) = a * i + b * q + c の値が 0 以上か負かで四値化結果を決める.
+    | 判定式の値が NaN となったサンプルは結果に含まない.
+
+    Args:
+        i_samples (numpy.ndarray): I データの単精度浮動小数点数配列
+        q_samples (numpy.ndarray): Q データの単精度浮動小数点数配列
+        decision_func_params_0 (tuple of numpy.float32): 判定式 0 の係数 (a, b, c)
+        decision_func_params_1 (tuple of numpy.float32): 判定式 1 の係数 (a, b, c)
+
+    Returns:
+        numpy.ndarray: 四値化結果 (0 ~ 3) を格納した dtype = numpy.uint8 の配列
+    """
+    i_samples = np.asarray(i_samples, dtype = np.float32)
+    q_samples = np.asarray(q_samples, dtype = np.float32)
+    a0, b0, c0 = (np.float32(param) for param in decision_func_params_0)
+    a1, b1, c1 = (np.float32(param) for param in decision_func_params_1)
+    with np.errstate(over = 'ignore', invalid = 'ignore'):
+        res_0 = a0 * i_samples + b0 * q_samples + c0
+        res_1 = a1 * i_samples + b1 * q_samples + c1
+    results = (res_0 < 0).astype(np.uint8) * 2 + (res_1 < 0).astype(np.uint8)
+    return results[~(np.isnan(res_0) | np.isnan(res_1))]
@@ -0,0 +1,127 @@
+"""
+int64 に収まらない整数の配列演算.
+
+| キャプチャユニットの DSP の積算器は 121 bit 幅なので, 窓関数の適用後の値は int64 に収まらない.
+| このモジュールでは, 整数を 32 bit ずつ 4 つのリム (int64) に分けた配列 (shape = (..., 4)) で表し, 2^128 を法として計算する.
+| 正規化された配列の各リムは 0 ~ 2^32 - 1 の値を持ち, 値は sum(limbs[..., k] << (32 * k)) となる.
+"""
+import numpy as np
+
+LIMB_BITS = 32 #: 1 リムのビット数
+NUM_LIMBS = 4  #: 1 つの整数を表すリムの数
+_LIMB_MASK = (1 << LIMB_BITS) - 1
+
+
+def from_int64(vals):
+    """int64 の配列を正規化されたリム配列に変換する
+
+    Args:
+        vals (numpy.ndarray): 変換する整数の配列
+
+    Returns:
+        numpy.ndarray: shape = vals.shape + (4,) のリム配列
+    """
+    vals = np.asarray(vals, dtype = np.int64)
+    limbs = np.empty(vals.shape + (NUM_LIMBS,), dtype = np.int64)
+    limbs[..., 0] = vals & _LIMB_MASK
+    limbs[..., 1] = (vals >> LIMB_BITS) & _LIMB_MASK
+    # 負の数は上位のリムを全て 1 にして符号拡張する
+    limbs[..., 2:] = ((vals >> 63) & _LIMB_MASK)[..., np.newaxis]
+    return limbs
+
+
+def normalize(limbs):
+    """各リムの桁あふれを上位のリムに繰り上げる
+
+    | 各リムの絶対値は 2^63 - 2^31 以下でなければならない.
+    | limbs の内容は書き換えられる.
+
+    Returns:
+        numpy.ndarray: 正規化された limbs
+    """
+    for k in range(NUM_LIMBS - 1):
+        limbs[..., k + 1] += limbs[..., k] >> LIMB_BITS
+        limbs[..., k] &= _LIMB_MASK
+    limbs[..., NUM_LIMBS - 1] &= _LIMB_MASK
+    return limbs
+
+
+def add(limbs_0, limbs_1):
+    """正規化されたリム配列同士の和を返す"""
+    return normalize(limbs_0 + limbs_1)
+
+
+def sub(limbs_0, limbs_1):
+    """正規化されたリム配列同士の差を返す"""
+    return normalize(limbs_0 - limbs_1)
+
+
+def negate(limbs):
+    """正規化されたリム配列の各値の符号を反転した値を返す"""
+    return normalize(-limbs)
+
+
+def mul_int64(vals, coefs):
+    """int64 の配列同士の積をリム配列として返す
+
+    Args:
+        vals (numpy.ndarray): int64 の配列
+        coefs (numpy.ndarray): 絶対値が 2^31 以下の整数の配列.  vals とブロードキャスト可能な shape であること.
+
+    Returns:
+        numpy.ndarray: vals * coefs のリム配列
+    """
+    coefs = np.asarray(coefs, dtype = np.int64)
+    return normalize(from_int64(vals) * coefs[..., np.newaxis])
+
+
+def reduce_sum(limbs, axis = 0):
+    """正規化されたリム配列の axis に沿った総和を返す.  axis の要素数は 2^31 未満であること."""
+    if axis < 0:
+        axis += limbs.ndim - 1
+    return normalize(np.sum(limbs, axis = axis))
+
+
+def segment_sum(limbs, starts, stops):
+    """正規化されたリム配列の [starts[i], stops[i]) の範囲の総和をそれぞれ求める
+
+    Args:
+        limbs (numpy.ndarray): shape = (N, 4) のリム配列
+        starts (numpy.ndarray): 総和を取る範囲の先頭のインデックス (昇順)
+        stops (numpy.ndarray): 総和を取る範囲の末尾の次のインデックス.  starts[i] < stops[i] <= starts[i + 1] であること.
+
+    Returns:
+        numpy.ndarray: shape = (len(starts), 4) のリム配列
+    """
+    if len(starts) == 0:
+        return np.zeros((0, NUM_LIMBS), dtype = np.int64)
+    # stops の最後の要素が len(limbs) でも reduceat に渡せるように, 末尾に 0 を付け足す
+    padded = np.concatenate([limbs, np.zeros((1, NUM_LIMBS), dtype = np.int64)])
+    indices = np.empty(2 * len(starts), dtype = np.int64)
+    indices[0::2] = starts
+    indices[1::2] = stops
+    return normalize(np.add.reduceat(padded, indices, axis = 0)[0::2])
+
+
+def split_sign_magnitude(limbs, num_bits):
+    """リム配列の下位 num_bits ビットを 2 の補数表現の整数とみなして, 符号と絶対値に分ける
+
+    Args:
+        limbs (numpy.ndarray): 正規化されたリム配列
+        num_bits (int): 整数のビット幅 (97 ~ 128)
+
+    Returns:
+        tuple of numpy.ndarray:
+            | (負の数かどうか, 絶対値の下位 64 bit (uint64), 絶対値の 64 bit 目から num_bits - 1 bit 目まで (uint64))
+    """
+    top_bits = num_bits - LIMB_BITS * (NUM_LIMBS - 1)
+    top_mask = (1 << top_bits) - 1
+    limbs = limbs.copy()
+    limbs[..., NUM_LIMBS - 1] &= top_mask
+    negative = ((limbs[..., NUM_LIMBS - 1] >> (top_bits - 1)) & 1).astype(bool)
+    limbs[negative] = negate(limbs[negative])
+    limbs[..., NUM_LIMBS - 1] &= top_mask
+    limbs = limbs.astype(np.uint64)
+    low = limbs[..., 0] | (limbs[..., 1] << np.uint64(LIMB_BITS))
+    high = limbs[..., 2] | (limbs[..., 3] << np.uint64(LIMB_BITS))
+    return negative, low, high
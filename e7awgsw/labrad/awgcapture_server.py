@@ -165,6 +165,26 @@ class AwgCaptureServer(ThreadedServer):
             return pickle.dumps(e)
 
 
+    @setting(320, handle='s', returns='y')
+    def cmd_err_report_counts(self, c, handle):
+        try:
+            seqencerctrl = self.__get_sequencerctrl(handle)
+            counts = seqencerctrl.cmd_err_report_counts()
+            return pickle.dumps(counts)
+        except Exception as e:
+            return pickle.dumps(e)
+
+
+    @setting(321, handle='s', returns='y')
+    def num_dropped_cmd_err_reports(self, c, handle):
+        try:
+            seqencerctrl = self.__get_sequencerctrl(handle)
+            num_dropped = seqencerctrl.num_dropped_cmd_err_reports()
+            return pickle.dumps(num_dropped)
+        except Exception as e:
+            return pickle.dumps(e)
+
+
     @setting(112, handle='s', awg_id_list='*w', returns='y')
     def clear_awg_stop_flags(self, c, handle, awg_id_list):
         try:
@@ -184,6 +204,28 @@ class AwgCaptureServer(ThreadedServer):
             return pickle.dumps(None)
         except Exception as e:
             return pickle.dumps(e)
+
+
+    @setting(114, handle='s', awg_id='w', wave_seq_list='y', returns='y')
+    def load_wave_sequences(self, c, handle, awg_id, wave_seq_list):
+        try:
+            wave_seq_list = pickle.loads(wave_seq_list)
+            awgctrl = self.__get_awgctrl(handle)
+            keys = awgctrl.load_wave_sequences(awg_id, wave_seq_list)
+            return pickle.dumps(keys)
+        except Exception as e:
+            return pickle.dumps(e)
+
+
+    @setting(115, handle='s', awg_id_to_wave_seq='y', returns='y')
+    def set_wave_sequences(self, c, handle, awg_id_to_wave_seq):
+        try:
+            awg_id_to_wave_seq = pickle.loads(awg_id_to_wave_seq)
+            awgctrl = self.__get_awgctrl(handle)
+            awgctrl.set_wave_sequences(awg_id_to_wave_seq)
+            return pickle.dumps(None)
+        except Exception as e:
+            return pickle.dumps(e)
         
 
     @setting(200, returns='y')
@@ -367,6 +409,28 @@ class AwgCaptureServer(ThreadedServer):
             return pickle.dumps(e)
 
 
+    @setting(217, handle='s', param_list='y', returns='y')
+    def load_capture_params(self, c, handle, param_list):
+        try:
+            param_list = pickle.loads(param_list)
+            capturectrl = self.__get_capturectrl(handle)
+            keys = capturectrl.load_capture_params(param_list)
+            return pickle.dumps(keys)
+        except Exception as e:
+            return pickle.dumps(e)
+
+
+    @setting(218, handle='s', byte_offset='y', capture_unit_id_list='*w', returns='y')
+    def set_capture_addr_offset(self, c, handle, byte_offset, capture_unit_id_list):
+        try:
+            byte_offset = pickle.loads(byte_offset)
+            capturectrl = self.__get_capturectrl(handle)
+            capturectrl.set_capture_addr_offset(byte_offset, *capture_unit_id_list)
+            return pickle.dumps(None)
+        except Exception as e:
+            return pickle.dumps(e)
+
+
     @setting(300, returns='y')
     def create_sequencerctrl(self, c, ipaddr):
         try:
@@ -93,6 +93,16 @@ class RemoteAwgCtrl(AwgCtrlBase):
             raise
 
 
+    def _set_wave_sequences(self, awg_id_to_wave_seq):
+        try:
+            awg_id_to_wave_seq = pickle.dumps(awg_id_to_wave_seq)
+            result = self.__server.set_wave_sequences(self.__handler, awg_id_to_wave_seq)
+            self.__decode_and_check(result)
+        except Exception as e:
+            log_error(e, *self._loggers)
+            raise
+
+
     def _register_wave_sequences(self, awg_id, key_to_wave_seq):
         try:
             awg_id = int(awg_id)
@@ -104,6 +114,17 @@ class RemoteAwgCtrl(AwgCtrlBase):
             raise
 
 
+    def _load_wave_sequences(self, awg_id, wave_seq_list):
+        try:
+            awg_id = int(awg_id)
+            wave_seq_list = pickle.dumps(wave_seq_list)
+            result = self.__server.load_wave_sequences(self.__handler, awg_id, wave_seq_list)
+            return self.__decode_and_check(result)
+        except Exception as e:
+            log_error(e, *self._loggers)
+            raise
+
+
     def _initialize(self, *awg_id_list):
         try:
             awg_id_list = [int(awg_id) for awg_id in awg_id_list]
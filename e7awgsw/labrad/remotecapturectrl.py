@@ -2,16 +2,22 @@ import sys
 import pathlib
 import labrad
 import pickle
+import numpy as np
 
 lib_path = str(pathlib.Path(__file__).resolve().parents[2])
 sys.path.append(lib_path)
 from e7awgsw.capturectrl import CaptureCtrlBase
 from e7awgsw.logger import get_null_logger, log_error
+from e7awgsw.utiltool import create_capture_data_file
+from e7awgsw.hwparam import CAPTURED_SAMPLE_SIZE
 
 
 class RemoteCaptureCtrl(CaptureCtrlBase):
     """ LabRAD サーバを通してキャプチャユニットを制御するためのクラス """
 
+    # キャプチャデータをファイルに書き込む際に, 1 度に取得するサンプル数
+    __NUM_SAMPLES_PER_READ = 1024 * 1024
+
     def __init__(
         self,
         remote_server_ip_addr,
@@ -104,6 +110,16 @@ class RemoteCaptureCtrl(CaptureCtrlBase):
             raise
 
 
+    def _load_capture_params(self, param_list):
+        try:
+            param_list = pickle.dumps(param_list)
+            result = self.__server.load_capture_params(self.__handler, param_list)
+            return self.__decode_and_check(result)
+        except Exception as e:
+            log_error(e, *self._loggers)
+            raise
+
+
     def _initialize(self, *capture_unit_id_list):
         try:
             capture_unit_id_list = [int(capture_unit_id) for capture_unit_id in capture_unit_id_list]
@@ -127,6 +143,43 @@ class RemoteCaptureCtrl(CaptureCtrlBase):
             raise
 
 
+    def _get_capture_data_array(self, capture_unit_id, num_samples, addr_offset):
+        samples = self._get_capture_data(capture_unit_id, num_samples, addr_offset)
+        return np.asarray(samples, dtype = np.float32).reshape(num_samples, 2)
+
+
+    def _set_capture_addr_offset(self, byte_offset, *capture_unit_id_list):
+        try:
+            capture_unit_id_list = [int(capture_unit_id) for capture_unit_id in capture_unit_id_list]
+            byte_offset = pickle.dumps(byte_offset)
+            result = self.__server.set_capture_addr_offset(self.__handler, byte_offset, capture_unit_id_list)
+            self.__decode_and_check(result)
+        except Exception as e:
+            log_error(e, *self._loggers)
+            raise
+
+
+    def _read_captures_to_files(self, capture_unit_id_to_filepath, num_samples, addr_offset):
+        try:
+            for capture_unit_id, filepath in capture_unit_id_to_filepath.items():
+                if num_samples is None:
+                    num_samples_to_read = self._num_captured_samples(capture_unit_id)
+                else:
+                    num_samples_to_read = num_samples
+                # 一度に転送するデータ量を抑えるため, 一定サンプル数ずつ取得して書き込む
+                with create_capture_data_file(filepath, num_samples_to_read) as f:
+                    for start in range(0, num_samples_to_read, self.__NUM_SAMPLES_PER_READ):
+                        num_samples_to_get = min(self.__NUM_SAMPLES_PER_READ, num_samples_to_read - start)
+                        samples = self._get_capture_data(
+                            capture_unit_id,
+                            num_samples_to_get,
+                            addr_offset + start * CAPTURED_SAMPLE_SIZE)
+                        f.write(np.asarray(samples, dtype = '<f4').tobytes())
+        except Exception as e:
+            log_error(e, *self._loggers)
+            raise
+
+
     def _get_classification_results(self, capture_unit_id, num_samples, addr_offset):
         try:
             capture_unit_id = int(capture_unit_id)
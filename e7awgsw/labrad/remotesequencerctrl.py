@@ -237,6 +237,24 @@ class RemoteSequencerCtrl(SequencerCtrlBase):
             raise
 
 
+    def _cmd_err_report_counts(self):
+        try:
+            result = self.__server.cmd_err_report_counts(self.__handler)
+            return self.__decode_and_check(result)
+        except Exception as e:
+            log_error(e, *self._loggers)
+            raise
+
+
+    def _num_dropped_cmd_err_reports(self):
+        try:
+            result = self.__server.num_dropped_cmd_err_reports(self.__handler)
+            return self.__decode_and_check(result)
+        except Exception as e:
+            log_error(e, *self._loggers)
+            raise
+
+
     def _version(self):
         try:
             result = self.__server.sequencer_version(self.__handler)
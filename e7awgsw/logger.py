@@ -2,31 +2,54 @@ import logging
 import datetime
 import os
 import sys
+import queue
+import atexit
+import threading
 from logging import getLogger, FileHandler, Formatter
+from logging.handlers import QueueHandler, QueueListener
 
-os.makedirs('./log', exist_ok = True)
 formatter = logging.Formatter(
     '%(asctime)s - [%(name)s] - %(levelname)s - %(filename)s - ln.%(lineno)d - %(funcName)s\n%(message)s\n')
-file_name = datetime.datetime.now().strftime('err_log_%Y%m%d%H%M%S.txt')
-fh = logging.FileHandler('./log/' + file_name, delay = True)
-fh.setFormatter(formatter)
-invoked_script = os.path.splitext(os.path.basename(sys.argv[0]))[0]
-file_logger = getLogger(invoked_script)
-file_logger.setLevel(logging.INFO)
-file_logger.addHandler(fh)
 
 null_logger = getLogger('nullLibLog')
 null_logger.addHandler(logging.NullHandler())
 
+_file_logger = None
+_stderr_logger = None
+_file_handler = None
+_queue_listener = None
+_is_atexit_registered = False
+_lock = threading.RLock()
+# (ユーザ指定の Logger, ライブラリの標準のログ機能を有効にするか) -> Logger のタプル
+_logger_tuples = {}
 
-sh = logging.StreamHandler(sys.stderr)
-sh.setFormatter(formatter)
-stderr_logger = getLogger('stderrLog')
-stderr_logger.addHandler(sh)
+
+class ErrLogFileHandler(FileHandler):
+    """最初にログを出力するときに, ログファイルとそれを置くディレクトリを作成する FileHandler"""
+
+    def __init__(self, dirpath = './log'):
+        file_name = datetime.datetime.now().strftime('err_log_%Y%m%d%H%M%S.txt')
+        super().__init__(os.path.join(dirpath, file_name), delay = True)
+
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok = True)
+        return super()._open()
 
 
 def get_file_logger():
-    return file_logger
+    global _file_logger
+    with _lock:
+        if _file_logger is None:
+            global _file_handler
+            _file_handler = ErrLogFileHandler()
+            _file_handler.setFormatter(formatter)
+            invoked_script = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+            file_logger = getLogger(invoked_script)
+            file_logger.setLevel(logging.INFO)
+            file_logger.addHandler(_file_handler)
+            _file_logger = file_logger
+        return _file_logger
 
 
 def get_null_logger():
@@ -34,18 +57,87 @@ def get_null_logger():
 
 
 def get_stderr_logger():
-    return stderr_logger
+    global _stderr_logger
+    with _lock:
+        if _stderr_logger is None:
+            sh = logging.StreamHandler(sys.stderr)
+            sh.setFormatter(formatter)
+            stderr_logger = getLogger('stderrLog')
+            stderr_logger.addHandler(sh)
+            _stderr_logger = stderr_logger
+        return _stderr_logger
+
+
+def get_loggers(logger, enable_lib_log):
+    """ライブラリのオブジェクトがログ出力に使う Logger のタプルを取得する
+
+    | 同じ引数に対しては, プロセス内で共通のタプルを返す.
+
+    Args:
+        logger (logging.Logger): ユーザ独自のログ出力に用いる Logger オブジェクト
+        enable_lib_log (bool): True の場合, ライブラリの標準のログ機能に使う Logger を含める.
+
+    Returns:
+        tuple of logging.Logger: ログ出力に使う Logger のタプル
+    """
+    key = (logger, enable_lib_log)
+    loggers = _logger_tuples.get(key)
+    if loggers is None:
+        with _lock:
+            loggers = (logger, get_file_logger()) if enable_lib_log else (logger,)
+            loggers = _logger_tuples.setdefault(key, loggers)
+    return loggers
+
+
+def start_async_logging():
+    """ライブラリの標準のログ機能によるファイル出力を専用のスレッドで行うようにする
+
+    | ログを出力したスレッドは, ログをキューに入れるだけでファイル出力の完了を待たない.
+    | キューに残ったログは, stop_async_logging を呼んだときかプログラムの終了時に出力される.
+    """
+    global _queue_listener, _is_atexit_registered
+    with _lock:
+        if _queue_listener is not None:
+            return
+        if not _is_atexit_registered:
+            # 非同期ログ出力を使わないプログラムでは, 終了時の処理を登録しない
+            atexit.register(stop_async_logging)
+            _is_atexit_registered = True
+        file_logger = get_file_logger()
+        log_queue = queue.SimpleQueue()
+        _queue_listener = QueueListener(log_queue, _file_handler)
+        file_logger.addHandler(QueueHandler(log_queue))
+        file_logger.removeHandler(_file_handler)
+        _queue_listener.start()
+
+
+def stop_async_logging():
+    """start_async_logging で開始したログのファイル出力スレッドを止め, ファイル出力を呼び出し元のスレッドで行うように戻す"""
+    global _queue_listener
+    with _lock:
+        if _queue_listener is None:
+            return
+        file_logger = get_file_logger()
+        file_logger.addHandler(_file_handler)
+        for handler in list(file_logger.handlers):
+            if isinstance(handler, QueueHandler):
+                file_logger.removeHandler(handler)
+        # キューに残ったログを全て出力してからスレッドを止める
+        _queue_listener.stop()
+        _queue_listener = None
 
 
 def log_error(msg, *loggers):
+    if isinstance(msg, Exception):
+        msg = '{}: {}'.format(type(msg).__name__, msg)
     for logger in loggers:
-        if isinstance(msg, Exception):
-            msg = '{}: {}'.format(type(msg).__name__, msg)
-        logger.error(msg, stacklevel = 2)
+        if logger.isEnabledFor(logging.ERROR):
+            logger.error(msg, stacklevel = 2)
 
 
 def log_warning(msg, *loggers):
+    if isinstance(msg, Exception):
+        msg = '{}: {}'.format(type(msg).__name__, msg)
     for logger in loggers:
-        if isinstance(msg, Exception):
-            msg = '{}: {}'.format(type(msg).__name__, msg)
-        logger.warning(msg, stacklevel = 2)
+        if logger.isEnabledFor(logging.WARNING):
+            logger.warning(msg, stacklevel = 2)
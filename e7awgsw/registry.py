@@ -0,0 +1,220 @@
+import bisect
+import threading
+from collections import OrderedDict
+
+class RamAllocator(object):
+    """RAM の一定範囲の領域をヒープのように割り当てる"""
+
+    def __init__(self, base_addr, size, alignment):
+        """
+        Args:
+            base_addr (int): 割り当てに使う領域の先頭アドレス
+            size (int): 割り当てに使う領域のサイズ (bytes)
+            alignment (int): 割り当てる領域のアドレスとサイズのアライメント (bytes)
+        """
+        self.__base_addr = base_addr
+        self.__size = size
+        self.__alignment = alignment
+        self.reset()
+
+
+    def reset(self):
+        """全ての割り当てを解放する"""
+        # 空き領域の (先頭アドレス, サイズ) のリスト.  アドレス順に並べる.
+        self.__free_list = [(self.__base_addr, self.__size)]
+        # 割り当て済み領域の先頭アドレス -> サイズ
+        self.__allocated = {}
+
+
+    def alloc(self, size):
+        """size bytes の領域を割り当てる
+
+        Args:
+            size (int): 割り当てる領域のサイズ (bytes)
+
+        Returns:
+            int: 割り当てた領域の先頭アドレス.  空き領域が足りない場合は None.
+        """
+        size = max(self.__align(size), self.__alignment)
+        for i, (addr, free_size) in enumerate(self.__free_list):
+            if free_size >= size:
+                if free_size == size:
+                    del self.__free_list[i]
+                else:
+                    self.__free_list[i] = (addr + size, free_size - size)
+                self.__allocated[addr] = size
+                return addr
+        return None
+
+
+    def free(self, addr):
+        """alloc で割り当てた領域を解放する
+
+        Args:
+            addr (int): alloc が返した領域の先頭アドレス
+        """
+        size = self.__allocated.pop(addr)
+        i = bisect.bisect_left(self.__free_list, (addr, 0))
+        # 後ろの空き領域と結合
+        if i < len(self.__free_list) and self.__free_list[i][0] == addr + size:
+            size += self.__free_list[i][1]
+            del self.__free_list[i]
+        # 前の空き領域と結合
+        if i > 0 and sum(self.__free_list[i - 1]) == addr:
+            addr = self.__free_list[i - 1][0]
+            size += self.__free_list[i - 1][1]
+            self.__free_list[i - 1] = (addr, size)
+        else:
+            self.__free_list.insert(i, (addr, size))
+
+
+    def __align(self, size):
+        return (size + self.__alignment - 1) // self.__alignment * self.__alignment
+
+
+    @property
+    def free_size(self):
+        """空き領域の合計サイズ (bytes)"""
+        return sum(size for _, size in self.__free_list)
+
+
+class ParamRegistry(object):
+    """パラメータレジストリの各エントリの内容をホスト側で管理する
+
+    | エントリの内容はその fingerprint で識別する.
+    | 同じ内容のエントリが既にあればそれを再利用し, 空きが無い場合は最も長い間使われていないエントリを追い出す.
+    | ram_allocator を指定した場合, エントリごとのデータ (波形サンプルなど) を置く RAM 領域も管理する.
+    """
+
+    def __init__(self, num_entries, ram_allocator = None):
+        """
+        Args:
+            num_entries (int): レジストリのエントリ数.  キーは 0 ~ num_entries - 1.
+            ram_allocator (RamAllocator): エントリのデータを置く RAM 領域を割り当てるオブジェクト
+        """
+        self.__num_entries = num_entries
+        self.__ram_allocator = ram_allocator
+        # key -> (fingerprint, RAM アドレス).  先頭ほど長い間使われていない.
+        self.__entries = OrderedDict()
+        self.__fingerprint_to_key = {}
+        self.__lock = threading.RLock()
+
+
+    def find(self, fingerprint):
+        """fingerprint の内容を持つエントリのキーを返す
+
+        Args:
+            fingerprint (hashable): エントリの内容を識別する値
+
+        Returns:
+            int: 見つかったエントリのキー.  見つからない場合は None.
+        """
+        with self.__lock:
+            key = self.__fingerprint_to_key.get(fingerprint)
+            if key is not None:
+                self.__entries.move_to_end(key)
+            return key
+
+
+    def fingerprint(self, key):
+        """key のエントリの内容を識別する値を返す
+
+        Returns:
+            hashable: key のエントリの fingerprint.  内容が不明な場合は None.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            return None if entry is None else entry[0]
+
+
+    def addr(self, key):
+        """key のエントリのデータを置いた RAM 領域の先頭アドレスを返す"""
+        with self.__lock:
+            return self.__entries[key][1]
+
+
+    def assign(self, fingerprint, data_size = 0, pinned_keys = ()):
+        """fingerprint の内容を登録するエントリを選んでそのキーを返す
+
+        | 空きエントリが無い場合, pinned_keys に含まれないエントリのうち, 最も長い間使われていないものを追い出す.
+
+        Args:
+            fingerprint (hashable): 登録する内容を識別する値
+            data_size (int): 登録する内容のデータを置く RAM 領域のサイズ (bytes)
+            pinned_keys (collection of int): 追い出してはならないエントリのキー
+
+        Returns:
+            (int, int): 選んだエントリのキーとそのデータを置く RAM 領域の先頭アドレス
+        """
+        with self.__lock:
+            key = next((key for key in range(self.__num_entries) if key not in self.__entries), None)
+            if key is None:
+                key = self.__lru_key(pinned_keys)
+                if key is None:
+                    raise ValueError('All the registry entries are in use.')
+            return key, self.put(key, fingerprint, data_size, pinned_keys)
+
+
+    def put(self, key, fingerprint, data_size = 0, pinned_keys = ()):
+        """key のエントリに fingerprint の内容を登録する
+
+        | データを置く RAM 領域が足りない場合, pinned_keys に含まれないエントリを最も長い間使われていないものから順に追い出す.
+
+        Args:
+            key (hashable): 登録先のエントリのキー
+            fingerprint (hashable): 登録する内容を識別する値
+            data_size (int): 登録する内容のデータを置く RAM 領域のサイズ (bytes)
+            pinned_keys (collection of int): 追い出してはならないエントリのキー
+
+        Returns:
+            int: 登録する内容のデータを置く RAM 領域の先頭アドレス.  RAM 領域を管理しない場合は None.
+        """
+        with self.__lock:
+            self.invalidate(key)
+            addr = None
+            if self.__ram_allocator is not None:
+                pinned_keys = set(pinned_keys) | {key}
+                addr = self.__ram_allocator.alloc(data_size)
+                while addr is None:
+                    victim = self.__lru_key(pinned_keys)
+                    if victim is None:
+                        raise ValueError(
+                            'Too little free RAM space for a registry entry.  ({} bytes required)'.format(data_size))
+                    self.invalidate(victim)
+                    addr = self.__ram_allocator.alloc(data_size)
+
+            self.__entries[key] = (fingerprint, addr)
+            # 同じ内容のエントリが複数ある場合は, 最後に登録したものを検索対象にする
+            if isinstance(key, int):
+                self.__fingerprint_to_key[fingerprint] = key
+            return addr
+
+
+    def invalidate(self, key):
+        """key のエントリの内容を不明にして, そのデータを置いていた RAM 領域を解放する"""
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is None:
+                return
+            fingerprint, addr = entry
+            if isinstance(key, int) and self.__fingerprint_to_key.get(fingerprint) == key:
+                del self.__fingerprint_to_key[fingerprint]
+            if addr is not None:
+                self.__ram_allocator.free(addr)
+
+
+    def clear(self):
+        """全てのエントリの内容を不明にする"""
+        with self.__lock:
+            self.__entries.clear()
+            self.__fingerprint_to_key.clear()
+            if self.__ram_allocator is not None:
+                self.__ram_allocator.reset()
+
+
+    def __lru_key(self, pinned_keys):
+        # レジストリのエントリではないもの (直接設定用の領域など) は追い出さない
+        return next(
+            (key for key in self.__entries
+             if (key not in pinned_keys) and isinstance(key, int)),
+            None)
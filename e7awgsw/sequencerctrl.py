@@ -1,12 +1,14 @@
 import time
 import socket
+import numpy as np
 from abc import ABCMeta, abstractmethod
-from .logger import get_file_logger, get_null_logger, log_error
+from .logger import get_loggers, get_null_logger, log_error
 from .hwparam import CMD_ERR_REPORT_SIZE, SEQUENCER_REG_PORT, SEQUENCER_CMD_PORT
-from .udpaccess import SequencerRegAccess, SequencerCmdSender, CmdErrReceiver, UdpRouter, get_my_ip_addr
+from .udpaccess import SequencerRegAccess, SequencerCmdSender, CmdErrReceiver, UdpDemux, get_my_ip_addr
 from .uplpacket import UplPacket
 from .memorymap import SequencerCtrlRegs as SeqRegs
 from .sequencercmd import SequencerCmd
+from .sequencerprogram import SequencerProgram
 from .exception import TooLittleFreeSpaceInCmdFifoError, SequencerTimeoutError
 
 class SequencerCtrlBase(object, metaclass = ABCMeta):
@@ -14,9 +16,7 @@ class SequencerCtrlBase(object, metaclass = ABCMeta):
     def __init__(self, ip_addr, validate_args, enable_lib_log, logger):
         self._ip_addr = ip_addr
         self._validate_args = validate_args
-        self._loggers = [logger]
-        if enable_lib_log:
-            self._loggers.append(get_file_logger())
+        self._loggers = get_loggers(logger, enable_lib_log)
 
         if self._validate_args:
             try:
@@ -41,7 +41,9 @@ class SequencerCtrlBase(object, metaclass = ABCMeta):
         | このとき cmd_list のコマンドは 1 つも追加されない.
 
         Args:
-            cmd_list (list of SequencerCmd): シーケンサに追加するコマンド
+            cmd_list (list of SequencerCmd or numpy.ndarray):
+                | シーケンサに追加するコマンド.
+                | SequencerProgram.instantiate で生成したコマンド列を直接指定することもできる.
 
         Raises:
             TooLittleFreeSpaceInCmdFifoError: コマンドキューの空き領域が足りない
@@ -191,6 +193,29 @@ class SequencerCtrlBase(object, metaclass = ABCMeta):
         return self._pop_cmd_err_reports()
 
 
+    def cmd_err_report_counts(self):
+        """initialize を呼んでから受信したコマンドエラーレポートの数をコマンドの種類ごとに取得する
+
+        | pop_cmd_err_reports でレポートを取得したり, 保持しきれずに捨てたりしても, この値は減らない.
+
+        Returns:
+            dict: コマンドの ID (AwgStartCmd.ID など) -> そのコマンドのエラーレポートを受信した数.
+        """
+        return self._cmd_err_report_counts()
+
+
+    def num_dropped_cmd_err_reports(self):
+        """保持しきれずに捨てたコマンドエラーレポートの数を取得する
+
+        | このオブジェクトは最大 CmdErrReceiver.DEFAULT_MAX_REPORTS 個のコマンドエラーレポートを保持し,
+        | それを超えた場合は古いものから捨てる.
+
+        Returns:
+            int: initialize を呼んでから捨てたコマンドエラーレポートの数
+        """
+        return self._num_dropped_cmd_err_reports()
+
+
     def version(self):
         """シーケンサのバージョンを取得する
 
@@ -212,6 +237,12 @@ class SequencerCtrlBase(object, metaclass = ABCMeta):
         if isinstance(cmd_list, SequencerCmd):
             return
 
+        if isinstance(cmd_list, np.ndarray):
+            if cmd_list.dtype != SequencerProgram.CMD_DTYPE or cmd_list.ndim != 1:
+                raise ValueError('Invalid sequencer command array.  (dtype = {}, shape = {})'
+                    .format(cmd_list.dtype, cmd_list.shape))
+            return
+
         if not isinstance(cmd_list, (list, tuple)):
             raise('Invalid sequencer command list.  ({})'.format(cmd_list))
 
@@ -293,6 +324,14 @@ class SequencerCtrlBase(object, metaclass = ABCMeta):
     def _pop_cmd_err_reports(self):
         pass
 
+    @abstractmethod
+    def _cmd_err_report_counts(self):
+        pass
+
+    @abstractmethod
+    def _num_dropped_cmd_err_reports(self):
+        pass
+
     @abstractmethod
     def _version(self):
         pass
@@ -305,7 +344,8 @@ class SequencerCtrl(SequencerCtrlBase):
         *,
         validate_args = True,
         enable_lib_log = True,
-        logger = get_null_logger()):
+        logger = get_null_logger(),
+        retry_policy = None):
         """
         Args:
             ip_addr (string): シーケンサに割り当てられた IP アドレス (例 '10.0.0.16')
@@ -316,21 +356,20 @@ class SequencerCtrl(SequencerCtrlBase):
                 | True -> ライブラリの標準のログ機能を有効にする.
                 | False -> ライブラリの標準のログ機能を無効にする.
             logger (logging.Logger): ユーザ独自のログ出力に用いる Logger オブジェクト
+            retry_policy (RetryPolicy):
+                | 送った要求に対する応答待ちのタイムアウトと再送の方針.
+                | None の場合, デフォルトの RetryPolicy を使う.
         """
         super().__init__(ip_addr, validate_args, enable_lib_log, logger)
-        self.__reg_access = SequencerRegAccess(ip_addr, SEQUENCER_REG_PORT, *self._loggers)
-        self.__cmd_sender = SequencerCmdSender(ip_addr, SEQUENCER_CMD_PORT, *self._loggers)
-        self.__err_receiver = None
         self.__my_ip_addr = get_my_ip_addr(self._ip_addr) # シーケンサから来るパケットを受けるときの IP アドレス
-        reg_access_addr = (self.__reg_access.my_ip_addr, self.__reg_access.my_port)
-        cmd_sender_addr = (self.__cmd_sender.my_ip_addr, self.__cmd_sender.my_port)
-        routing_table = {
-            UplPacket.MODE_SEQUENCER_REG_READ_REPLY : reg_access_addr,
-            UplPacket.MODE_SEQUENCER_REG_WRITE_ACK : reg_access_addr,
-            UplPacket.MODE_SEQUENCER_CMD_WRITE_ACK : cmd_sender_addr
-        }
-        self.__router = UdpRouter(self.__my_ip_addr, routing_table, *self._loggers)
-        self.__router.start()
+        # シーケンサとの通信は全てこのソケットで行い, 受信したパケットはモードに応じて各受信者に直接渡す
+        self.__demux = UdpDemux(self.__my_ip_addr, *self._loggers)
+        self.__demux.start()
+        self.__reg_access = SequencerRegAccess(
+            ip_addr, SEQUENCER_REG_PORT, *self._loggers, demux = self.__demux, retry_policy = retry_policy)
+        self.__cmd_sender = SequencerCmdSender(
+            ip_addr, SEQUENCER_CMD_PORT, *self._loggers, demux = self.__demux, retry_policy = retry_policy)
+        self.__err_receiver = None
 
 
     def __enter__(self):
@@ -348,13 +387,12 @@ class SequencerCtrl(SequencerCtrlBase):
         | そうでない場合, プログラムを終了する前にこのメソッドを呼ぶこと.
 
         """
+        self.__demux.stop()
         if self.__err_receiver is not None:
-            self.__err_receiver.stop()
             self.__err_receiver.close()
-        self.__router.stop()
-        self.__router.close()
         self.__reg_access.close()
         self.__cmd_sender.close()
+        self.__demux.close()
 
 
     def __set_dest_port(self, port):
@@ -369,20 +407,15 @@ class SequencerCtrl(SequencerCtrlBase):
 
 
     def _initialize(self):
-        self.__set_dest_port(self.__router.my_port)
+        self.__set_dest_port(self.__demux.my_port)
         self.__set_dest_ip_addr(self.__my_ip_addr)
         self.__reg_access.write(SeqRegs.ADDR, SeqRegs.Offset.CTRL, 0)
         self.__reset_sequencer()
         # 古いエラーレポートを受信しないように, エラー送信を止めてリセットしてからエラーレポート受信ポートを作成する.
         if self.__err_receiver is None:
-            self.__err_receiver = CmdErrReceiver(self.__my_ip_addr, *self._loggers)
-            self.__router.add_entry(
-                UplPacket.MODE_SEQUENCER_CMD_ERR_REPORT,
-                self.__err_receiver.my_ip_addr,
-                self.__err_receiver.my_port)
-            self.__err_receiver.start()
+            self.__err_receiver = CmdErrReceiver(self.__demux, *self._loggers)
         else:
-            self.__err_receiver.pop_err_reports()
+            self.__err_receiver.reset()
 
 
     def __reset_sequencer(self):
@@ -394,7 +427,10 @@ class SequencerCtrl(SequencerCtrlBase):
 
     def _push_commands(self, cmd_list):
         free_space = self._cmd_fifo_free_space()
-        cmd_bytes = sum([cmd.size() for cmd in cmd_list])
+        if isinstance(cmd_list, np.ndarray):
+            cmd_bytes = cmd_list.nbytes
+        else:
+            cmd_bytes = sum([cmd.size() for cmd in cmd_list])
         if cmd_bytes > free_space:
             msg = 'required : {} bytes,   free : {} bytes'.format(cmd_bytes, free_space)
             log_error(msg, *self._loggers)
@@ -543,6 +579,20 @@ class SequencerCtrl(SequencerCtrlBase):
         return self.__err_receiver.pop_err_reports()
 
 
+    def _cmd_err_report_counts(self):
+        if self.__err_receiver is None:
+            return {}
+
+        return self.__err_receiver.err_report_counts()
+
+
+    def _num_dropped_cmd_err_reports(self):
+        if self.__err_receiver is None:
+            return 0
+
+        return self.__err_receiver.num_dropped_reports
+
+
     def _version(self):
         data = self.__reg_access.read(SeqRegs.ADDR, SeqRegs.Offset.VERSION)
         ver_char = chr(0xFF & (data >> 24))
@@ -0,0 +1,131 @@
+import numpy as np
+from .sequencercmd import SequencerCmd, AwgStartCmd, CaptureEndFenceCmd, WaveGenEndFenceCmd
+
+class SequencerProgram(object):
+    """1 ショット分のシーケンサコマンドをテンプレートとしてコンパイルし, 複数ショット分のコマンド列を生成する
+
+    | 生成したコマンド列は CMD_DTYPE 型の numpy.ndarray で, 1 要素が 1 コマンド (16 bytes) を表す.
+    | これはそのまま SequencerCtrl.push_commands に渡すことができる.
+    """
+
+    #: コンパイル済みのコマンド 1 つを表す構造化データ型.  フィールドは各コマンドのビットフィールドの配置に合わせてある.
+    CMD_DTYPE = np.dtype({
+        'names': ['head', 'cmd_no', 'units', 'time', 'flags', 'rsv'],
+        'formats': ['u1', '<u2', '<u2', '<u8', 'u1', '<u2'],
+        'offsets': [0, 1, 3, 5, 13, 14],
+        'itemsize': 16})
+
+    #: 時刻フィールドを持つコマンドの種類と, その時刻に指定可能な最大値
+    __MAX_TIME = {
+        AwgStartCmd.ID: AwgStartCmd.MAX_START_TIME,
+        CaptureEndFenceCmd.ID: CaptureEndFenceCmd.MAX_END_TIME,
+        WaveGenEndFenceCmd.ID: WaveGenEndFenceCmd.MAX_END_TIME
+    }
+
+    def __init__(self, cmd_list):
+        """
+        Args:
+            cmd_list (list of SequencerCmd):
+                | 1 ショット分のシーケンサコマンドのリスト.
+                | 各コマンドのコマンド番号と時刻 (AWG スタート時刻やフェンスの終了時刻) が 1 ショット目の値となる.
+        """
+        if isinstance(cmd_list, SequencerCmd):
+            cmd_list = [cmd_list]
+        if ((not isinstance(cmd_list, (list, tuple))) or
+            (not cmd_list) or
+            (not all(isinstance(cmd, SequencerCmd) for cmd in cmd_list))):
+            raise ValueError('Invalid sequencer command list.  ({})'.format(cmd_list))
+
+        template = np.frombuffer(b''.join([cmd.serialize() for cmd in cmd_list]), dtype = self.CMD_DTYPE)
+        template.flags.writeable = False
+        self.__template = template
+        # 時刻をずらすコマンド (AWG の即時スタートは対象外) の位置
+        self.__timed = np.array([
+            (cmd.cmd_id in self.__MAX_TIME) and
+            not (isinstance(cmd, AwgStartCmd) and cmd.start_time < 0)
+            for cmd in cmd_list])
+        self.__max_time = min(
+            (self.__MAX_TIME[cmd.cmd_id] for cmd, timed in zip(cmd_list, self.__timed) if timed),
+            default = None)
+        timed_template = template['time'][self.__timed]
+        self.__last_time = int(timed_template.max()) if timed_template.size > 0 else 0
+
+
+    @property
+    def num_cmds(self):
+        """1 ショット分のコマンドの数
+
+        Returns:
+            int: 1 ショット分のコマンドの数
+        """
+        return len(self.__template)
+
+
+    @property
+    def template(self):
+        """コンパイル済みの 1 ショット分のコマンド列
+
+        Returns:
+            numpy.ndarray: CMD_DTYPE 型の読み取り専用の配列
+        """
+        return self.__template
+
+
+    def instantiate(
+        self,
+        num_shots,
+        shot_interval = 0,
+        time_offset = 0,
+        cmd_no_offset = 0,
+        cmd_no_stride = None,
+        stop_seq = False):
+        """num_shots ショット分のコマンド列を生成する
+
+        | i ショット目 (i = 0, 1, ...) の各コマンドは, テンプレートのコマンドに対して以下を変更したものとなる.
+        |   コマンド番号 = (テンプレートのコマンド番号 + cmd_no_offset + i * cmd_no_stride) mod (MAX_CMD_NO + 1)
+        |   時刻 = テンプレートの時刻 + time_offset + i * shot_interval
+
+        Args:
+            num_shots (int): 生成するショット数
+            shot_interval (int): ショット間の時刻の間隔 (単位 : 8[ns])
+            time_offset (int): 全てのショットの時刻に加算する値 (単位 : 8[ns])
+            cmd_no_offset (int): 全てのコマンドのコマンド番号に加算する値
+            cmd_no_stride (int): ショット間のコマンド番号の間隔.  None の場合, 1 ショット分のコマンドの数となる.
+            stop_seq (bool): True の場合, 最後のコマンドのシーケンサ停止フラグを立てる.
+
+        Returns:
+            numpy.ndarray: num_shots * num_cmds 個のコマンドを格納した CMD_DTYPE 型の配列
+        """
+        if cmd_no_stride is None:
+            cmd_no_stride = self.num_cmds
+        for name, val in (('num_shots', num_shots), ('shot_interval', shot_interval),
+                          ('time_offset', time_offset), ('cmd_no_offset', cmd_no_offset),
+                          ('cmd_no_stride', cmd_no_stride)):
+            if not (isinstance(val, (int, np.integer)) and val >= 0):
+                raise ValueError(
+                    "'{}' must be an integer greater than or equal to 0.  '{}' was set.".format(name, val))
+        if not isinstance(stop_seq, bool):
+            raise ValueError("The type of 'stop_seq' must be 'bool'.  '{}' was set.".format(stop_seq))
+        num_shots = int(num_shots)
+
+        if self.__max_time is not None and num_shots > 0:
+            last_time = self.__last_time + int(time_offset) + (num_shots - 1) * int(shot_interval)
+            if last_time > self.__max_time:
+                raise ValueError(
+                    'The time of the last shot exceeds {}.  ({})'.format(self.__max_time, last_time))
+
+        cmds = np.tile(self.__template, num_shots).reshape(num_shots, self.num_cmds)
+        shots = np.arange(num_shots, dtype = np.uint64)[:, np.newaxis]
+        cmd_no_mod = SequencerCmd.MAX_CMD_NO + 1
+        cmds['cmd_no'] = (
+            self.__template['cmd_no'].astype(np.uint64) +
+            (int(cmd_no_offset) % cmd_no_mod) +
+            shots * (int(cmd_no_stride) % cmd_no_mod)) % cmd_no_mod
+        if self.__timed.any():
+            cmds['time'][:, self.__timed] = (
+                self.__template['time'][self.__timed] + np.uint64(time_offset) + shots * np.uint64(shot_interval))
+
+        cmds = cmds.reshape(-1)
+        if stop_seq and cmds.size > 0:
+            cmds['head'][-1] |= 1
+        return cmds
@@ -0,0 +1,187 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .hwparam import MAX_CAPTURE_SIZE, CAPTURED_SAMPLE_SIZE, CAPTURE_DATA_ALIGNMENT_SIZE
+from .hwdefs import AWG, CaptureUnit
+
+class ShotResult(object):
+    """ShotLoop で実行した 1 ショット分の結果"""
+
+    def __init__(self, shot_no, samples, start_time, capture_end_time, read_end_time):
+        self.__shot_no = shot_no
+        self.__samples = samples
+        self.__start_time = start_time
+        self.__capture_end_time = capture_end_time
+        self.__read_end_time = read_end_time
+
+
+    @property
+    def shot_no(self):
+        """ショット番号 (0, 1, 2, ...)
+
+        Returns:
+            int: ショット番号
+        """
+        return self.__shot_no
+
+
+    @property
+    def samples(self):
+        """各キャプチャユニットがこのショットで保存したサンプルデータ
+
+        Returns:
+            {CaptureUnit -> numpy.ndarray}:
+                | key = キャプチャユニット ID
+                | value = shape = (サンプル数, 2), dtype = numpy.float32 の配列
+        """
+        return self.__samples
+
+
+    @property
+    def start_time(self):
+        """AWG をスタートした時刻 (time.perf_counter() の値)"""
+        return self.__start_time
+
+
+    @property
+    def capture_end_time(self):
+        """全てのキャプチャユニットのキャプチャ完了を確認した時刻 (time.perf_counter() の値)"""
+        return self.__capture_end_time
+
+
+    @property
+    def read_end_time(self):
+        """全てのキャプチャユニットのサンプルデータを読み終えた時刻 (time.perf_counter() の値)"""
+        return self.__read_end_time
+
+
+class ShotLoop(object):
+    """AWG のスタート, キャプチャ完了待ち, キャプチャデータの取得を繰り返し実行する
+
+    | キャプチャデータの格納先をショットごとに切り替え, k 番目のショットのデータをバックグラウンドで読み出している間に
+    | k + 1 番目のショットを実行する.
+    | AWG, キャプチャユニットの初期化, 波形シーケンスとキャプチャパラメータの設定, キャプチャのトリガの設定は,
+    | ショットループを実行する前に済ませておくこと.
+    | ショットループの実行中は, capture_ctrl のキャプチャデータ取得系のメソッドを他のスレッドから呼ばないこと.
+    """
+
+    def __init__(
+        self,
+        awg_ctrl,
+        capture_ctrl,
+        awg_id_list,
+        capture_unit_id_list,
+        *,
+        num_buffers = 2,
+        timeout = 5):
+        """
+        Args:
+            awg_ctrl (AwgCtrl): ショットごとに AWG をスタートさせるのに使う AwgCtrl オブジェクト
+            capture_ctrl (CaptureCtrl): キャプチャの完了待ちとキャプチャデータの取得に使う CaptureCtrl オブジェクト
+            awg_id_list (list of AWG): ショットごとにスタートする AWG のリスト
+            capture_unit_id_list (list of CaptureUnit): ショットごとにキャプチャデータを取得するキャプチャユニットのリスト
+            num_buffers (int):
+                | キャプチャ領域の分割数. 各ショットのキャプチャデータは, 分割した領域に順番に保存される.
+                | 1 ショットで保存可能なデータサイズは MAX_CAPTURE_SIZE / num_buffers bytes 未満となる.
+            timeout (int or float): AWG の波形出力完了とキャプチャ完了を待つ時間 (単位 : 秒)
+        """
+        if AWG.includes(awg_id_list):
+            awg_id_list = [awg_id_list]
+        if CaptureUnit.includes(capture_unit_id_list):
+            capture_unit_id_list = [capture_unit_id_list]
+        if not (isinstance(awg_id_list, (list, tuple)) and awg_id_list and AWG.includes(*awg_id_list)):
+            raise ValueError('Invalid AWG ID list {}'.format(awg_id_list))
+        if not (isinstance(capture_unit_id_list, (list, tuple)) and
+                capture_unit_id_list and
+                CaptureUnit.includes(*capture_unit_id_list)):
+            raise ValueError('Invalid capture unit ID list {}'.format(capture_unit_id_list))
+        if not (isinstance(num_buffers, int) and num_buffers >= 1):
+            raise ValueError(
+                "'num_buffers' must be an integer greater than or equal to 1.  '{}' was set.".format(num_buffers))
+        if (not isinstance(timeout, (int, float))) or (timeout < 0):
+            raise ValueError('Invalid timeout {}'.format(timeout))
+
+        self.__awg_ctrl = awg_ctrl
+        self.__capture_ctrl = capture_ctrl
+        self.__awg_id_list = list(awg_id_list)
+        self.__capture_unit_id_list = list(capture_unit_id_list)
+        self.__num_buffers = num_buffers
+        self.__buffer_size = \
+            MAX_CAPTURE_SIZE // num_buffers // CAPTURE_DATA_ALIGNMENT_SIZE * CAPTURE_DATA_ALIGNMENT_SIZE
+        self.__timeout = timeout
+
+
+    def iter_shots(self, num_shots):
+        """num_shots 回のショットを実行し, その結果を順に返すイテレータを作成する
+
+        Args:
+            num_shots (int): 実行するショット数
+
+        Returns:
+            iterator of ShotResult: 各ショットの結果を, ショット番号の順に返すイテレータ
+        """
+        if not (isinstance(num_shots, int) and num_shots >= 0):
+            raise ValueError(
+                "'num_shots' must be an integer greater than or equal to 0.  '{}' was set.".format(num_shots))
+        return self.__iter_shots(num_shots)
+
+
+    def run(self, num_shots, callback):
+        """num_shots 回のショットを実行し, 各ショットの結果を callback に渡す
+
+        Args:
+            num_shots (int): 実行するショット数
+            callback (callable): ショットの結果 (ShotResult) を引数に, ショット番号の順に呼ばれる関数
+        """
+        for result in self.iter_shots(num_shots):
+            callback(result)
+
+
+    def __iter_shots(self, num_shots):
+        # 読み出し中のショット.  (読み出し完了を表す Future, ショット番号)
+        reading = []
+        with ThreadPoolExecutor(max_workers = 1) as reader:
+            try:
+                for shot_no in range(num_shots):
+                    # 次のショットで使う領域のデータを読み終えるまで待つ
+                    if len(reading) == self.__num_buffers:
+                        yield reading.pop(0).result()
+
+                    byte_offset = (shot_no % self.__num_buffers) * self.__buffer_size
+                    shot = self.__run_shot(byte_offset)
+                    reading.append(reader.submit(self.__read_shot, shot_no, byte_offset, *shot))
+                    # 現在のショットの実行中に, 前のショットのデータを読み終えていれば返す
+                    while len(reading) > 1 and reading[0].done():
+                        yield reading.pop(0).result()
+
+                while reading:
+                    yield reading.pop(0).result()
+            finally:
+                for future in reading:
+                    future.cancel()
+
+
+    def __run_shot(self, byte_offset):
+        self.__capture_ctrl.set_capture_addr_offset(byte_offset, *self.__capture_unit_id_list)
+        self.__capture_ctrl.clear_capture_stop_flags(*self.__capture_unit_id_list)
+        start_time = time.perf_counter()
+        self.__awg_ctrl.start_awgs(*self.__awg_id_list)
+        self.__awg_ctrl.wait_for_awgs_to_stop(self.__timeout, *self.__awg_id_list)
+        self.__capture_ctrl.wait_for_capture_units_to_stop(self.__timeout, *self.__capture_unit_id_list)
+        capture_end_time = time.perf_counter()
+        num_samples_list = []
+        for capture_unit_id in self.__capture_unit_id_list:
+            num_samples = self.__capture_ctrl.num_captured_samples(capture_unit_id)
+            if num_samples * CAPTURED_SAMPLE_SIZE > self.__buffer_size:
+                raise ValueError(
+                    'Capture unit {} saved too many samples for a shot loop buffer.  ({} samples, max = {})'
+                    .format(capture_unit_id, num_samples, self.__buffer_size // CAPTURED_SAMPLE_SIZE))
+            num_samples_list.append(num_samples)
+        return start_time, capture_end_time, num_samples_list
+
+
+    def __read_shot(self, shot_no, byte_offset, start_time, capture_end_time, num_samples_list):
+        samples = {
+            capture_unit_id : self.__capture_ctrl.get_capture_data_array(capture_unit_id, num_samples, byte_offset)
+            for capture_unit_id, num_samples in zip(self.__capture_unit_id_list, num_samples_list)
+        }
+        return ShotResult(shot_no, samples, start_time, capture_end_time, time.perf_counter())
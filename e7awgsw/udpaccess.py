@@ -1,25 +1,43 @@
+import sys
+import time
 import socket
+import select
 import threading
-import copy
+import queue
+import numpy as np
 from .uplpacket import UplPacket
-from .logger import log_error
+from .logger import log_error, log_warning
 from .sequencercmd import AwgStartCmd, CaptureEndFenceCmd, WaveSequenceSetCmd, CaptureParamSetCmd, CaptureAddrSetCmd, FeedbackCalcOnClassificationCmd, WaveGenEndFenceCmd
 from .sequencercmd import AwgStartCmdErr, CaptureEndFenceCmdErr, WaveSequenceSetCmdErr, CaptureParamSetCmdErr, CaptureAddrSetCmdErr, FeedbackCalcOnClassificationCmdErr, WaveGenEndFenceCmdErr
 from .hwparam import CMD_ERR_REPORT_SIZE
 from .hwdefs import AWG, CaptureUnit
+from .memorymap import AwgMasterCtrlRegs, AwgCtrlRegs, CaptureMasterCtrlRegs, CaptureCtrlRegs
 
 class RegAccess(object):
     
-    def __init__(self, udp_rw, reg_size):
+    def __init__(self, udp_rw, reg_size, ctrl_udp_rw = None, ctrl_reg_addrs = ()):
+        """
+        | ctrl_reg_addrs に含まれるアドレスのレジスタへの書き込みは, udp_rw の代わりに ctrl_udp_rw で行う.
+        """
         self.__udp_rw = udp_rw
         self.__reg_size = reg_size # bytes
+        self.__ctrl_udp_rw = ctrl_udp_rw
+        self.__ctrl_reg_addrs = frozenset(ctrl_reg_addrs) if ctrl_udp_rw is not None else frozenset()
+
+
+    def __udp_rw_to_write(self, addr, size):
+        """[addr, addr + size) の範囲に書き込むときに使う UdpRw を返す"""
+        for ctrl_reg_addr in self.__ctrl_reg_addrs:
+            if addr <= ctrl_reg_addr < addr + size:
+                return self.__ctrl_udp_rw
+        return self.__udp_rw
 
 
     def write(self, addr, offset, val):
         wr_addr = addr + offset
         val = val & ((1 << (self.__reg_size * 8)) - 1)
         wr_data = val.to_bytes(self.__reg_size, 'little')
-        self.__udp_rw.write(wr_addr, wr_data)
+        self.__udp_rw_to_write(wr_addr, len(wr_data)).write(wr_addr, wr_data)
 
 
     def read(self, addr, offset):
@@ -46,7 +64,11 @@ class RegAccess(object):
         for val in vals:
             val = val & ((1 << (self.__reg_size * 8)) - 1)
             wr_data += val.to_bytes(self.__reg_size, 'little')
-        self.__udp_rw.write(wr_addr, wr_data)
+        self.__udp_rw_to_write(wr_addr, len(wr_data)).write(wr_addr, wr_data)
+
+
+    def write_bytes(self, addr, offset, data):
+        self.__udp_rw_to_write(addr + offset, len(data)).write(addr + offset, data)
 
 
     def multi_read(self, addr, offset, num_regs):
@@ -63,6 +85,8 @@ class RegAccess(object):
 
     def close(self):
         self.__udp_rw.close()
+        if self.__ctrl_udp_rw is not None:
+            self.__ctrl_udp_rw.close()
 
 
     @property
@@ -79,34 +103,52 @@ class AwgRegAccess(RegAccess):
 
     MIN_RW_SIZE = 4 # bytes
     REG_SIZE = 4 # bytes
-
-    def __init__(self, ip_addr, port, *loggers):
-        udp_rw = UdpRw(
-            ip_addr,
-            port,
-            self.MIN_RW_SIZE,
-            UplPacket.MODE_AWG_REG_WRITE,
-            UplPacket.MODE_AWG_REG_READ,
-            *loggers)
-
-        super().__init__(udp_rw, self.REG_SIZE)
+    #: 書き込みを再送しない制御レジスタのアドレス
+    CTRL_REG_ADDRS = frozenset(
+        [AwgMasterCtrlRegs.ADDR + AwgMasterCtrlRegs.Offset.CTRL] +
+        [AwgCtrlRegs.Addr.awg(awg_id) + AwgCtrlRegs.Offset.CTRL for awg_id in AWG.all()])
+
+    def __init__(self, ip_addr, port, *loggers, retry_policy = None):
+        udp_rw, ctrl_udp_rw = [
+            UdpRw(
+                ip_addr,
+                port,
+                self.MIN_RW_SIZE,
+                UplPacket.MODE_AWG_REG_WRITE,
+                UplPacket.MODE_AWG_REG_READ,
+                *loggers,
+                retry_policy = retry_policy,
+                retry_writes = retry_writes)
+            # 制御レジスタへの書き込みは, 再送するとスタートやリセットなどの操作が 2 回行われる可能性があるので再送しない
+            for retry_writes in (True, False)]
+
+        super().__init__(udp_rw, self.REG_SIZE, ctrl_udp_rw, self.CTRL_REG_ADDRS)
 
 
 class CaptureRegAccess(RegAccess):
 
     MIN_RW_SIZE = 4 # bytes
     REG_SIZE = 4 # bytes
-
-    def __init__(self, ip_addr, port, *loggers):
-        udp_rw = UdpRw(
-            ip_addr,
-            port,
-            self.MIN_RW_SIZE,
-            UplPacket.MODE_CAPTURE_REG_WRITE,
-            UplPacket.MODE_CAPTURE_REG_READ,
-            *loggers)
-
-        super().__init__(udp_rw, self.REG_SIZE)
+    #: 書き込みを再送しない制御レジスタのアドレス
+    CTRL_REG_ADDRS = frozenset(
+        [CaptureMasterCtrlRegs.ADDR + CaptureMasterCtrlRegs.Offset.CTRL] +
+        [CaptureCtrlRegs.Addr.capture(unit_id) + CaptureCtrlRegs.Offset.CTRL for unit_id in CaptureUnit.all()])
+
+    def __init__(self, ip_addr, port, *loggers, retry_policy = None):
+        udp_rw, ctrl_udp_rw = [
+            UdpRw(
+                ip_addr,
+                port,
+                self.MIN_RW_SIZE,
+                UplPacket.MODE_CAPTURE_REG_WRITE,
+                UplPacket.MODE_CAPTURE_REG_READ,
+                *loggers,
+                retry_policy = retry_policy,
+                retry_writes = retry_writes)
+            # 制御レジスタへの書き込みは, 再送するとスタートやリセットなどの操作が 2 回行われる可能性があるので再送しない
+            for retry_writes in (True, False)]
+
+        super().__init__(udp_rw, self.REG_SIZE, ctrl_udp_rw, self.CTRL_REG_ADDRS)
 
 
 class ParamRegistryAccess(RegAccess):
@@ -114,14 +156,15 @@ class ParamRegistryAccess(RegAccess):
     MIN_RW_SIZE = 32 # bytes
     REG_SIZE = 4 # bytes
 
-    def __init__(self, ip_addr, port, *loggers):
+    def __init__(self, ip_addr, port, *loggers, retry_policy = None):
         udp_rw = UdpRw(
             ip_addr,
             port,
             self.MIN_RW_SIZE,
             UplPacket.MODE_WAVE_RAM_WRITE,
             UplPacket.MODE_WAVE_RAM_READ,
-            *loggers)
+            *loggers,
+            retry_policy = retry_policy)
 
         super().__init__(udp_rw, self.REG_SIZE)
 
@@ -131,14 +174,16 @@ class SequencerRegAccess(RegAccess):
     MIN_RW_SIZE = 4 # bytes
     REG_SIZE = 4 # bytes
 
-    def __init__(self, ip_addr, port, *loggers):
+    def __init__(self, ip_addr, port, *loggers, demux = None, retry_policy = None):
         udp_rw = UdpRw(
             ip_addr,
             port,
             self.MIN_RW_SIZE,
             UplPacket.MODE_SEQUENCER_REG_WRITE,
             UplPacket.MODE_SEQUENCER_REG_READ,
-            *loggers)
+            *loggers,
+            demux = demux,
+            retry_policy = retry_policy)
 
         super().__init__(udp_rw, self.REG_SIZE)
 
@@ -147,37 +192,41 @@ class SequencerCmdSender(object):
 
     MIN_RW_SIZE = 32 # bytes
 
-    def __init__(self, ip_addr, port, *loggers):
+    def __init__(self, ip_addr, port, *loggers, demux = None, retry_policy = None):
+        # コマンドの書き込みは再送すると同じコマンドが二重に登録されるので再送しない
         self.__udp_rw = UdpRw(
             ip_addr,
             port,
             1,
             UplPacket.MODE_SEQUENCER_CMD_WRITE,
             UplPacket.MODE_OTHERS,
-            *loggers)
+            *loggers,
+            demux = demux,
+            retry_policy = retry_policy,
+            retry_writes = False)
 
 
     def send(self, cmd_list):
-        payload = bytearray()
-        whole_size = 8
-        num_cmds = 0
-        while cmd_list:
-            cmd = cmd_list[0]
-            if (whole_size + cmd.size()) > UdpRw.MAX_RW_SIZE:
-                payload = num_cmds.to_bytes(8, 'little') + payload
-                self.__udp_rw.write(0, payload)
-                payload = bytearray()
-                whole_size = 8
-                num_cmds = 0
-            else:
-                payload.extend(cmd.serialize())
-                whole_size += cmd.size()
-                num_cmds += 1
-                cmd_list.pop(0)
-        
-
-        payload = num_cmds.to_bytes(8, 'little') + payload
-        self.__udp_rw.write(0, payload)
+        """シーケンサにコマンドを送信する
+
+        Args:
+            cmd_list (list of SequencerCmd or numpy.ndarray):
+                | 送信するコマンドのリストか, コマンドをシリアライズしたデータを格納した配列.
+                | 配列の要素 1 つが 1 コマンドに対応する.
+        """
+        if isinstance(cmd_list, np.ndarray):
+            cmd_size = cmd_list.dtype.itemsize
+            data = np.ascontiguousarray(cmd_list).tobytes()
+        else:
+            cmd_size = cmd_list[0].size() if cmd_list else 0
+            data = b''.join([cmd.serialize() for cmd in cmd_list])
+
+        max_cmds = (UdpRw.MAX_RW_SIZE - 8) // cmd_size if cmd_size > 0 else 1
+        max_payload_size = max_cmds * cmd_size
+        for pos in range(0, max(len(data), 1), max_payload_size):
+            payload = data[pos : pos + max_payload_size]
+            num_cmds = len(payload) // cmd_size if cmd_size > 0 else 0
+            self.__udp_rw.write(0, num_cmds.to_bytes(8, 'little') + payload)
 
 
     def close(self):
@@ -198,14 +247,20 @@ class WaveRamAccess(object):
 
     MIN_RW_SIZE = 32 # bytes
 
-    def __init__(self, ip_addr, port, *loggers):
+    def __init__(self, ip_addr, port, *loggers, retry_policy = None, batch_recv = True):
+        """
+        | batch_recv が True で, UdpBatchReceiver が使える環境の場合,
+        | read_into と pipelined_write の応答パケットをまとめて受信する.
+        """
         self.__udp_rw = UdpRw(
             ip_addr,
             port,
             self.MIN_RW_SIZE,
             UplPacket.MODE_WAVE_RAM_WRITE,
             UplPacket.MODE_WAVE_RAM_READ,
-            *loggers)
+            *loggers,
+            retry_policy = retry_policy,
+            batch_recv = batch_recv and UdpBatchReceiver.is_supported())
 
 
     def write(self, addr, data):
@@ -216,62 +271,119 @@ class WaveRamAccess(object):
         return self.__udp_rw.read(addr, size)
 
 
+    def read_into(self, addr, buf):
+        self.__udp_rw.read_into(addr, buf)
+
+
+    def pipelined_write(self, segments):
+        self.__udp_rw.pipelined_write(segments)
+
+
     def close(self):
         self.__udp_rw.close()
 
 
-class CmdErrReceiver(threading.Thread):
+    @property
+    def uses_batch_recv(self):
+        """応答パケットをまとめて受信するかどうか"""
+        return self.__udp_rw.uses_batch_recv
 
-    BUFSIZE = 16384 # bytes
 
-    def __init__(self, my_ip_addr, *loggers):
-        #threading.Thread.__init__(self)
-        super().__init__()
-        self.__sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.__sock.bind((my_ip_addr, 0))
+class CmdErrReceiver(object):
+
+    #: 保持するコマンドエラーレポートの最大数のデフォルト値
+    DEFAULT_MAX_REPORTS = 65536
+    #: コマンドエラーレポートのフィールドの配置
+    REPORT_DTYPE = np.dtype({
+        'names': ['head', 'cmd_no', 'units'],
+        'formats': ['u1', '<u2', '<u2'],
+        'offsets': [0, 1, 3],
+        'itemsize': CMD_ERR_REPORT_SIZE})
+    __NUM_CMD_IDS = 128
+
+    def __init__(self, demux, *loggers, max_reports = DEFAULT_MAX_REPORTS):
+        """demux が受信したコマンドエラーレポートを解析して保持する
+
+        | レポートは最大 max_reports 個までリングバッファに保持し, 溢れた場合は古いものから捨てる.
+        """
+        self.__demux = demux
         self.__rlock = threading.RLock()
-        self.__reports = []
         self.__loggers = loggers
-        self.__my_ip_addr = my_ip_addr
+        self.__ring = np.zeros(max_reports, dtype = self.REPORT_DTYPE)
+        self.reset()
+        self.__demux.add_handler(UplPacket.MODE_SEQUENCER_CMD_ERR_REPORT, self.__on_recv)
 
 
-    def run(self):
-        while True:
-            try:
-                recv_data, _ = self.__sock.recvfrom(self.BUFSIZE)
-                recv_packet = UplPacket.deserialize(recv_data)
-                if recv_packet.mode() == UplPacket.MODE_OTHERS:
-                    return
+    def reset(self):
+        """保持しているレポートと統計情報を全て破棄する"""
+        with self.__rlock:
+            self.__ring_head = 0 # 最も古いレポートの位置
+            self.__num_reports = 0
+            self.__num_dropped = 0
+            self.__counts = np.zeros(self.__NUM_CMD_IDS, dtype = np.int64)
+
+
+    def __on_recv(self, recv_packet, dev_addr):
+        try:
+            payload = recv_packet.payload()[8:]
+            num_reports = len(payload) // CMD_ERR_REPORT_SIZE
+            reports = np.frombuffer(
+                payload, dtype = self.REPORT_DTYPE, count = num_reports)
+            cmd_ids = (reports['head'] >> 1) & 0x7F
+            with self.__rlock:
+                self.__counts += np.bincount(cmd_ids, minlength = self.__NUM_CMD_IDS)
+                self.__push(reports)
+        except Exception as e:
+            # ここで記録したエラーを UdpDemux が再度記録しないように, 例外は送出しない
+            log_error(e, *self.__loggers)
 
-                payload = recv_packet.payload()[8:]
-                num_reports = len(payload) // CMD_ERR_REPORT_SIZE
-                with self.__rlock:
-                    for i in range(num_reports):
-                        report_bytes = payload[i * CMD_ERR_REPORT_SIZE : (i + 1) * CMD_ERR_REPORT_SIZE]
-                        self.__reports.append(self.__gen_seq_cmd_err_from_bytes(report_bytes))
-            except Exception as e:
-                log_error(e, *self.__loggers)
-                raise
+
+    def __push(self, reports):
+        capacity = len(self.__ring)
+        if len(reports) > capacity:
+            self.__num_dropped += len(reports) - capacity
+            reports = reports[len(reports) - capacity:]
+
+        num_overwritten = max(0, self.__num_reports + len(reports) - capacity)
+        if num_overwritten > 0:
+            self.__num_dropped += num_overwritten
+            self.__ring_head = (self.__ring_head + num_overwritten) % capacity
+            self.__num_reports -= num_overwritten
+
+        tail = (self.__ring_head + self.__num_reports) % capacity
+        first = min(len(reports), capacity - tail)
+        self.__ring[tail : tail + first] = reports[:first]
+        self.__ring[:len(reports) - first] = reports[first:]
+        self.__num_reports += len(reports)
+
+
+    def __gen_seq_cmd_errs(self, reports):
+        is_terminated = (reports['head'] & 0x1).tolist()
+        cmd_ids = ((reports['head'] >> 1) & 0x7F).tolist()
+        cmd_nos = reports['cmd_no'].tolist()
+        unit_bits = reports['units'].tolist()
+        errs = []
+        for fields in zip(cmd_ids, cmd_nos, is_terminated, unit_bits):
+            err = self.__gen_seq_cmd_err(*fields)
+            if err is None:
+                # 未知のコマンドのレポートは, 残りのレポートを失わないように記録だけして読み飛ばす
+                log_warning(
+                    'Unknown sequencer cmd err report was skipped.  cmd_id = {}, cmd_no = {}'.format(*fields[:2]),
+                    *self.__loggers)
+                continue
+            errs.append(err)
+        return errs
 
 
     @classmethod
-    def __gen_seq_cmd_err_from_bytes(cls, data):
-        bit_field = int.from_bytes(data, byteorder='little')
-        is_terminated = bit_field & 0x1
-        cmd_id = (bit_field >> 1) & 0x7F
-        cmd_no = (bit_field >> 8) & 0xFFFF
-        read_err = bool((bit_field >> 24) & 0x1)
-        write_err = bool((bit_field >> 25) & 0x1)
-        awg_id_bits = bit_field >> 24
-        awg_id_list = list(filter(lambda awg_id: awg_id_bits & (1 << awg_id), AWG.all()))
-        cap_unit_id_bits = bit_field >> 24
-        cap_unit_id_list = list(filter(
-            lambda cap_unit_id: cap_unit_id_bits & (1 << cap_unit_id), CaptureUnit.all()))
+    def __gen_seq_cmd_err(cls, cmd_id, cmd_no, is_terminated, unit_bits):
+        read_err = bool(unit_bits & 0x1)
+        write_err = bool((unit_bits >> 1) & 0x1)
 
         if cmd_id == AwgStartCmd.ID:
-            return AwgStartCmdErr(cmd_no, is_terminated, awg_id_list)
+            return AwgStartCmdErr(cmd_no, is_terminated, cls.__to_id_list(unit_bits, AWG))
         elif cmd_id == CaptureEndFenceCmd.ID:
-            return CaptureEndFenceCmdErr(cmd_no, is_terminated, cap_unit_id_list)
+            return CaptureEndFenceCmdErr(cmd_no, is_terminated, cls.__to_id_list(unit_bits, CaptureUnit))
         elif cmd_id == WaveSequenceSetCmd.ID:
             return WaveSequenceSetCmdErr(cmd_no, is_terminated, read_err, write_err)
         elif cmd_id == CaptureParamSetCmd.ID:
@@ -281,74 +393,99 @@ class CmdErrReceiver(threading.Thread):
         elif cmd_id == FeedbackCalcOnClassificationCmd.ID:
             return FeedbackCalcOnClassificationCmdErr(cmd_no, is_terminated, read_err)
         elif cmd_id == WaveGenEndFenceCmd.ID:
-            return WaveGenEndFenceCmdErr(cmd_no, is_terminated, awg_id_list)
+            return WaveGenEndFenceCmdErr(cmd_no, is_terminated, cls.__to_id_list(unit_bits, AWG))
+
+        return None
 
-        assert False, ('Invalid cmd err.  cmd_id = {}'.format(cmd_id))
+
+    @classmethod
+    def __to_id_list(cls, id_bits, id_enum):
+        return [id for id in id_enum.all() if id_bits & (1 << id)]
 
 
     def pop_err_reports(self):
+        """保持しているレポートを古いものから順に SequencerCmdErr オブジェクトにして返す"""
         with self.__rlock:
-            tmp = self.__reports
-            self.__reports = []
-            return tmp
+            indices = (self.__ring_head + np.arange(self.__num_reports)) % len(self.__ring)
+            reports = self.__ring[indices]
+            self.__ring_head = 0
+            self.__num_reports = 0
+        return self.__gen_seq_cmd_errs(reports)
 
 
-    def stop(self):
-        if self.is_alive():
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                stop_packet = UplPacket(UplPacket.MODE_OTHERS, 0, 0)
-                sock.sendto(stop_packet.serialize(), (self.__my_ip_addr, self.my_port))
-            self.join()
+    def err_report_counts(self):
+        """受信したレポートの数をコマンドの種類ごとに返す
 
-
-    def close(self):
-        self.__sock.close()
+        Returns:
+            dict: コマンドの ID -> そのコマンドのエラーレポートを受信した数.  受信数が 0 のコマンドは含まない.
+        """
+        with self.__rlock:
+            counts = self.__counts.copy()
+        return {cmd_id : int(counts[cmd_id]) for cmd_id in np.flatnonzero(counts).tolist()}
 
 
     @property
-    def my_ip_addr(self):
-        return self.__sock.getsockname()[0]
+    def num_dropped_reports(self):
+        """保持しきれずに捨てたレポートの数"""
+        return self.__num_dropped
 
 
-    @property
-    def my_port(self):
-        return self.__sock.getsockname()[1]
+    def close(self):
+        self.__demux.remove_handler(UplPacket.MODE_SEQUENCER_CMD_ERR_REPORT)
 
 
-class UdpRouter(threading.Thread):
+class UdpDemux(threading.Thread):
 
     BUFSIZE = 16384 # bytes
 
-    def __init__(self, my_ip_addr, table, *loggers):
-        """受信した UPL パケットをそのモードに応じて転送する"""
-        #threading.Thread.__init__(self)
+    def __init__(self, my_ip_addr, *loggers):
+        """1 つのソケットで受信した UPL パケットを, そのモードに対応するハンドラに直接渡す"""
         super().__init__()
         self.__sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.__sock.bind((my_ip_addr, 0))
-        self.__table = copy.copy(table)
+        self.__handlers = {}
         self.__rlock = threading.RLock()
         self.__loggers = loggers
         self.__my_ip_addr = my_ip_addr
-    
+
 
     def run(self):
         while True:
             try:
-                recv_data, _ = self.__sock.recvfrom(self.BUFSIZE)
+                recv_data, dev_addr = self.__sock.recvfrom(self.BUFSIZE)
                 recv_packet = UplPacket.deserialize(recv_data)
                 if recv_packet.mode() == UplPacket.MODE_OTHERS:
                     return
 
-                with self.__rlock:
-                    if recv_packet.mode() in self.__table:
-                        addr = self.__table[recv_packet.mode()]
-                    else:
-                        continue
-                
-                self.__sock.sendto(recv_data, addr)
+                # ハンドラの登録と削除は辞書の差し替えで行うので, ここではロックを取らない
+                handler = self.__handlers.get(recv_packet.mode())
+                if handler is not None:
+                    handler(recv_packet, dev_addr)
             except Exception as e:
+                # 1 つのパケットの処理に失敗しても, 他の受信者へのパケットの配送は止めない
                 log_error(e, *self.__loggers)
-                raise
+
+
+    def sendto(self, data, addr):
+        self.__sock.sendto(data, addr)
+
+
+    def add_handler(self, packet_mode, handler):
+        """packet_mode のパケットを受信したときに呼ぶ関数を登録する
+
+        | handler は受信スレッドから handler(UplPacket, 送信元アドレス) として呼ばれる.
+        """
+        with self.__rlock:
+            handlers = dict(self.__handlers)
+            handlers[packet_mode] = handler
+            self.__handlers = handlers
+
+
+    def remove_handler(self, packet_mode):
+        with self.__rlock:
+            handlers = dict(self.__handlers)
+            handlers.pop(packet_mode, None)
+            self.__handlers = handlers
 
 
     def stop(self):
@@ -359,11 +496,6 @@ class UdpRouter(threading.Thread):
             self.join()
 
 
-    def add_entry(self,packet_mode, ip_addr, port):
-        with self.__rlock:
-            self.__table[packet_mode] = (ip_addr, port)
-
-
     def close(self):
         self.__sock.close()
 
@@ -378,22 +510,349 @@ class UdpRouter(threading.Thread):
         return self.__sock.getsockname()[1]
 
 
+class UdpBatchReceiver(object):
+    """ソケットに届いている UDP パケットを, 事前に確保したバッファにまとめて受信する
+
+    | パケットが届くまで poll で待ち, 届いたパケットをノンブロッキングの recvmsg_into で一度に読み出す.
+    | パケットごとに受信用のバッファを確保しないので, 大量の応答パケットを受け取る場合の処理時間が短くなる.
+    | 受信したパケットは次に recv を呼ぶまで有効な memoryview として返す.
+    """
+
+    def __init__(self, sock, bufsize, num_bufs):
+        """
+        Args:
+            sock (socket.socket): パケットを受信するソケット
+            bufsize (int): 1 パケット分の受信バッファのサイズ (bytes)
+            num_bufs (int): 1 回の recv で受信するパケットの最大数
+        """
+        self.__sock = sock
+        self.__poller = select.poll()
+        self.__poller.register(sock, select.POLLIN)
+        self.__bufs = [memoryview(bytearray(bufsize)) for _ in range(num_bufs)]
+
+
+    @classmethod
+    def is_supported(cls):
+        """この環境で UdpBatchReceiver が使えるかどうか"""
+        return (sys.platform.startswith('linux') and
+                hasattr(select, 'poll') and
+                hasattr(socket.socket, 'recvmsg_into'))
+
+
+    def recv(self, timeout):
+        """パケットが届くまで最大 timeout 秒待って, 届いているパケットを全て受信する
+
+        Args:
+            timeout (float): パケットが届くのを待つ時間 (単位 : 秒)
+
+        Returns:
+            list of (memoryview, address): 受信したパケットとその送信元アドレスのリスト
+
+        Raises:
+            socket.timeout: timeout 秒以内にパケットが届かなかった
+        """
+        self.__sock.settimeout(0)
+        if not self.__poller.poll(timeout * 1000):
+            raise socket.timeout('timed out')
+
+        packets = []
+        for buf in self.__bufs:
+            try:
+                num_bytes, _, _, addr = self.__sock.recvmsg_into([buf], 0, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+            packets.append((buf[:num_bytes], addr))
+        return packets
+
+
+class RetryPolicy(object):
+    """UDP で送った要求に対する応答待ちのタイムアウトと再送の方針
+
+    | 応答を待つ時間は, 実測した往復遅延時間 (RTT) の平滑値とその変動から Jacobson のアルゴリズムで求め,
+    | min_timeout 以上 max_timeout 以下にする.  RTT を測定するまでは initial_timeout 秒待つ.
+    | 応答が無い場合, 待つ時間を 2 倍にして (最大 max_timeout 秒) 同じ要求を再送する.
+    | max_retries 回再送しても応答が無い場合は socket.timeout 例外を送出する.
+    | 読み出しと, 波形 RAM やパラメータを設定するレジスタへの書き込みは, 何度送っても結果が変わらない.
+    | 一方, 制御レジスタへの書き込み (スタートやリセットなど) は, 再送すると同じ操作が 2 回行われる可能性がある.
+    | 同じ操作が 2 回行われると困る要求は, UdpRw の retry_writes を False にして送ること.
+    """
+
+    def __init__(self, max_retries = 8, initial_timeout = 0.2, min_timeout = 0.05, max_timeout = 25):
+        """
+        Args:
+            max_retries (int): 1 つの要求を再送する最大回数
+            initial_timeout (int or float): RTT を測定するまでの応答待ちのタイムアウト (単位 : 秒)
+            min_timeout (int or float): 応答待ちのタイムアウトの最小値 (単位 : 秒)
+            max_timeout (int or float):
+                | 応答待ちのタイムアウトの最大値 (単位 : 秒).
+                | 再送しない要求 (シーケンサへのコマンドの書き込み) は, この時間だけ応答を待つ.
+        """
+        if not (isinstance(max_retries, int) and max_retries >= 0):
+            raise ValueError(
+                "'max_retries' must be an integer greater than or equal to 0.  '{}' was set.".format(max_retries))
+        for name, val in (('initial_timeout', initial_timeout),
+                          ('min_timeout', min_timeout),
+                          ('max_timeout', max_timeout)):
+            if not (isinstance(val, (int, float)) and val > 0):
+                raise ValueError("'{}' must be a positive number.  '{}' was set.".format(name, val))
+        if min_timeout > max_timeout:
+            raise ValueError(
+                "'min_timeout' must be less than or equal to 'max_timeout'.  min = {}, max = {}"
+                .format(min_timeout, max_timeout))
+
+        self.__max_retries = max_retries
+        self.__initial_timeout = initial_timeout
+        self.__min_timeout = min_timeout
+        self.__max_timeout = max_timeout
+
+
+    @property
+    def max_retries(self):
+        """1 つの要求を再送する最大回数"""
+        return self.__max_retries
+
+
+    @property
+    def initial_timeout(self):
+        """RTT を測定するまでの応答待ちのタイムアウト (単位 : 秒)"""
+        return self.__initial_timeout
+
+
+    @property
+    def min_timeout(self):
+        """応答待ちのタイムアウトの最小値 (単位 : 秒)"""
+        return self.__min_timeout
+
+
+    @property
+    def max_timeout(self):
+        """応答待ちのタイムアウトの最大値 (単位 : 秒)"""
+        return self.__max_timeout
+
+
+    def timeout(self, rto, num_retries):
+        """num_retries 回目の再送の応答を待つ時間を返す
+
+        Args:
+            rto (float): RTT から求めた再送タイムアウト (単位 : 秒).  None の場合, initial_timeout を使う.
+            num_retries (int): これまでに再送した回数
+
+        Returns:
+            float: 応答を待つ時間 (単位 : 秒)
+        """
+        if rto is None:
+            rto = self.__initial_timeout
+        timeout = min(max(rto, self.__min_timeout), self.__max_timeout)
+        return min(timeout * (2 ** num_retries), self.__max_timeout)
+
+
 class UdpRw(object):
 
     BUFSIZE = 16384 # bytes
     #MAX_RW_SIZE = 3616 # bytes
     MAX_RW_SIZE = 1440 # bytes
-    TIMEOUT = 25 # sec
+    PIPELINE_DEPTH = 32 # read_into, pipelined_write で応答を待たずに送る要求の最大数
+    TIMEOUT = RetryPolicy().max_timeout # sec.  デフォルトの RetryPolicy の応答待ちのタイムアウトの最大値
 
-    def __init__(self, ip_addr, port, min_rw_size, wr_mode_id, rd_mode_id, *loggers):
+    def __init__(
+        self,
+        ip_addr,
+        port,
+        min_rw_size,
+        wr_mode_id,
+        rd_mode_id,
+        *loggers,
+        demux = None,
+        retry_policy = None,
+        retry_writes = True,
+        batch_recv = False):
+        """
+        | demux が None の場合, 専用のソケットで送受信する.
+        | そうでない場合, demux のソケットで送信し, その受信スレッドから応答パケットを受け取る.
+        | retry_policy が None の場合, デフォルトの RetryPolicy を使う.
+        | retry_writes が False の場合, 書き込み要求は再送せず, retry_policy の max_timeout 秒だけ応答を待つ.
+        | batch_recv が True の場合, read_into と pipelined_write の応答パケットを UdpBatchReceiver でまとめて受信する.
+        | batch_recv は demux が None の場合のみ有効.
+        """
         self.__dest_addr = (ip_addr, port)
-        self.__sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.__sock.settimeout(self.TIMEOUT)
-        self.__sock.bind((get_my_ip_addr(ip_addr), 0))
+        self.__demux = demux
+        self.__batch_receiver = None
+        if demux is None:
+            self.__sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.__sock.bind((get_my_ip_addr(ip_addr), 0))
+            if batch_recv:
+                # 重複した応答や再送前の要求に対する応答の分も受け取れるように, 応答を待つ要求の最大数の 2 倍のバッファを用意する
+                self.__batch_receiver = UdpBatchReceiver(self.__sock, self.BUFSIZE, 2 * self.PIPELINE_DEPTH)
+        else:
+            self.__sock = None
+            self.__reply_queue = queue.Queue()
+            # 応答パケットのモード ID はリクエストのモード ID + 1
+            self.__reply_modes = [
+                mode_id + 1 for mode_id in (wr_mode_id, rd_mode_id) if mode_id != UplPacket.MODE_OTHERS]
+            for reply_mode in self.__reply_modes:
+                demux.add_handler(reply_mode, self.__on_reply)
         self.__min_rw_size = min_rw_size
         self.__wr_mode_id = wr_mode_id
         self.__rd_mode_id = rd_mode_id
         self.__loggers = loggers
+        self.__retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        self.__retry_writes = retry_writes
+        # RTT の平滑値とその変動 (単位 : 秒).  RTT を測定するまでは None.
+        self.__srtt = None
+        self.__rttvar = None
+        # ペイロードをコピーせずに送るため, ヘッダだけを書き込むバッファ
+        self.__header_buf = bytearray(UplPacket.HEADER_SIZE)
+        self.__use_sendmsg = hasattr(socket.socket, 'sendmsg')
+        # 1 パケットずつ受信する場合の受信バッファ
+        self.__recv_buf = memoryview(bytearray(self.BUFSIZE))
+
+
+    def __on_reply(self, recv_packet, dev_addr):
+        self.__reply_queue.put((recv_packet, dev_addr))
+
+
+    def __transact(self, send_packet):
+        """send_packet を送信して, その応答パケットと送信元アドレスを返す"""
+        replies = []
+        self.__pipeline(iter([send_packet]), lambda _, *reply: replies.append(reply), 1, self.__recv_reply)
+        return replies[0]
+
+
+    def __pipeline(self, send_packets, on_reply, max_pending, recv_replies):
+        """send_packets の各要求を送って, その応答を受け取るたびに on_reply(要求パケット, 応答パケット, 送信元アドレス) を呼ぶ
+
+        | 最大 max_pending 個の要求を応答を待たずに送る.
+        | 応答が無い要求は RetryPolicy に従って再送する.
+        | アドレス, サイズ, モードが応答待ちの要求と一致しない応答 (再送前の要求に対する応答や重複した応答) は捨てる.
+        | 前の呼び出しで再送した要求に対する応答が後から届いている場合があるので, 要求を送る前に受信済みの応答を全て捨てる.
+        | recv_replies(timeout) は, 受信した応答パケットとその送信元アドレスのリストを返す関数.
+        """
+        self.__discard_stale_replies()
+        # 応答を待っている要求.  アドレス -> [要求パケット, 送信時刻, 再送回数, タイムアウト時刻]
+        pending = {}
+        while True:
+            while len(pending) < max_pending:
+                send_packet = next(send_packets, None)
+                if send_packet is None:
+                    break
+                pending[send_packet.addr()] = self.__send_request(send_packet, 0)
+            if not pending:
+                return
+
+            now = time.perf_counter()
+            for addr, (send_packet, _, num_retries, deadline) in list(pending.items()):
+                if deadline <= now:
+                    if num_retries >= self.__max_retries(send_packet):
+                        raise socket.timeout('timed out')
+                    pending[addr] = self.__send_request(send_packet, num_retries + 1)
+
+            timeout = min(request[3] for request in pending.values()) - now
+            try:
+                replies = recv_replies(max(timeout, 1e-6))
+            except socket.timeout:
+                continue
+
+            recv_time = time.perf_counter()
+            for recv_packet, dev_addr in replies:
+                request = pending.get(recv_packet.addr())
+                if (request is None) or (not self.__is_reply(request[0], recv_packet)):
+                    continue
+                del pending[recv_packet.addr()]
+                send_packet, send_time, num_retries, _ = request
+                # 再送した要求の応答は, どの要求に対するものか分からないので RTT の測定に使わない
+                if num_retries == 0:
+                    self.__update_rtt(recv_time - send_time)
+                on_reply(send_packet, recv_packet, dev_addr)
+
+
+    def __send_request(self, send_packet, num_retries):
+        """要求を送って, [要求パケット, 送信時刻, 再送回数, タイムアウト時刻] を返す"""
+        send_time = time.perf_counter()
+        self.__send(send_packet)
+        if self.__max_retries(send_packet) == 0:
+            timeout = self.__retry_policy.max_timeout
+        else:
+            rto = None if self.__srtt is None else self.__srtt + 4 * self.__rttvar
+            timeout = self.__retry_policy.timeout(rto, num_retries)
+        return [send_packet, send_time, num_retries, send_time + timeout]
+
+
+    def __max_retries(self, send_packet):
+        if (not self.__retry_writes) and (send_packet.mode() == self.__wr_mode_id):
+            return 0
+        return self.__retry_policy.max_retries
+
+
+    def __is_reply(self, send_packet, recv_packet):
+        """recv_packet が send_packet に対する応答かどうか調べる"""
+        # 応答パケットのモード ID はリクエストのモード ID + 1
+        return ((recv_packet.mode() == send_packet.mode() + 1) and
+                (recv_packet.addr() == send_packet.addr()) and
+                (recv_packet.num_bytes() == send_packet.num_bytes()))
+
+
+    def __update_rtt(self, rtt):
+        """RTT の測定値から, その平滑値と変動を更新する (Jacobson のアルゴリズム)"""
+        if self.__srtt is None:
+            self.__srtt = rtt
+            self.__rttvar = rtt / 2
+        else:
+            self.__rttvar = 0.75 * self.__rttvar + 0.25 * abs(self.__srtt - rtt)
+            self.__srtt = 0.875 * self.__srtt + 0.125 * rtt
+
+
+    def __send(self, send_packet):
+        if self.__demux is not None:
+            self.__demux.sendto(send_packet.serialize(), self.__dest_addr)
+        elif self.__use_sendmsg:
+            # ヘッダとペイロードを 1 つのデータグラムとして送る
+            send_packet.pack_header_into(self.__header_buf)
+            self.__sock.sendmsg([self.__header_buf, send_packet.payload()], (), 0, self.__dest_addr)
+        else:
+            self.__sock.sendto(send_packet.serialize(), self.__dest_addr)
+
+
+    def __recv_reply(self, timeout):
+        """応答パケットを 1 つ受信して, [(パケット, 送信元アドレス)] を返す.  timeout 秒以内に受信できなければ socket.timeout 例外を送出する.
+
+        | 返したパケットのペイロードは, 次に応答パケットを受信するまで有効.
+        """
+        if self.__demux is None:
+            self.__sock.settimeout(timeout)
+            num_bytes, dev_addr = self.__sock.recvfrom_into(self.__recv_buf)
+            return [(UplPacket.deserialize(self.__recv_buf[:num_bytes]), dev_addr)]
+
+        try:
+            return [self.__reply_queue.get(timeout = timeout)]
+        except queue.Empty:
+            raise socket.timeout('timed out')
+
+
+    def __discard_stale_replies(self):
+        """既に届いている応答パケットを全て受信して捨てる"""
+        if self.__demux is not None:
+            try:
+                while True:
+                    self.__reply_queue.get_nowait()
+            except queue.Empty:
+                return
+
+        self.__sock.settimeout(0)
+        try:
+            while True:
+                self.__sock.recvfrom_into(self.__recv_buf)
+        except BlockingIOError:
+            pass
+
+
+    def __recv_bulk_replies(self, timeout):
+        """届いている応答パケットをまとめて受信して, (パケット, 送信元アドレス) のリストを返す
+
+        | 返したパケットのペイロードは, 次に応答パケットを受信するまで有効.
+        """
+        if self.__batch_receiver is None:
+            return self.__recv_reply(timeout)
+        return [(UplPacket.deserialize(data), dev_addr) for data, dev_addr in self.__batch_receiver.recv(timeout)]
  
 
     def write(self, addr, data):
@@ -407,6 +866,40 @@ class UdpRw(object):
             size_remaining -= size_to_send
 
 
+    def pipelined_write(self, segments, max_pending = PIPELINE_DEPTH):
+        """segments の各データを書き込む
+
+        | 最大 max_pending 個の書き込み要求を応答を待たずに送る.
+        | segments はイテレータでもよく, 書き込み要求を送る直前に次の要素を取り出す.
+        | 各データの書き込み先アドレスとサイズは最小書き込みサイズの倍数でなければならない.
+
+        Args:
+            segments (iterable of (int, bytes-like object)): (書き込み開始アドレス, 書き込むデータ) のリスト
+            max_pending (int): 応答を待たずに送る書き込み要求の最大数
+        """
+        try:
+            self.__pipeline(
+                self.__gen_write_packets(segments), lambda *_: None, max_pending, self.__recv_bulk_replies)
+        except socket.timeout as e:
+            log_error('{},  Dest {}'.format(e, self.__dest_addr), *self.__loggers)
+            raise
+        except Exception as e:
+            log_error(e, *self.__loggers)
+            raise
+
+
+    def __gen_write_packets(self, segments):
+        for addr, data in segments:
+            data = memoryview(data).cast('B')
+            if (addr % self.__min_rw_size != 0) or (len(data) % self.__min_rw_size != 0):
+                raise ValueError(
+                    'The address and size to write must be multiples of {}.  addr = {}, size = {}'
+                    .format(self.__min_rw_size, addr, len(data)))
+            for pos in range(0, len(data), self.MAX_RW_SIZE):
+                size = min(self.MAX_RW_SIZE, len(data) - pos)
+                yield UplPacket(self.__wr_mode_id, addr + pos, size, data[pos : pos + size])
+
+
     def __send_data(self, addr, data):
         # アドレス端数調整
         frac_len = addr % self.__min_rw_size
@@ -425,14 +918,7 @@ class UdpRw(object):
 
         try:
             send_packet = UplPacket(self.__wr_mode_id, addr, len(data), data)
-            self.__sock.sendto(send_packet.serialize(), self.__dest_addr)
-            recv_data, dev_addr = self.__sock.recvfrom(self.BUFSIZE)
-            recv_packet = UplPacket.deserialize(recv_data)
-            if (recv_packet.num_bytes() != len(data)) or (recv_packet.addr() != addr):
-                err_msg = self.__gen_err_msg(
-                    'upl write err', dev_addr, recv_data,
-                    addr, len(data), recv_packet.addr(), recv_packet.num_bytes())
-                raise  ValueError(err_msg)
+            self.__transact(send_packet)
         except socket.timeout as e:
             log_error('{},  Dest {}'.format(e, self.__dest_addr), *self.__loggers)
             raise
@@ -452,6 +938,41 @@ class UdpRw(object):
         return rd_data
 
 
+    def read_into(self, addr, buf, max_pending = PIPELINE_DEPTH):
+        """addr から len(buf) バイトを読んで buf に格納する
+
+        | 最大 max_pending 個の読み出し要求を応答を待たずに送る.
+        | addr と len(buf) は最小読み出しサイズの倍数でなければならない.
+
+        Args:
+            addr (int): 読み出し開始アドレス
+            buf (writable bytes-like object): 読んだデータを格納するバッファ
+            max_pending (int): 応答を待たずに送る読み出し要求の最大数
+        """
+        buf = memoryview(buf).cast('B')
+        if (addr % self.__min_rw_size != 0) or (len(buf) % self.__min_rw_size != 0):
+            raise ValueError(
+                'The address and size to read must be multiples of {}.  addr = {}, size = {}'
+                .format(self.__min_rw_size, addr, len(buf)))
+
+        def gen_read_packets():
+            for pos in range(0, len(buf), self.MAX_RW_SIZE):
+                yield UplPacket(self.__rd_mode_id, addr + pos, min(self.MAX_RW_SIZE, len(buf) - pos))
+
+        def on_reply(send_packet, recv_packet, dev_addr):
+            pos = send_packet.addr() - addr
+            buf[pos : pos + send_packet.num_bytes()] = recv_packet.payload()[0 : send_packet.num_bytes()]
+
+        try:
+            self.__pipeline(gen_read_packets(), on_reply, max_pending, self.__recv_bulk_replies)
+        except socket.timeout as e:
+            log_error('{},  Dest {}'.format(e, self.__dest_addr), *self.__loggers)
+            raise
+        except Exception as e:
+            log_error(e, *self.__loggers)
+            raise
+
+
     def __recv_data(self, addr, size):
         # 端数調整
         rd_addr = addr // self.__min_rw_size * self.__min_rw_size
@@ -461,14 +982,7 @@ class UdpRw(object):
 
         try:
             send_packet = UplPacket(self.__rd_mode_id, rd_addr, rd_size)
-            self.__sock.sendto(send_packet.serialize(), self.__dest_addr)
-            recv_data, dev_addr = self.__sock.recvfrom(self.BUFSIZE)
-            recv_packet = UplPacket.deserialize(recv_data)
-            if (recv_packet.num_bytes() != rd_size) or (recv_packet.addr() != rd_addr):
-                err_msg = self.__gen_err_msg(
-                    'upl read err', dev_addr, recv_data,
-                    addr, rd_size, recv_packet.addr(), recv_packet.num_bytes())
-                raise  ValueError(err_msg)
+            recv_packet, _ = self.__transact(send_packet)
         except socket.timeout as e:
             log_error('{},  Dest {}'.format(e, self.__dest_addr), *self.__loggers)
             raise
@@ -479,36 +993,32 @@ class UdpRw(object):
         return recv_packet.payload()[rd_offset : rd_offset + size]
 
 
-    def __gen_err_msg(
-        self,
-        summary,
-        devie_ip_addr,
-        recv_data,
-        exp_addr,
-        exp_data_len,
-        actual_addr,
-        actual_data_len):
-        msg = '{}\n'.format(summary)
-        msg += '  Server IP / Port : {}\n'.format(self.__sock.getsockname())
-        msg += '  Target IP / Port : {}\n'.format(self.__dest_addr)
-        msg += '  Device IP / Port : {}\n'.format(devie_ip_addr)
-        msg += '  recv data : {}\n'.format(recv_data)
-        msg += '  expected addr : {}, expected data len : {}\n'.format(exp_addr, exp_data_len)
-        msg += '  actual addr : {}, actual data len : {}\n'.format(actual_addr, actual_data_len)
-        return msg
-
     def close(self):
-        self.__sock.close()
+        if self.__demux is None:
+            self.__sock.close()
+        else:
+            for reply_mode in self.__reply_modes:
+                self.__demux.remove_handler(reply_mode)
+
+
+    @property
+    def uses_batch_recv(self):
+        """read_into と pipelined_write の応答パケットを UdpBatchReceiver でまとめて受信するかどうか"""
+        return self.__batch_receiver is not None
 
 
     @property
     def my_ip_addr(self):
-        return self.__sock.getsockname()[0]
+        if self.__demux is None:
+            return self.__sock.getsockname()[0]
+        return self.__demux.my_ip_addr
 
 
     @property
     def my_port(self):
-        return self.__sock.getsockname()[1]
+        if self.__demux is None:
+            return self.__sock.getsockname()[1]
+        return self.__demux.my_port
 
 
 def get_my_ip_addr(ip_addr):
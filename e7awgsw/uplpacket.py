@@ -1,4 +1,6 @@
 
+import struct
+
 class UplPacket(object):
 
     MODE_WAVE_RAM_READ       = 0x00
@@ -26,6 +28,23 @@ class UplPacket(object):
 
     MODE_OTHERS = 0xFF
 
+    # ヘッダ = モード (1 byte) + アドレス (5 bytes) + データサイズ (2 bytes) のビッグエンディアン
+    HEADER = struct.Struct('>Q')
+    HEADER_SIZE = HEADER.size
+
+    # ペイロードを持つパケットのモード
+    __PAYLOAD_MODES = frozenset([
+        MODE_AWG_REG_READ_REPLY,
+        MODE_CAPTURE_REG_READ_REPLY,
+        MODE_WAVE_RAM_READ_REPLY,
+        MODE_AWG_REG_WRITE,
+        MODE_CAPTURE_REG_WRITE,
+        MODE_WAVE_RAM_WRITE,
+        MODE_SEQUENCER_REG_READ_REPLY,
+        MODE_SEQUENCER_REG_WRITE,
+        MODE_SEQUENCER_CMD_WRITE,
+        MODE_SEQUENCER_CMD_ERR_REPORT])
+
     def __init__(
         self,
         mode,
@@ -51,12 +70,27 @@ class UplPacket(object):
     def payload(self):
         return self.__payload
 
+    def pack_header_into(self, buf, offset = 0):
+        """このパケットのヘッダを buf の offset の位置に書き込む
+
+        | ペイロードとは別のバッファにヘッダを書くことで, ペイロードをコピーせずに
+        | socket.sendmsg([ヘッダ, ペイロード], ...) で送信できる.
+
+        Args:
+            buf (writable bytes-like object): ヘッダを書き込むバッファ
+            offset (int): ヘッダを書き込む buf 内の位置
+        """
+        if (self.__mode >> 8) or (self.__addr >> 40) or (self.__num_bytes >> 16):
+            raise OverflowError(
+                'UPL packet header field out of range.  (mode:{}, addr:{}, num_bytes:{})'
+                .format(self.__mode, self.__addr, self.__num_bytes))
+        self.HEADER.pack_into(buf, offset, (self.__mode << 56) | (self.__addr << 16) | self.__num_bytes)
+
+
     def serialize(self):
-        data = bytearray()
-        data += self.__mode.to_bytes(1, "big")
-        data += self.__addr.to_bytes(5, "big")
-        data += self.__num_bytes.to_bytes(2, "big")
-        data += self.__payload
+        data = bytearray(self.HEADER_SIZE + len(self.__payload))
+        self.pack_header_into(data)
+        data[self.HEADER_SIZE:] = self.__payload
         return data
 
     def __mode_to_str(self, mode):
@@ -88,21 +122,17 @@ class UplPacket(object):
 
     @classmethod
     def deserialize(cls, data):
-        mode = int.from_bytes(data[0:1], 'big')
-        addr = int.from_bytes(data[1:6], 'big')
-        num_bytes = int.from_bytes(data[6:8], 'big')
+        """data から UplPacket を作る
+
+        | ペイロードは data をコピーせずに参照する memoryview となる.
+        | data を再利用するバッファの場合, ペイロードはそのバッファを書き換えるまでの間だけ有効.
+        """
+        header, = cls.HEADER.unpack_from(data)
+        mode = header >> 56
+        addr = (header >> 16) & 0xFF_FFFF_FFFF
+        num_bytes = header & 0xFFFF
         payload = b''
-        if ((num_bytes != 0) and 
-            ((mode == cls.MODE_AWG_REG_READ_REPLY)       or
-             (mode == cls.MODE_CAPTURE_REG_READ_REPLY)   or
-             (mode == cls.MODE_WAVE_RAM_READ_REPLY)      or
-             (mode == cls.MODE_AWG_REG_WRITE)            or 
-             (mode == cls.MODE_CAPTURE_REG_WRITE)        or 
-             (mode == cls.MODE_WAVE_RAM_WRITE)           or
-             (mode == cls.MODE_SEQUENCER_REG_READ_REPLY) or
-             (mode == cls.MODE_SEQUENCER_REG_WRITE)      or
-             (mode == cls.MODE_SEQUENCER_CMD_WRITE)      or
-             (mode == cls.MODE_SEQUENCER_CMD_ERR_REPORT))):
-            payload = data[8 : 8 + num_bytes]
+        if (num_bytes != 0) and (mode in cls.__PAYLOAD_MODES):
+            payload = memoryview(data)[cls.HEADER_SIZE : cls.HEADER_SIZE + num_bytes]
 
         return UplPacket(mode, addr, num_bytes, payload)
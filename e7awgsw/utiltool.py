@@ -1,11 +1,19 @@
 import numpy as np
 
-try:
-    import matplotlib
-    matplotlib.use("Agg")
-    matplotlib.rcParams["agg.path.chunksize"] = 20000
-finally:
-    import matplotlib.pyplot as plt
+_plt = None
+
+def _get_pyplot():
+    """最初のグラフ出力時に matplotlib を読み込む"""
+    global _plt
+    if _plt is None:
+        try:
+            import matplotlib
+            matplotlib.use("Agg")
+            matplotlib.rcParams["agg.path.chunksize"] = 20000
+        finally:
+            import matplotlib.pyplot as plt
+        _plt = plt
+    return _plt
 
 
 def plot_graph(sampling_rate, samples, title, filepath, color = '#b44c97', marker = None):
@@ -20,6 +28,7 @@ def plot_graph(sampling_rate, samples, title, filepath, color = '#b44c97', marke
         marker (string): グラフに描画される点の種類
     """
     time = np.linspace(0, 1000000 * len(samples) / sampling_rate, len(samples), endpoint=False)
+    plt = _get_pyplot()
     plt.figure(figsize=(8, 6), dpi=300)
     plt.xlabel("Time [us]")
     plt.title(title)
@@ -41,6 +50,7 @@ def plot_samples(samples, title, filepath, color = '#b44c97', marker = None, x_l
         x_label (string): 横軸のラベル
     """
     point_no = [i for i in range(len(samples))]
+    plt = _get_pyplot()
     plt.figure(figsize=(8, 6), dpi=300)
     plt.xlabel(x_label)
     plt.title(title)
@@ -48,3 +58,62 @@ def plot_samples(samples, title, filepath, color = '#b44c97', marker = None, x_l
     plt.savefig(filepath)
     plt.close()
     return
+
+
+def save_capture_data(filepath, samples):
+    """キャプチャデータをバイナリデータとして保存する
+
+    | I/Q データを float32 の (サンプル数, 2) 配列として .npy 形式で保存する.
+    | filepath の拡張子が .npy でない場合, .npy が付加される.
+
+    Args:
+        filepath (string): 保存するファイルのパス
+        samples (list of (float, float) or numpy.ndarray):
+            | CaptureCtrl.get_capture_data で取得したキャプチャデータ.
+            | shape = (サンプル数, 2) の NumPy 配列も指定できる.
+    """
+    samples = np.asarray(samples, dtype = np.float32).reshape(-1, 2)
+    np.save(filepath, samples)
+
+
+def load_capture_data(filepath, mmap = True):
+    """save_capture_data で保存したキャプチャデータを読み込む
+
+    Args:
+        filepath (string): 読み込むファイルのパス
+        mmap (bool):
+            | True -> ファイルをメモリマップして読み込む. (読み取り専用)
+            | False -> ファイルの内容を全てメモリに読み込む.
+
+    Returns:
+        numpy.ndarray:
+            | shape = (サンプル数, 2), dtype = numpy.float32 の配列.
+            | [:, 0] に I データが格納され, [:, 1] に Q データが格納される.
+    """
+    return np.load(filepath, mmap_mode = 'r' if mmap else None)
+
+
+def create_capture_data_file(filepath, num_samples):
+    """num_samples 個のキャプチャデータを格納する .npy ファイルを作成し, ヘッダを書き込む
+
+    | 返されたファイルオブジェクトに I/Q データを float32 (リトルエンディアン) で順に書き込むと,
+    | save_capture_data で保存したものと同じ形式のファイルになる.
+    | filepath の拡張子が .npy でない場合, .npy が付加される.
+
+    Args:
+        filepath (string): 作成するファイルのパス
+        num_samples (int): ファイルに格納するサンプル数 (I と Q はまとめて 1 サンプル)
+
+    Returns:
+        file object: ヘッダの直後を指す書き込み用のファイルオブジェクト
+    """
+    if not str(filepath).endswith('.npy'):
+        filepath = str(filepath) + '.npy'
+    f = open(filepath, 'wb')
+    try:
+        np.lib.format.write_array_header_1_0(
+            f, {'descr': '<f4', 'fortran_order': False, 'shape': (num_samples, 2)})
+    except:
+        f.close()
+        raise
+    return f
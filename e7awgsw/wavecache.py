@@ -0,0 +1,160 @@
+import threading
+from collections import OrderedDict
+
+class WaveCache(object):
+    """生成済みの波形データを保持する, 合計バイト数に上限のある LRU キャッシュ
+
+    | 登録する値は呼び出し側で変更されないもの (読み取り専用の numpy.ndarray や bytes) でなければならない.
+    """
+
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024 #: デフォルトのキャッシュの最大バイト数
+
+    def __init__(self, max_bytes = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            max_bytes (int): キャッシュに保持する値の合計バイト数の上限.  0 のときキャッシュは無効になる.
+        """
+        if not (isinstance(max_bytes, int) and max_bytes >= 0):
+            raise ValueError("The 'max_bytes' must be an integer greater than or equal to zero.  ({})".format(max_bytes))
+
+        self.__entries = OrderedDict() # key -> (value, num_bytes)
+        self.__max_bytes = max_bytes
+        self.__num_bytes = 0
+        self.__num_hits = 0
+        self.__num_misses = 0
+        self.__lock = threading.RLock()
+
+    def get(self, key):
+        """key に対応する値を返す
+
+        Args:
+            key (hashable): 取得する値のキー
+
+        Returns:
+            object: key に対応する値.  キャッシュに存在しない場合は None.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__num_misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__num_hits += 1
+            return entry[0]
+
+    def put(self, key, value, num_bytes = None):
+        """key と value を対応付けて登録する
+
+        | 合計バイト数が上限を超える場合, 最も長い間使われていない値から順に破棄する.
+
+        Args:
+            key (hashable): 登録する値のキー
+            value (object): 登録する値
+            num_bytes (int):
+                | value のバイト数.
+                | None の場合, value の nbytes 属性か len(value) を使う.
+        """
+        if num_bytes is None:
+            num_bytes = self.__calc_num_bytes(value)
+
+        with self.__lock:
+            if key in self.__entries:
+                self.__num_bytes -= self.__entries.pop(key)[1]
+            if num_bytes > self.__max_bytes:
+                return
+            self.__entries[key] = (value, num_bytes)
+            self.__num_bytes += num_bytes
+            self.__evict(self.__max_bytes)
+
+    def get_or_create(self, key, factory):
+        """key に対応する値を返す.  存在しない場合は factory() で作成して登録する.
+
+        Args:
+            key (hashable): 取得する値のキー
+            factory (callable): key に対応する値を作成する関数
+
+        Returns:
+            object: key に対応する値
+        """
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """キャッシュに登録された全ての値を破棄する"""
+        with self.__lock:
+            self.__entries.clear()
+            self.__num_bytes = 0
+
+    def __evict(self, max_bytes):
+        while self.__num_bytes > max_bytes:
+            _, (_, num_bytes) = self.__entries.popitem(last = False)
+            self.__num_bytes -= num_bytes
+
+    @classmethod
+    def __calc_num_bytes(cls, value):
+        if hasattr(value, 'nbytes'):
+            return value.nbytes
+        return len(value)
+
+    @property
+    def max_bytes(self):
+        """キャッシュに保持する値の合計バイト数の上限
+
+        Returns:
+            int: キャッシュに保持する値の合計バイト数の上限
+        """
+        return self.__max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes):
+        if not (isinstance(max_bytes, int) and max_bytes >= 0):
+            raise ValueError("The 'max_bytes' must be an integer greater than or equal to zero.  ({})".format(max_bytes))
+        with self.__lock:
+            self.__max_bytes = max_bytes
+            self.__evict(max_bytes)
+
+    @property
+    def num_bytes(self):
+        """キャッシュに保持している値の合計バイト数
+
+        Returns:
+            int: キャッシュに保持している値の合計バイト数
+        """
+        return self.__num_bytes
+
+    @property
+    def num_hits(self):
+        """get で値が見つかった回数
+
+        Returns:
+            int: get で値が見つかった回数
+        """
+        return self.__num_hits
+
+    @property
+    def num_misses(self):
+        """get で値が見つからなかった回数
+
+        Returns:
+            int: get で値が見つからなかった回数
+        """
+        return self.__num_misses
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+_wave_cache = WaveCache()
+
+def get_wave_cache():
+    """ライブラリが波形の生成結果とシリアライズ結果の保持に使う WaveCache オブジェクトを取得する
+
+    | 返されるオブジェクトの max_bytes を変更することで, キャッシュの大きさを変えられる.
+
+    Returns:
+        WaveCache: ライブラリ共通の WaveCache オブジェクト
+    """
+    return _wave_cache
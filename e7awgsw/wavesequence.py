@@ -1,7 +1,9 @@
 import copy
 import struct
+import hashlib
+import numpy as np
 from .hwparam import WAVE_SAMPLE_SIZE, AWG_WORD_SIZE, NUM_SAMPLES_IN_AWG_WORD, NUM_SAMPLES_IN_WAVE_BLOCK
-from .logger import get_file_logger, get_null_logger, log_error
+from .logger import get_loggers, get_null_logger, log_error
 
 class WaveSequence(object):
     """ 波形シーケンスの情報を保持するクラス"""
@@ -13,6 +15,7 @@ class WaveSequence(object):
     MAX_CHUNKS = 16                    #: 波形シーケンスに登録可能な最大チャンク数
     NUM_SAMPLES_IN_WAVE_BLOCK = NUM_SAMPLES_IN_WAVE_BLOCK #: 1 波形ブロック当たりのサンプル数
     NUM_SAMPLES_IN_AWG_WORD = NUM_SAMPLES_IN_AWG_WORD #: 1 AWG ワード当たりのサンプル数
+    __FILE_FORMAT_VERSION = 1
 
     def __init__(self, num_wait_words, num_repeats, *, enable_lib_log = True, logger = get_null_logger()):
         """
@@ -26,9 +29,7 @@ class WaveSequence(object):
                 | False -> ライブラリの標準のログ機能を無効にする.
             logger (logging.Logger): ユーザ独自のログ出力に用いる Logger オブジェクト
         """
-        self.__loggers = [logger]
-        if enable_lib_log:
-            self.__loggers.append(get_file_logger())
+        self.__loggers = get_loggers(logger, enable_lib_log)
 
         try:
             if not (isinstance(num_wait_words, int) and 
@@ -49,18 +50,23 @@ class WaveSequence(object):
         self.__chunks = []
         self.__num_wait_words = num_wait_words
         self.__num_repeats = num_repeats
+        self.__fingerprint = None
+        self.__serialized_chunks = None # (fingerprint, 各チャンクのバイト列)
 
     def del_chunk(self, index):
         if index < len(self.__chunks):
             del self.__chunks[index]
+            self.__fingerprint = None
+            self.__serialized_chunks = None
         
     def add_chunk(self, iq_samples, num_blank_words, num_repeats):
         """波形チャンクを追加する
 
         Args:
-            iq_samples (list of (int, int)):
+            iq_samples (list of (int, int) or numpy.ndarray):
                 | 各サンプルの I データと Q データを格納したタプルのリスト.
                 | タプルの 0 番目に I データを格納して 1 番目に Q データを格納する.
+                | shape = (サンプル数, 2) の整数型の NumPy 配列も指定できる. ([:, 0] が I データ, [:, 1] が Q データ)
                 | リストの要素数は送信波形の 1 ブロックに含まれるサンプル数 (= 64) の倍数でなければならない.
                 | タプルの各要素は 2bytes で表せる整数値でなければならない. (符号付, 符号なしは問わない)
             num_blank_words (int): 
@@ -70,7 +76,13 @@ class WaveSequence(object):
             num_repeats (int): 追加する波形チャンクを繰り返す回数
         """
         try:
-            if not isinstance(iq_samples, list):
+            if isinstance(iq_samples, np.ndarray):
+                if not (iq_samples.ndim == 2 and iq_samples.shape[1] == 2 and
+                        np.issubdtype(iq_samples.dtype, np.integer)):
+                    raise ValueError(
+                        'A sample array must be an integer array of shape (N, 2).  (shape = {}, dtype = {})'
+                        .format(iq_samples.shape, iq_samples.dtype))
+            elif not isinstance(iq_samples, list):
                 raise ValueError('Invalid sample list  ({})'.format(iq_samples))
             
             if (len(self.__chunks) == self.MAX_CHUNKS):
@@ -84,18 +96,25 @@ class WaveSequence(object):
                 raise ValueError(
                     'The number of samples in a wave chunk must be a multiple of {}.'.format(NUM_SAMPLES_IN_WAVE_BLOCK))
 
-            try:
+            if isinstance(iq_samples, np.ndarray):
                 # 2 bytes で表せる数かどうかチェック
-                for iq_sample in iq_samples:
-                    if len(iq_sample) != 2:
-                        raise Exception
-                    for sample in iq_sample:
-                        if not self.__is_in_range(-32768, 0xFFFF, sample):
+                if (iq_samples.min() < -32768) or (0xFFFF < iq_samples.max()):
+                    raise ValueError(
+                        'An AWG sample value must be an integer that can be expressed in 2 bytes.  (min = {}, max = {})'
+                        .format(iq_samples.min(), iq_samples.max()))
+            else:
+                try:
+                    # 2 bytes で表せる数かどうかチェック
+                    for iq_sample in iq_samples:
+                        if len(iq_sample) != 2:
                             raise Exception
-            except:
-                raise ValueError(
-                    "An AWG sample value must be a pair of integers that can be expressed in 2 bytes.  (err val = '{}')"
-                    .format(iq_sample))
+                        for sample in iq_sample:
+                            if not self.__is_in_range(-32768, 0xFFFF, sample):
+                                raise Exception
+                except:
+                    raise ValueError(
+                        "An AWG sample value must be a pair of integers that can be expressed in 2 bytes.  (err val = '{}')"
+                        .format(iq_sample))
 
             if not (isinstance(num_blank_words, int) and 
                     (0 <= num_blank_words and num_blank_words <= self.MAX_POST_BLANK_LEN)):
@@ -113,6 +132,8 @@ class WaveSequence(object):
             raise
 
         self.__chunks.append(WaveChunk(iq_samples, num_blank_words, num_repeats))
+        self.__fingerprint = None
+        self.__serialized_chunks = None
 
     @property
     def num_chunks(self):
@@ -194,10 +215,46 @@ class WaveSequence(object):
             num_chunk_words += chunk.num_words * chunk.num_repeats
         return num_chunk_words * self.__num_repeats + self.__num_wait_words
 
+    @property
+    def fingerprint(self):
+        """この波形シーケンスの内容から計算したハッシュ値
+
+        | 波形データ, ポストブランク, 繰り返し回数, 先頭の 0 データの長さが全て同じ波形シーケンスは同じ値を持つ.
+
+        Returns:
+            string: この波形シーケンスの内容を表す 16 進数文字列
+        """
+        if self.__fingerprint is None:
+            hasher = hashlib.blake2b(digest_size = 16)
+            hasher.update(struct.pack('<QQ', self.__num_wait_words, self.__num_repeats))
+            for chunk in self.__chunks:
+                hasher.update(struct.pack(
+                    '<QQQ', chunk.num_blank_words, chunk.num_repeats, chunk.wave_data.num_samples))
+                hasher.update(chunk.wave_data.serialize())
+            self.__fingerprint = hasher.hexdigest()
+        return self.__fingerprint
+
+    def serialize_chunks(self):
+        """各チャンクの波形データを AWG に送るバイト列に変換する
+
+        | 変換結果は fingerprint と組にして保持され, 内容が同じ間は同じ tuple を返す.
+        | チャンクを追加 or 削除すると破棄される.
+
+        Returns:
+            tuple of bytes: 各チャンクの波形データのバイト列.  WaveData.serialize と同じ形式.
+        """
+        fingerprint = self.fingerprint
+        if (self.__serialized_chunks is None) or (self.__serialized_chunks[0] != fingerprint):
+            self.__serialized_chunks = (
+                fingerprint, tuple(chunk.wave_data.serialize() for chunk in self.__chunks))
+        return self.__serialized_chunks[1]
+
     def all_samples_lazy(self, include_wait_words = True):
         """この波形シーケンスに含まれる全波形サンプルを返す (繰り返しも含む)
 
         | all_samples の遅延評価版
+        | 戻り値のスライスはベクトル化された計算で取得される.
+        | 戻り値の to_array(start, stop) で, 指定した範囲のサンプルを NumPy 配列として取得できる.
 
         Args:
             *include_wait_words (bool)
@@ -209,6 +266,55 @@ class WaveSequence(object):
         """
         return self.__WaveSampleList(self, include_wait_words, *self.__loggers)
 
+    def all_sample_array(self, include_wait_words = True):
+        """この波形シーケンスに含まれる全波形サンプルを NumPy 配列として返す (繰り返しも含む)
+
+        Args:
+            *include_wait_words (bool)
+                | True  -> 戻り値の中にシーケンスの先頭の 0 データを含む
+                | False -> 戻り値の中にシーケンスの先頭の 0 データを含まない
+
+        Returns:
+            numpy.ndarray:
+                | shape = (サンプル数, 2), dtype = numpy.int16 の I/Q サンプル配列.
+                | [:, 0] に I データが格納され, [:, 1] に Q データが格納される.
+        """
+        # 1 波形シーケンス分のサンプルを作ってから, 繰り返し回数分並べる
+        seq_samples = [
+            np.tile(np.concatenate((
+                chunk.wave_data.sample_array,
+                np.zeros((chunk.num_blank_samples, 2), dtype = np.int16))), (chunk.num_repeats, 1))
+            for chunk in self.__chunks]
+        seq_samples = np.concatenate(seq_samples) if seq_samples else np.zeros((0, 2), dtype = np.int16)
+
+        num_wait_samples = self.num_wait_samples if include_wait_words else 0
+        samples = np.zeros((num_wait_samples + len(seq_samples) * self.__num_repeats, 2), dtype = np.int16)
+        samples[num_wait_samples:].reshape(self.__num_repeats, len(seq_samples), 2)[:] = seq_samples
+        return samples
+
+    def all_sample_blocks(self, block_size, include_wait_words = True):
+        """この波形シーケンスに含まれる全波形サンプルを先頭から block_size 個ずつ返すジェネレータ (繰り返しも含む)
+
+        | 全波形サンプルを一度にメモリに展開しないので, 非常に長い波形シーケンスにも使える.
+
+        Args:
+            block_size (int): 1 度に返すサンプル数.  最後のブロックのサンプル数は block_size より少ない場合がある.
+            *include_wait_words (bool)
+                | True  -> 戻り値の中にシーケンスの先頭の 0 データを含む
+                | False -> 戻り値の中にシーケンスの先頭の 0 データを含まない
+
+        Yields:
+            numpy.ndarray: shape = (block_size 以下, 2), dtype = numpy.int16 の I/Q サンプル配列.
+        """
+        if not (isinstance(block_size, int) and block_size > 0):
+            msg = "The 'block_size' must be an integer greater than zero.  ({})".format(block_size)
+            log_error(msg, *self.__loggers)
+            raise ValueError(msg)
+
+        samples = self.all_samples_lazy(include_wait_words)
+        for start in range(0, len(samples), block_size):
+            yield samples.to_array(start, start + block_size)
+
     def all_samples(self, include_wait_words = True):
         """この波形シーケンスに含まれる全波形サンプルを返す (繰り返しも含む)
 
@@ -265,6 +371,75 @@ class WaveSequence(object):
             log_error(e, *self.__loggers)
             raise
 
+    def save(self, filepath):
+        """この波形シーケンスをバイナリデータとして保存する
+
+        | 繰り返しを展開せず, 波形チャンクの構造と各チャンクの有波形部のサンプルを 1 回ずつ .npz 形式で保存する.
+        | filepath の拡張子が .npz でない場合, .npz が付加される.
+        | 保存したファイルは load で読み込める.
+
+        Args:
+            filepath (string): 保存するファイルのパス
+        """
+        try:
+            chunk_samples = [chunk.wave_data.sample_array for chunk in self.__chunks]
+            np.savez(
+                filepath,
+                version = np.uint32(self.__FILE_FORMAT_VERSION),
+                num_wait_words = np.uint64(self.__num_wait_words),
+                num_repeats = np.uint64(self.__num_repeats),
+                chunk_num_blank_words = np.array(
+                    [chunk.num_blank_words for chunk in self.__chunks], dtype = np.uint64),
+                chunk_num_repeats = np.array(
+                    [chunk.num_repeats for chunk in self.__chunks], dtype = np.uint64),
+                chunk_num_samples = np.array(
+                    [chunk.wave_data.num_samples for chunk in self.__chunks], dtype = np.uint64),
+                samples = np.concatenate(chunk_samples) if chunk_samples else np.zeros((0, 2), dtype = np.int16))
+        except Exception as e:
+            log_error(e, *self.__loggers)
+            raise
+
+    @classmethod
+    def load(cls, filepath, *, enable_lib_log = True, logger = get_null_logger()):
+        """save で保存した波形シーケンスを読み込む
+
+        | 波形サンプルの値は 2 の補数表現の符号付き整数として読み込まれる.
+
+        Args:
+            filepath (string): 読み込むファイルのパス
+            enable_lib_log (bool):
+                | True -> ライブラリの標準のログ機能を有効にする.
+                | False -> ライブラリの標準のログ機能を無効にする.
+            logger (logging.Logger): ユーザ独自のログ出力に用いる Logger オブジェクト
+
+        Returns:
+            WaveSequence: 読み込んだ波形シーケンス
+        """
+        loggers = get_loggers(logger, enable_lib_log)
+
+        try:
+            with np.load(filepath) as data:
+                version = int(data['version'])
+                if version != cls.__FILE_FORMAT_VERSION:
+                    raise ValueError('Unsupported wave sequence file version.  ({})'.format(version))
+                wave_seq = WaveSequence(
+                    int(data['num_wait_words']),
+                    int(data['num_repeats']),
+                    enable_lib_log = enable_lib_log,
+                    logger = logger)
+                samples = data['samples']
+                offset = 0
+                for num_blank_words, num_repeats, num_samples in zip(
+                    data['chunk_num_blank_words'].tolist(),
+                    data['chunk_num_repeats'].tolist(),
+                    data['chunk_num_samples'].tolist()):
+                    wave_seq.add_chunk(samples[offset : offset + num_samples], num_blank_words, num_repeats)
+                    offset += num_samples
+            return wave_seq
+        except Exception as e:
+            log_error(e, *loggers)
+            raise
+
     def __str__(self):
         ret = ('num wait words : {}\n'.format(self.__num_wait_words) +
                'num sequence repeats : {}\n'.format(self.__num_repeats) +
@@ -285,6 +460,11 @@ class WaveSequence(object):
 
     class __WaveSampleList(object):
 
+        #: for 文で取り出す際に, 1 度に計算するサンプル数
+        ITER_BLOCK_SIZE = 65536
+        #: 1 波形シーケンス分のサンプルを展開して保持する場合の最大サンプル数
+        MAX_SEQ_SAMPLES_TO_EXPAND = 4 * 1024 * 1024
+
         def __init__(self, wave_seq, include_wait_words, *loggers):
             self.__chunks = wave_seq.chunk_list
             if include_wait_words:
@@ -299,6 +479,18 @@ class WaveSequence(object):
             # 1 波形シーケンス当たりのサンプル数
             self.__num_samples_in_seq = (self.__len - self.__num_wait_samples) // wave_seq.num_repeats
             self.__loggers = loggers
+
+            # ベクトル化されたサンプルの取得に使う各チャンクの情報
+            self.__chunk_starts = np.array(
+                [start for start, _ in self.__chunk_range_list], dtype = np.int64)
+            self.__chunk_num_samples = np.array(
+                [chunk.num_samples for chunk in self.__chunks], dtype = np.int64)
+            self.__chunk_num_wave_samples = np.array(
+                [chunk.wave_data.num_samples for chunk in self.__chunks], dtype = np.int64)
+            self.__wave_offsets = np.concatenate(
+                ([0], np.cumsum(self.__chunk_num_wave_samples)[:-1])).astype(np.int64)
+            self.__waves = None
+            self.__seq_samples = None
         
         def __gen_chunk_range_list(self, chunks):
             chunk_range_list = []
@@ -322,7 +514,9 @@ class WaveSequence(object):
             return '[' + ', '.join(items) + ']'
 
         def __iter__(self):
-            return self.WaveIter(self)
+            for start in range(0, self.__len, self.ITER_BLOCK_SIZE):
+                end = min(start + self.ITER_BLOCK_SIZE, self.__len)
+                yield from map(tuple, self.__gather_range(start, end).tolist())
 
         def __getitem__(self, key):
             if isinstance(key, int):
@@ -344,12 +538,99 @@ class WaveSequence(object):
                     return (0, 0)
 
             elif isinstance(key, slice):
-                return [self[i] for i in range(*key.indices(self.__len))]
+                start, stop, step = key.indices(self.__len)
+                if step == 1:
+                    return list(map(tuple, self.__gather_range(start, stop).tolist()))
+                indices = np.arange(start, stop, step, dtype = np.int64)
+                return list(map(tuple, self.__gather(indices).tolist()))
             else:
                 msg = 'Invalid argument type.'
                 log_error(msg, *self.__loggers)
                 raise TypeError(msg)
 
+        def to_array(self, start = None, stop = None):
+            """[start, stop) の範囲のサンプルを NumPy 配列として返す
+
+            Args:
+                start (int): 取得するサンプルの先頭のインデックス.  None の場合は 0.
+                stop (int): 取得するサンプルの末尾の次のインデックス.  None の場合は全サンプル数.
+
+            Returns:
+                numpy.ndarray: shape = (サンプル数, 2), dtype = numpy.int16 の I/Q サンプル配列.
+            """
+            start, stop, _ = slice(start, stop).indices(self.__len)
+            return self.__gather_range(start, stop).astype(np.int16)
+
+        def __gather_range(self, start, stop):
+            """[start, stop) の範囲のサンプルをまとめて取得する"""
+            stop = max(start, stop)
+            seq_len = self.__num_samples_in_seq
+            if (seq_len == 0) or (seq_len > self.MAX_SEQ_SAMPLES_TO_EXPAND):
+                return self.__gather(np.arange(start, stop, dtype = np.int64))
+
+            # 先頭の 0 データに続けて, 展開済みの 1 波形シーケンス分のサンプルを周期的に並べる
+            samples = np.zeros((stop - start, 2), dtype = np.int64)
+            seq_samples = self.__get_seq_samples()
+            pos = max(start, self.__num_wait_samples)
+            if pos >= stop:
+                return samples
+
+            # 波形シーケンスの途中から始まる部分
+            offset = (pos - self.__num_wait_samples) % seq_len
+            size = min(seq_len - offset, stop - pos)
+            samples[pos - start : pos - start + size] = seq_samples[offset : offset + size]
+            pos += size
+            # 波形シーケンス全体が収まる部分
+            num_seqs = (stop - pos) // seq_len
+            if num_seqs > 0:
+                samples[pos - start : pos - start + num_seqs * seq_len].reshape(num_seqs, seq_len, 2)[:] = seq_samples
+                pos += num_seqs * seq_len
+            # 波形シーケンスの途中で終わる部分
+            samples[pos - start : stop - start] = seq_samples[0 : stop - pos]
+            return samples
+
+        def __gather(self, indices):
+            """indices で指定したサンプルをまとめて取得する.  値は波形チャンクに登録されたものをそのまま返す."""
+            samples = np.zeros((len(indices), 2), dtype = np.int64)
+            if self.__num_samples_in_seq == 0:
+                return samples
+
+            in_seq = indices >= self.__num_wait_samples
+            seq_idx = (indices[in_seq] - self.__num_wait_samples) % self.__num_samples_in_seq
+            if self.__num_samples_in_seq <= self.MAX_SEQ_SAMPLES_TO_EXPAND:
+                samples[in_seq] = self.__get_seq_samples()[seq_idx]
+                return samples
+
+            chunk_idx = np.searchsorted(self.__chunk_starts, seq_idx, side = 'right') - 1
+            pos = (seq_idx - self.__chunk_starts[chunk_idx]) % self.__chunk_num_samples[chunk_idx]
+            in_wave = pos < self.__chunk_num_wave_samples[chunk_idx]
+            wave_idx = self.__wave_offsets[chunk_idx[in_wave]] + pos[in_wave]
+            seq_samples = np.zeros((len(seq_idx), 2), dtype = np.int64)
+            seq_samples[in_wave] = self.__get_waves()[wave_idx]
+            samples[in_seq] = seq_samples
+            return samples
+
+        def __get_seq_samples(self):
+            """1 波形シーケンス分のサンプルを展開した配列"""
+            if self.__seq_samples is None:
+                waves = self.__get_waves().astype(np.int32)
+                seq_samples = []
+                for i, chunk in enumerate(self.__chunks):
+                    offset = self.__wave_offsets[i]
+                    chunk_samples = np.zeros((chunk.num_samples, 2), dtype = np.int32)
+                    chunk_samples[:chunk.wave_data.num_samples] = \
+                        waves[offset : offset + chunk.wave_data.num_samples]
+                    seq_samples.append(np.tile(chunk_samples, (chunk.num_repeats, 1)))
+                self.__seq_samples = np.concatenate(seq_samples)
+            return self.__seq_samples
+
+        def __get_waves(self):
+            """全波形チャンクの有波形部を連結した配列"""
+            if self.__waves is None:
+                self.__waves = np.concatenate(
+                    [chunk.wave_data._registered_sample_array() for chunk in self.__chunks])
+            return self.__waves
+
         def __find_chunk(self, idx):
             first = 0
             last = len(self.__chunk_range_list) - 1
@@ -366,19 +647,6 @@ class WaveSequence(object):
         def __len__(self):
             return self.__len
 
-        class WaveIter(object):
-
-            def __init__(self, outer):
-                self._i = 0
-                self.__outer = outer
-
-            def __next__(self):
-                if self._i == len(self.__outer):
-                    raise StopIteration()
-                val = self.__outer[self._i]
-                self._i += 1
-                return val
-
 
 class WaveChunk(object):
     """波形チャンクの情報を保持するクラス"""
@@ -473,8 +741,16 @@ class WaveData(object):
     """波形のサンプルデータを保持するクラス"""
 
     def __init__(self, samples, wave_sample_size):
-        self.__samples = copy.copy(samples)
+        if isinstance(samples, np.ndarray):
+            # 2 の補数表現の int16 配列として保持する.  外部から書き換えられないように読み取り専用にする.
+            self.__samples = samples.astype(np.int16)
+            self.__samples.flags.writeable = False
+            self.__sample_array = self.__samples
+        else:
+            self.__samples = copy.copy(samples)
+            self.__sample_array = None
         self.__wave_sample_size = wave_sample_size
+        self.__serialized = None
 
     @property
     def samples(self):
@@ -483,14 +759,42 @@ class WaveData(object):
         Returns:
             list of int: 波形データのサンプルリスト
         """
+        if isinstance(self.__samples, np.ndarray):
+            return list(map(tuple, self.__samples.tolist()))
         return copy.copy(self.__samples)
 
+    @property
+    def sample_array(self):
+        """波形データのサンプル配列
+
+        Returns:
+            numpy.ndarray:
+                | shape = (サンプル数, 2), dtype = numpy.int16 の読み取り専用の I/Q サンプル配列.
+                | [:, 0] に I データが格納され, [:, 1] に Q データが格納される.
+        """
+        if self.__sample_array is None:
+            sample_array = np.array(self.__samples, dtype = np.int64).reshape(-1, 2).astype(np.int16)
+            sample_array.flags.writeable = False
+            self.__sample_array = sample_array
+        return self.__sample_array
+
+    def _registered_sample_array(self):
+        """登録されたサンプル値をそのまま格納した shape = (サンプル数, 2) の配列を返す
+
+        | sample_array と異なり, 0x8000 ~ 0xFFFF の値を負の値に変換しない.
+        """
+        if isinstance(self.__samples, np.ndarray):
+            return self.__samples
+        return np.array(self.__samples, dtype = np.int64).reshape(-1, 2)
+
     def sample(self, idx):
         """引数で指定したサンプルを返す
         
         Rturns:
             (int, int): サンプル値のタプル (I データ, Q データ)
         """
+        if isinstance(self.__samples, np.ndarray):
+            return tuple(self.__samples[idx].tolist())
         return self.__samples[idx]
 
     @property
@@ -512,13 +816,16 @@ class WaveData(object):
         return len(self.__samples) * self.__wave_sample_size
 
     def serialize(self):
-        payload = bytearray()
-        for i_data, q_data in self.__samples:
-            i_data = i_data & ((1 << (self.__wave_sample_size // 2 * 8)) - 1)
-            q_data = q_data & ((1 << (self.__wave_sample_size // 2 * 8)) - 1)
-            payload += struct.pack('<H', i_data)
-            payload += struct.pack('<H', q_data)
-        return payload
+        """波形データを AWG に送るバイト列に変換する
+
+        | 変換結果は保持され, 2 回目以降は同じ bytes オブジェクトを返す.
+
+        Returns:
+            bytes: 各サンプルの I データと Q データをリトルエンディアンの 2 bytes ずつで表したバイト列
+        """
+        if self.__serialized is None:
+            self.__serialized = self.sample_array.astype('<i2', copy = False).tobytes()
+        return self.__serialized
 
     @classmethod
     def deserialize(cls, data, wave_sample_size):
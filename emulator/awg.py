@@ -1,8 +1,10 @@
 import sys
+import time
 import threading
 import pathlib
-import struct
 from enum import IntEnum
+import numpy as np
+from timing import WORD_PERIOD
 
 lib_path = str(pathlib.Path(__file__).resolve().parents[1])
 sys.path.append(lib_path)
@@ -18,10 +20,21 @@ class Awg:
     __NUM_PARAM_REGS = 256
     __MAX_PARAM_REG_ADDR = __NUM_PARAM_REGS * PARAM_REG_SIZE
 
-    def __init__(self, id, mem_reader):
+    def __init__(self, id, mem_reader, *, emulate_timing = False):
+        """
+        Args:
+            id (AWG): AWG の ID
+            mem_reader (callable): 波形 RAM からデータを読み出す関数
+            emulate_timing (bool):
+                | True の場合, 波形シーケンスの出力にかかる時間が経つまで AWG を busy 状態に保つ.
+                | False の場合, 波形を生成し終えるとすぐに complete 状態にする.
+        """
         self.__state = AwgState.IDLE
         self.__state_lock = threading.RLock()
-        self.__param_regs = [0] * self.__NUM_PARAM_REGS
+        self.__emulate_timing = emulate_timing
+        # 波形シーケンスの出力が完了する時刻.  emulate_timing が True の場合のみ使用する.
+        self.__complete_time = None
+        self.__param_regs = np.zeros(self.__NUM_PARAM_REGS, dtype = np.uint32)
         self.__mem_reader = mem_reader
         self.__id = id
         self.__loggers = [get_file_logger(), get_stderr_logger()]
@@ -35,6 +48,7 @@ class Awg:
         """AWG をリセット状態にする"""
         with self.__state_lock:
             self.__state = AwgState.RESET
+            self.__complete_time = None
 
 
     def diassert_reset(self):
@@ -46,6 +60,7 @@ class Awg:
 
     def preload(self):
         """AWG の波形出力準備を行う"""
+        self.__update_state()
         with self.__state_lock:
             if (self.__state == AwgState.IDLE) or (self.__state == AwgState.COMPLETE):
                 self.__state = AwgState.READY
@@ -56,10 +71,12 @@ class Awg:
         with self.__state_lock:
             if (self.__state == AwgState.READY) or (self.__state == AwgState.GEN_WAVE):
                 self.__state = AwgState.COMPLETE
+                self.__complete_time = None
 
 
     def setToIdle(self):
         """AWG が complete 状態のとき IDLE 状態にする"""
+        self.__update_state()
         with self.__state_lock:
             if (self.__state == AwgState.COMPLETE):
                 self.__state = AwgState.IDLE
@@ -67,55 +84,72 @@ class Awg:
 
     def generate_wave(self):
         """波形を生成する"""
+        self.__update_state()
         with self.__state_lock:
             if self.__state != AwgState.READY:
                 return (False, [])
             self.__state = AwgState.GEN_WAVE
+        start_time = time.perf_counter()
 
         num_wait_words = self.get_param(WaveParamRegs.Offset.NUM_WAIT_WORDS)
         num_repeats = self.get_param(WaveParamRegs.Offset.NUM_REPEATS)
         num_chunks = self.get_param(WaveParamRegs.Offset.NUM_CHUNKS)
-        wave_seq = WaveSequence(num_wait_words, num_repeats, logger = self.__loggers[1])
+        chunks = []
         for chunk_no in range(num_chunks):
             base_addr = WaveParamRegs.Offset.chunk(chunk_no)
             num_balnk_words = self.get_param(base_addr + WaveParamRegs.Offset.NUM_BLANK_WORDS)
-            num_repeats = self.get_param(base_addr + WaveParamRegs.Offset.NUM_CHUNK_REPEATS)
+            num_chunk_repeats = self.get_param(base_addr + WaveParamRegs.Offset.NUM_CHUNK_REPEATS)
             chunk_addr = self.get_param(base_addr + WaveParamRegs.Offset.CHUNK_START_ADDR) << 4
             num_wave_words = self.get_param(base_addr + WaveParamRegs.Offset.NUM_WAVE_PART_WORDS)
             chunk_data = self.__read_chunk(chunk_addr, num_wave_words)
-            wave_seq.add_chunk(chunk_data, num_balnk_words, num_repeats)
-        wave = wave_seq.all_samples_lazy(True)
+            chunks.append(
+                (chunk_data, num_balnk_words * WaveSequence.NUM_SAMPLES_IN_AWG_WORD, num_chunk_repeats))
+        wave = AwgWave(num_wait_words * WaveSequence.NUM_SAMPLES_IN_AWG_WORD, num_repeats, chunks)
 
         with self.__state_lock:
             if self.__state == AwgState.GEN_WAVE:
-                self.__state = AwgState.COMPLETE
+                if self.__emulate_timing:
+                    self.__complete_time = \
+                        start_time + len(wave) / WaveSequence.NUM_SAMPLES_IN_AWG_WORD * WORD_PERIOD
+                else:
+                    self.__state = AwgState.COMPLETE
                 return (True, wave)
         
         return (False, [])
 
 
+    def __update_state(self):
+        """波形シーケンスの出力が完了する時刻を過ぎていれば complete 状態にする"""
+        if self.__complete_time is None:
+            return
+        with self.__state_lock:
+            if (self.__complete_time is not None) and (self.__complete_time <= time.perf_counter()):
+                if self.__state == AwgState.GEN_WAVE:
+                    self.__state = AwgState.COMPLETE
+                self.__complete_time = None
+
+
     def __read_chunk(self, addr, num_words):
         rd_size = num_words * WaveSequence.NUM_SAMPLES_IN_AWG_WORD * WAVE_SAMPLE_SIZE
         rd_data = self.__mem_reader(addr, rd_size)
-        half_sample_size = WAVE_SAMPLE_SIZE // 2
-        num_samples = len(rd_data) // half_sample_size
-        samples = [rd_data[i * half_sample_size : (i + 1) * half_sample_size] for i in range(num_samples)]
-        samples = [struct.unpack('<h', sample)[0] for sample in samples]
-        return list(zip(samples[0::2], samples[1::2]))
+        return np.frombuffer(rd_data, dtype = '<i2').reshape(-1, 2)
 
 
     def is_ready(self):
         """AWG が ready 状態かどうか調べる"""
+        self.__update_state()
         return self.__state == AwgState.READY
 
 
     def is_complete(self):
         """AWG が complete 状態かどうか調べる"""
+        self.__update_state()
         return self.__state == AwgState.COMPLETE
 
 
     def is_busy(self):
         """AWG が busy 状態かどうか調べる"""
+        self.__update_state()
         state = self.__state
         return (state == AwgState.GEN_WAVE) or (state == AwgState.READY)
 
@@ -176,7 +210,51 @@ class Awg:
             raise
         
         reg_idx = addr // self.PARAM_REG_SIZE
-        return self.__param_regs[reg_idx]
+        return int(self.__param_regs[reg_idx])
+
+
+    def set_params(self, addr, data):
+        """連続する波形パラメータレジスタにまとめて値を設定する
+
+        Args:
+            addr (int): 先頭のパラメータレジスタのアドレス
+            data (bytes-like): 設定値.  各レジスタの値を 4 bytes ずつリトルエンディアンで並べたもの.
+        """
+        self.__check_param_range(addr, len(data))
+        vals = np.frombuffer(data, dtype = '<u4')
+        reg_idx = addr // self.PARAM_REG_SIZE
+        self.__param_regs[reg_idx : reg_idx + vals.size] = vals
+
+
+    def get_params(self, addr, num_regs):
+        """連続する波形パラメータレジスタの値をまとめて取得する
+
+        Args:
+            addr (int): 先頭のパラメータレジスタのアドレス
+            num_regs (int): 取得するレジスタの数
+
+        Returns:
+            bytes: 各レジスタの値を 4 bytes ずつリトルエンディアンで並べたもの
+        """
+        self.__check_param_range(addr, num_regs * self.PARAM_REG_SIZE)
+        reg_idx = addr // self.PARAM_REG_SIZE
+        return self.__param_regs[reg_idx : reg_idx + num_regs].astype('<u4', copy = False).tobytes()
+
+
+    def __check_param_range(self, addr, num_bytes):
+        try:
+            if (addr % self.PARAM_REG_SIZE != 0) or (num_bytes % self.PARAM_REG_SIZE != 0):
+                raise ValueError(
+                    ('AWG parameter register address and access size must be multiples of {}.  ({}, {} bytes, AWG_{})'
+                    .format(self.PARAM_REG_SIZE, addr, num_bytes, self.__id)))
+
+            if (addr < 0) or (self.__NUM_PARAM_REGS * self.PARAM_REG_SIZE < addr + num_bytes):
+                raise ValueError(
+                    ('AWG parameter registers to access must be between 0x0 and 0x{:x}.  ({}, {} bytes, AWG_{})'
+                    .format(self.__NUM_PARAM_REGS * self.PARAM_REG_SIZE - 1, addr, num_bytes, self.__id)))
+        except Exception as e:
+            log_error(e, *self.__loggers)
+            raise
 
 
     def __set_default_params(self):
@@ -189,6 +267,85 @@ class Awg:
 
 
 
+class AwgWave(object):
+    """AWG が出力した波形
+
+    | 先頭の 0 データに続いて, 1 波形シーケンス分のサンプルが繰り返し並ぶ.
+    | スライスで取り出した範囲のサンプルを, shape = (サンプル数, 2), dtype = numpy.int16 の配列として返す.
+    | 全サンプルを展開せずに, 取り出した範囲のサンプルだけを計算する.
+    """
+
+    # 1 波形シーケンス分のサンプルを展開して保持する場合の最大サンプル数
+    MAX_SEQ_SAMPLES_TO_EXPAND = 4 * 1024 * 1024
+
+    def __init__(self, num_wait_samples, num_repeats, chunks):
+        """
+        Args:
+            num_wait_samples (int): 先頭の 0 データのサンプル数
+            num_repeats (int): 波形シーケンスの繰り返し回数
+            chunks (list of (numpy.ndarray, int, int)):
+                | 各チャンクの (有波形部のサンプル配列, ポストブランクのサンプル数, 繰り返し回数) のリスト.
+                | サンプル配列は shape = (サンプル数, 2), dtype = numpy.int16 とする.
+        """
+        # 1 サンプルも出力しないチャンクは除く
+        chunks = [(wave, num_blank_samples, num_chunk_repeats)
+                  for wave, num_blank_samples, num_chunk_repeats in chunks
+                  if (len(wave) + num_blank_samples) * num_chunk_repeats > 0]
+        chunk_num_wave_samples = np.array([len(chunk[0]) for chunk in chunks], dtype = np.int64)
+        chunk_num_samples = np.array([len(chunk[0]) + chunk[1] for chunk in chunks], dtype = np.int64)
+        chunk_num_repeats = np.array([chunk[2] for chunk in chunks], dtype = np.int64)
+        chunk_lens = chunk_num_samples * chunk_num_repeats
+
+        self.__num_wait_samples = num_wait_samples
+        self.__seq_len = int(chunk_lens.sum())
+        self.__len = num_wait_samples + self.__seq_len * num_repeats
+        self.__chunk_starts = np.concatenate(([0], np.cumsum(chunk_lens)[:-1])).astype(np.int64)
+        self.__chunk_num_samples = chunk_num_samples
+        self.__chunk_num_wave_samples = chunk_num_wave_samples
+        self.__wave_offsets = np.concatenate(([0], np.cumsum(chunk_num_wave_samples)[:-1])).astype(np.int64)
+        self.__waves = np.concatenate(
+            [chunk[0] for chunk in chunks] + [np.zeros((0, 2), dtype = np.int16)]).astype(np.int16, copy = False)
+
+        self.__seq_samples = None
+        if 0 < self.__seq_len <= self.MAX_SEQ_SAMPLES_TO_EXPAND:
+            self.__seq_samples = np.concatenate([
+                np.tile(
+                    np.concatenate((wave, np.zeros((num_blank_samples, 2), dtype = np.int16))),
+                    (num_chunk_repeats, 1))
+                for wave, num_blank_samples, num_chunk_repeats in chunks])
+
+
+    def __len__(self):
+        return self.__len
+
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('AwgWave only supports slicing.  ({})'.format(key))
+        return self.__gather(np.arange(*key.indices(self.__len), dtype = np.int64))
+
+
+    def __gather(self, indices):
+        """indices で指定したサンプルをまとめて取得する"""
+        samples = np.zeros((len(indices), 2), dtype = np.int16)
+        if self.__seq_len == 0:
+            return samples
+
+        in_seq = indices >= self.__num_wait_samples
+        seq_idx = (indices[in_seq] - self.__num_wait_samples) % self.__seq_len
+        if self.__seq_samples is not None:
+            samples[in_seq] = self.__seq_samples[seq_idx]
+            return samples
+
+        chunk_idx = np.searchsorted(self.__chunk_starts, seq_idx, side = 'right') - 1
+        pos = (seq_idx - self.__chunk_starts[chunk_idx]) % self.__chunk_num_samples[chunk_idx]
+        in_wave = pos < self.__chunk_num_wave_samples[chunk_idx]
+        seq_samples = np.zeros((len(seq_idx), 2), dtype = np.int16)
+        seq_samples[in_wave] = self.__waves[self.__wave_offsets[chunk_idx[in_wave]] + pos[in_wave]]
+        samples[in_seq] = seq_samples
+        return samples
+
+
 class AwgState(IntEnum):
     RESET = 0
     IDLE  = 1
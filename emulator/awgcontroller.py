@@ -1,4 +1,5 @@
 import sys
+import bisect
 import pathlib
 import awg
 from register import RwRegister, RoRegister
@@ -14,6 +15,10 @@ class AwgController(object):
     __NUM_REG_BITS = 32
     __awg_to_param_base_addr = { awg_id : WaveParamRegs.Addr.awg(awg_id) for awg_id in AWG.all() }
     __awg_to_ctrl_reg_base_addr = { awg_id : AwgCtrlRegs.Addr.awg(awg_id) for awg_id in AWG.all() }
+    __REG_SIZE = 4 # bytes
+    # 波形パラメータのアドレスから AWG を引くための, ベースアドレス順に並べた AWG とそのベースアドレスのリスト
+    __param_awg_id_list = sorted(AWG.all(), key = WaveParamRegs.Addr.awg)
+    __param_base_addr_list = [WaveParamRegs.Addr.awg(awg_id) for awg_id in __param_awg_id_list]
 
     def __init__(self):
         self.__awgs = {}
@@ -84,6 +89,46 @@ class AwgController(object):
         raise ValueError(msg)
 
 
+    def write_regs(self, addr, data):
+        """addr から連続するレジスタにまとめて値を書き込む
+
+        Args:
+            addr (int): 先頭のレジスタのアドレス
+            data (bytes-like): 書き込む値.  各レジスタの値を 4 bytes ずつリトルエンディアンで並べたもの.
+        """
+        data = memoryview(data)
+        for awg_id, start, end in self.__split_by_param_region(addr, len(data)):
+            chunk = data[start - addr : end - addr]
+            if awg_id is None:
+                # パラメータ以外のレジスタは書き込み時の動作があるので 1 つずつ書き込む
+                for reg_addr in range(start, end, self.__REG_SIZE):
+                    pos = reg_addr - start
+                    self.write_reg(reg_addr, int.from_bytes(chunk[pos : pos + self.__REG_SIZE], 'little'))
+            elif awg_id in self.__awgs:
+                self.__awgs[awg_id].set_params(start - self.__awg_to_param_base_addr[awg_id], chunk)
+
+
+    def read_regs(self, addr, num_bytes):
+        """addr から連続するレジスタの値をまとめて読み出す
+
+        Args:
+            addr (int): 先頭のレジスタのアドレス
+            num_bytes (int): 読み出すバイト数
+
+        Returns:
+            bytearray: 各レジスタの値を 4 bytes ずつリトルエンディアンで並べたもの
+        """
+        rd_data = bytearray()
+        for awg_id, start, end in self.__split_by_param_region(addr, num_bytes):
+            if (awg_id is not None) and (awg_id in self.__awgs):
+                rd_data += self.__awgs[awg_id].get_params(
+                    start - self.__awg_to_param_base_addr[awg_id], (end - start) // self.__REG_SIZE)
+            else:
+                for reg_addr in range(start, end, self.__REG_SIZE):
+                    rd_data += self.read_reg(reg_addr).to_bytes(self.__REG_SIZE, 'little')
+        return rd_data
+
+
     def add_on_wave_generated(self, action):
         """AWG が波形を出力した際のイベントハンドラを登録する"""
         self.__actions_on_wave_generated.append(action)
@@ -261,13 +306,11 @@ class AwgController(object):
 
     def __write_wave_param(self, addr, val):
         """波形パラメータ書き込み"""
-        awg_id_list = reversed(AWG.all())
-        for awg_id in awg_id_list:
-            param_base_addr = self.__awg_to_param_base_addr[awg_id]
-            if addr >= param_base_addr:
-                if awg_id in self.__awgs:
-                    self.__awgs[awg_id].set_param(addr - param_base_addr, val)
-                return True
+        awg_id = self.__find_awg_by_param_addr(addr)
+        if awg_id is not None:
+            if awg_id in self.__awgs:
+                self.__awgs[awg_id].set_param(addr - self.__awg_to_param_base_addr[awg_id], val)
+            return True
 
 
     def __write_ctrl_reg(self, addr, val):
@@ -280,12 +323,33 @@ class AwgController(object):
 
     def __read_wave_param(self, addr):
         """波形パラメータ読み出し"""
-        awg_id_list = reversed(AWG.all())
-        for awg_id in awg_id_list:
-            param_base_addr = self.__awg_to_param_base_addr[awg_id]
-            if addr >= param_base_addr:
-                if awg_id in self.__awgs:
-                    return self.__awgs[awg_id].get_param(addr - param_base_addr)
+        awg_id = self.__find_awg_by_param_addr(addr)
+        if (awg_id is not None) and (awg_id in self.__awgs):
+            return self.__awgs[awg_id].get_param(addr - self.__awg_to_param_base_addr[awg_id])
+
+
+    def __find_awg_by_param_addr(self, addr):
+        """addr を含む波形パラメータ領域の AWG ID を返す.  addr が波形パラメータ領域に含まれない場合は None."""
+        idx = bisect.bisect_right(self.__param_base_addr_list, addr) - 1
+        return self.__param_awg_id_list[idx] if idx >= 0 else None
+
+
+    def __split_by_param_region(self, addr, num_bytes):
+        """[addr, addr + num_bytes) の範囲を AWG ごとの波形パラメータ領域とそれ以外に分割する
+
+        Returns:
+            list of (AWG or None, int, int):
+                | 分割した範囲を持つ AWG の ID (パラメータ以外のレジスタの範囲は None) と, その範囲の先頭と末尾 + 1 のアドレス
+        """
+        end = addr + num_bytes
+        regions = []
+        while addr < end:
+            idx = bisect.bisect_right(self.__param_base_addr_list, addr)
+            region_end = self.__param_base_addr_list[idx] if idx < len(self.__param_base_addr_list) else end
+            region_end = min(region_end, end)
+            regions.append((self.__param_awg_id_list[idx - 1] if idx > 0 else None, addr, region_end))
+            addr = region_end
+        return regions
 
 
     def __read_ctrl_reg(self, addr):
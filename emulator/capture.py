@@ -1,8 +1,8 @@
 import sys
+import time
 import threading
 import pathlib
-import struct
-import dspmodule
+from timing import WORD_PERIOD
 from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
 import numpy as np
@@ -12,6 +12,7 @@ sys.path.append(lib_path)
 from e7awgsw import DspUnit, DecisionFunc, CaptureCtrl, WaveSequence, CaptureParam
 from e7awgsw.memorymap import CaptureParamRegs
 from e7awgsw.hwparam import MAX_INTEG_VEC_ELEMS
+from e7awgsw.dspmodel import dsp
 from e7awgsw.logger import get_file_logger, get_stderr_logger, log_error, log_warning
 
 
@@ -23,10 +24,24 @@ class CaptureUnit(object):
     # シミュレータが受付可能なキャプチャ区間の最大サンプル数.  保存可能なサンプル数ではない点に注意.
     __MAX_SAMPLES_IN_CAPTURE_SECTION = 32 * 1024 * 1024 + 4 
 
-    def __init__(self, id, mem_writer, capture_start_delay):
+    def __init__(self, id, mem_writer, capture_start_delay, *, emulate_timing = False):
+        """
+        Args:
+            id (CaptureUnit): キャプチャユニットの ID
+            mem_writer (callable): キャプチャ RAM にデータを書き込む関数
+            capture_start_delay (int): キャプチャスタートからキャプチャディレイをカウントし始めるまでの準備時間 (単位 : ワード)
+            emulate_timing (bool):
+                | True の場合, キャプチャスタートから最後のサンプルを取得するまでの時間が経つまでキャプチャユニットを busy 状態に保つ.
+                | False の場合, キャプチャデータを保存し終えるとすぐに complete 状態にする.
+        """
         self.__state = CaptureUnitState.IDLE
         self.__state_lock = threading.RLock()
-        self.__param_regs = [0] * self.__NUM_PARAM_REGS
+        self.__emulate_timing = emulate_timing
+        # キャプチャが完了する時刻.  emulate_timing が True の場合のみ使用する.
+        self.__complete_time = None
+        self.__param_regs = np.zeros(self.__NUM_PARAM_REGS, dtype = np.uint32)
+        # パラメータレジスタから作成した CaptureParam.  キャプチャパラメータが変わるまで使い回す.
+        self.__capture_param = None
         self.__mem_writer = mem_writer
         self.__capture_start_delay = capture_start_delay # キャプチャスタートからキャプチャディレイをカウントし始めるまでの準備時間 (単位 : ワード)
         self.__id = id
@@ -43,6 +58,7 @@ class CaptureUnit(object):
         """キャプチャユニットをリセット状態にする"""
         with self.__state_lock:
             self.__state = CaptureUnitState.RESET
+            self.__complete_time = None
 
 
     def diassert_reset(self):
@@ -57,10 +73,12 @@ class CaptureUnit(object):
         with self.__state_lock:
             if self.__state == CaptureUnitState.CAPTURE_WAVE:
                 self.__state = CaptureUnitState.COMPLETE
+                self.__complete_time = None
 
 
     def setToIdle(self):
         """キャプチャユニット が complete 状態のとき IDLE 状態にする"""
+        self.__update_state()
         with self.__state_lock:
             if (self.__state == CaptureUnitState.COMPLETE):
                 self.__state = CaptureUnitState.IDLE
@@ -68,24 +86,26 @@ class CaptureUnit(object):
 
     def capture_wave(self, wave_data, *, is_async = False):
         """波形をキャプチャする"""
+        self.__update_state()
         with self.__state_lock:
             if (self.__state != CaptureUnitState.IDLE) and (self.__state != CaptureUnitState.COMPLETE):
                 return
             self.__state = CaptureUnitState.CAPTURE_WAVE
-        
+        start_time = time.perf_counter()
+
         if is_async:
-            self.__executor.submit(self.__capture_wave, wave_data)
+            self.__executor.submit(self.__capture_wave, wave_data, start_time)
         else:
-            self.__capture_wave(wave_data)
+            self.__capture_wave(wave_data, start_time)
 
 
-    def __capture_wave(self, wave_data):
+    def __capture_wave(self, wave_data, start_time):
         try:
             capture_param = self.__gen_capture_param()
             self.__check_capture_size(capture_param)
             num_samples_to_waste = self.__calc_num_samples_to_waste(capture_param.capture_delay)
             samples = wave_data[num_samples_to_waste : capture_param.num_samples_to_process + num_samples_to_waste]
-            samples = dspmodule.dsp(samples, capture_param)
+            samples = dsp(samples, capture_param)
 
             is_classification_result = DspUnit.CLASSIFICATION in capture_param.dsp_units_enabled
             wr_data = self.__serialize_capture_data(samples, is_classification_result)
@@ -95,24 +115,50 @@ class CaptureUnit(object):
 
             with self.__state_lock:
                 if self.__state == CaptureUnitState.CAPTURE_WAVE:
-                    self.__state = CaptureUnitState.COMPLETE
+                    if self.__emulate_timing:
+                        num_words = ((num_samples_to_waste + capture_param.num_samples_to_process) /
+                                     CaptureParam.NUM_SAMPLES_IN_ADC_WORD)
+                        self.__complete_time = start_time + num_words * WORD_PERIOD
+                    else:
+                        self.__state = CaptureUnitState.COMPLETE
         except Exception as e:
             print('ERR [capture_wave] : {}'.format(e), file = sys.stderr)
             print('The e7awg_hw emulator has stopped!\n', file = sys.stderr)
             raise
 
 
+    def __update_state(self):
+        """キャプチャが完了する時刻を過ぎていれば complete 状態にする"""
+        if self.__complete_time is None:
+            return
+        with self.__state_lock:
+            if (self.__complete_time is not None) and (self.__complete_time <= time.perf_counter()):
+                if self.__state == CaptureUnitState.CAPTURE_WAVE:
+                    self.__state = CaptureUnitState.COMPLETE
+                self.__complete_time = None
+
+
     def __gen_capture_param(self):
+        param = self.__capture_param
+        if param is None:
+            param = self.__decode_capture_param()
+            self.__capture_param = param
+        return param
+
+
+    def __decode_capture_param(self):
         param = CaptureParam()
         # 積算区間数
         param.num_integ_sections = self.get_param(CaptureParamRegs.Offset.NUM_INTEG_SECTIONS)
         # 総和区間数
         num_sum_section = self.get_param(CaptureParamRegs.Offset.NUM_SUM_SECTIONS)
         # 総和区間長
-        for i in range(num_sum_section):
-            num_wave_words = self.get_param(CaptureParamRegs.Offset.sum_section_length(i))
-            num_balnk_words = self.get_param(CaptureParamRegs.Offset.post_blank_length(i))
-            param.add_sum_section(num_wave_words, num_balnk_words)
+        num_wave_words_list = self.__get_param_regs(
+            CaptureParamRegs.Offset.sum_section_length(0), num_sum_section).tolist()
+        num_blank_words_list = self.__get_param_regs(
+            CaptureParamRegs.Offset.post_blank_length(0), num_sum_section).tolist()
+        for num_wave_words, num_blank_words in zip(num_wave_words_list, num_blank_words_list):
+            param.add_sum_section(num_wave_words, num_blank_words)
         # 有効 DSP モジュール
         dsp_units = self.get_param(CaptureParamRegs.Offset.DSP_MODULE_ENABLE)
         dsp_units = list(filter(lambda unit_id: (dsp_units >> unit_id) & 0x1, DspUnit.all()))
@@ -120,41 +166,45 @@ class CaptureUnit(object):
         # キャプチャディレイ
         param.capture_delay = self.get_param(CaptureParamRegs.Offset.CAPTURE_DELAY)
         # 複素 FIR 係数
-        param.complex_fir_coefs = [complex(
-            self.__to_int32(self.get_param(CaptureParamRegs.Offset.comp_fir_re_coef(i))),
-            self.__to_int32(self.get_param(CaptureParamRegs.Offset.comp_fir_im_coef(i))))
-            for i in range(CaptureParam.NUM_COMPLEX_FIR_COEFS)]
+        param.complex_fir_coefs = self.__get_complex_coefs(
+            CaptureParamRegs.Offset.comp_fir_re_coef(0),
+            CaptureParamRegs.Offset.comp_fir_im_coef(0),
+            CaptureParam.NUM_COMPLEX_FIR_COEFS)
         # 実 FIR 係数
-        param.real_fir_i_coefs = [
-            self.__to_int32(self.get_param(CaptureParamRegs.Offset.real_fir_i_coef(i)))
-            for i in range(CaptureParam.NUM_REAL_FIR_COEFS)]
-        param.real_fir_q_coefs = [
-            self.__to_int32(self.get_param(CaptureParamRegs.Offset.real_fir_q_coef(i)))
-            for i in range(CaptureParam.NUM_REAL_FIR_COEFS)]
+        param.real_fir_i_coefs = self.__get_param_regs(
+            CaptureParamRegs.Offset.real_fir_i_coef(0), CaptureParam.NUM_REAL_FIR_COEFS).view(np.int32)
+        param.real_fir_q_coefs = self.__get_param_regs(
+            CaptureParamRegs.Offset.real_fir_q_coef(0), CaptureParam.NUM_REAL_FIR_COEFS).view(np.int32)
         # 複素窓係数
-        param.complex_window_coefs = [complex(
-            self.__to_int32(self.get_param(CaptureParamRegs.Offset.comp_window_re_coef(i))),
-            self.__to_int32(self.get_param(CaptureParamRegs.Offset.comp_window_im_coef(i))))
-            for i in range(CaptureParam.NUM_COMPLEXW_WINDOW_COEFS)]
+        param.complex_window_coefs = self.__get_complex_coefs(
+            CaptureParamRegs.Offset.comp_window_re_coef(0),
+            CaptureParamRegs.Offset.comp_window_im_coef(0),
+            CaptureParam.NUM_COMPLEXW_WINDOW_COEFS)
         # 総和開始ワード
         param.sum_start_word_no = self.get_param(CaptureParamRegs.Offset.SUM_START_TIME)
         # 総和ワード数
         sum_end_word_no = self.get_param(CaptureParamRegs.Offset.SUM_END_TIME)
         param.num_words_to_sum = sum_end_word_no - param.sum_start_word_no + 1
         # 四値化パラメータ
-        param.set_decision_func_params(
-            DecisionFunc.U0,
-            self.__rawbits_to_float(self.get_param(CaptureParamRegs.Offset.decision_func_params(0))),
-            self.__rawbits_to_float(self.get_param(CaptureParamRegs.Offset.decision_func_params(1))),
-            self.__rawbits_to_float(self.get_param(CaptureParamRegs.Offset.decision_func_params(2))))
-        param.set_decision_func_params(
-            DecisionFunc.U1,
-            self.__rawbits_to_float(self.get_param(CaptureParamRegs.Offset.decision_func_params(3))),
-            self.__rawbits_to_float(self.get_param(CaptureParamRegs.Offset.decision_func_params(4))),
-            self.__rawbits_to_float(self.get_param(CaptureParamRegs.Offset.decision_func_params(5))))
+        func_params = self.__get_param_regs(CaptureParamRegs.Offset.decision_func_params(0), 6).view(np.float32)
+        param.set_decision_func_params(DecisionFunc.U0, *func_params[0:3])
+        param.set_decision_func_params(DecisionFunc.U1, *func_params[3:6])
         return param
 
 
+    def __get_param_regs(self, addr, num_regs):
+        """addr から連続する num_regs 個のパラメータレジスタの値を uint32 の配列として取得する"""
+        reg_idx = addr // self.PARAM_REG_SIZE
+        return self.__param_regs[reg_idx : reg_idx + num_regs].copy()
+
+
+    def __get_complex_coefs(self, re_addr, im_addr, num_coefs):
+        """実部と虚部が別々のレジスタに格納された複素係数を取得する"""
+        re = self.__get_param_regs(re_addr, num_coefs).view(np.int32)
+        im = self.__get_param_regs(im_addr, num_coefs).view(np.int32)
+        return re + 1j * im
+
+
     def __calc_num_samples_to_waste(self, capture_delay):
         """キャプチャスタートから波形データの保存を開始するまでの間に捨てられるサンプル数を計算する"""
         num_samples = (self.__capture_start_delay + capture_delay + 1) * CaptureParam.NUM_SAMPLES_IN_ADC_WORD
@@ -201,7 +251,7 @@ class CaptureUnit(object):
         if num_integ_vec_elems > MAX_INTEG_VEC_ELEMS:
             msg = ("The number of elements in the capture unit {}'s integration result vector is too large.  (max = {}, setting = {})"
                     .format(self.__id, MAX_INTEG_VEC_ELEMS, num_integ_vec_elems))
-            log_error(msg, *self._loggers)
+            log_error(msg, *self.__loggers)
             raise ValueError(msg)
 
 
@@ -210,7 +260,7 @@ class CaptureUnit(object):
         if num_capture_samples > CaptureCtrl.MAX_CLASSIFICATION_RESULTS:
             msg = ('Capture unit {} has too many classification results.  (max = {}, setting = {})'
                 .format(self.__id, CaptureCtrl.MAX_CLASSIFICATION_RESULTS, num_capture_samples))
-            log_error(msg, *self._loggers)
+            log_error(msg, *self.__loggers)
             raise ValueError(msg)
 
 
@@ -219,7 +269,7 @@ class CaptureUnit(object):
         if num_capture_samples > CaptureCtrl.MAX_CAPTURE_SAMPLES:
                 msg = ('Capture unit {} has too many capture samples.  (max = {}, setting = {})'
                     .format(self.__id, CaptureCtrl.MAX_CAPTURE_SAMPLES, num_capture_samples))
-                log_error(msg, *self._loggers)
+                log_error(msg, *self.__loggers)
                 raise ValueError(msg)
 
 
@@ -232,38 +282,31 @@ class CaptureUnit(object):
                        .format(sum_sec_no, self.__id))
                 msg += ('If the number of capture words to be summed exceeds {}, the sum may overflow.  {} was set.\n'
                         .format(CaptureParam.MAX_SUM_RANGE_LEN, num_words_to_sum))
-                log_warning(msg, *self._loggers)
+                log_warning(msg, *self.__loggers)
                 print('WARNING: ' + msg)
 
 
     def __serialize_capture_data(self, data, is_classification_result):
-        serialized = bytearray()
         if is_classification_result:
-            rem = len(data) % 4
-            if rem != 0:
-                data = data + ([0] * (4 - rem))
-            for i in range(0, len(data), 4):
-                byte = 0xFF & ((data[i+3] << 6) | (data[i+2] << 4) | (data[i+1] << 2) | data[i])
-                serialized += struct.pack('<B', byte)
+            # 1 byte に 4 つの四値化結果を下位ビットから順に詰める
+            results = np.asarray(data, dtype = np.uint8) & 0x3
+            results = np.pad(results, (0, -len(results) % 4)).reshape(-1, 4)
+            serialized = (results[:, 0] | (results[:, 1] << 2) | (results[:, 2] << 4) | (results[:, 3] << 6)).tobytes()
         else:
-            for sample in data:
-                serialized += struct.pack('<f', sample[0])
-                serialized += struct.pack('<f', sample[1])
-        
-        rem = len(serialized) % 32
-        if rem != 0:
-            serialized += bytearray(32 - rem)
+            serialized = np.asarray(data, dtype = '<f4').tobytes()
 
-        return serialized
+        return serialized + bytes(-len(serialized) % 32)
 
 
     def is_complete(self):
         """キャプチャユニットが complete 状態かどうか調べる"""
+        self.__update_state()
         return self.__state == CaptureUnitState.COMPLETE
 
 
     def is_busy(self):
         """キャプチャユニットが busy 状態かどうか調べる"""
+        self.__update_state()
         return self.__state == CaptureUnitState.CAPTURE_WAVE
 
 
@@ -300,6 +343,8 @@ class CaptureUnit(object):
 
         reg_idx = addr // self.PARAM_REG_SIZE
         self.__param_regs[reg_idx] = data
+        if not self.__is_capture_param_unchanged(addr, 1):
+            self.__capture_param = None
 
 
     def get_param(self, addr):
@@ -323,7 +368,60 @@ class CaptureUnit(object):
             raise
         
         reg_idx = addr // self.PARAM_REG_SIZE
-        return self.__param_regs[reg_idx]
+        return int(self.__param_regs[reg_idx])
+
+
+    def set_params(self, addr, data):
+        """連続するキャプチャパラメータレジスタにまとめて値を設定する
+
+        Args:
+            addr (int): 先頭のパラメータレジスタのアドレス
+            data (bytes-like): 設定値.  各レジスタの値を 4 bytes ずつリトルエンディアンで並べたもの.
+        """
+        self.__check_param_range(addr, len(data))
+        vals = np.frombuffer(data, dtype = '<u4')
+        reg_idx = addr // self.PARAM_REG_SIZE
+        self.__param_regs[reg_idx : reg_idx + vals.size] = vals
+        if not self.__is_capture_param_unchanged(addr, vals.size):
+            self.__capture_param = None
+
+
+    def get_params(self, addr, num_regs):
+        """連続するキャプチャパラメータレジスタの値をまとめて取得する
+
+        Args:
+            addr (int): 先頭のパラメータレジスタのアドレス
+            num_regs (int): 取得するレジスタの数
+
+        Returns:
+            bytes: 各レジスタの値を 4 bytes ずつリトルエンディアンで並べたもの
+        """
+        self.__check_param_range(addr, num_regs * self.PARAM_REG_SIZE)
+        reg_idx = addr // self.PARAM_REG_SIZE
+        return self.__param_regs[reg_idx : reg_idx + num_regs].astype('<u4', copy = False).tobytes()
+
+
+    def __check_param_range(self, addr, num_bytes):
+        try:
+            if (addr % self.PARAM_REG_SIZE != 0) or (num_bytes % self.PARAM_REG_SIZE != 0):
+                raise ValueError(
+                    ('Capture parameter register address and access size must be multiples of {}.  ({}, {} bytes, CaptureUnit_{})'
+                    .format(self.PARAM_REG_SIZE, addr, num_bytes, self.__id)))
+
+            if (addr < 0) or (self.__NUM_PARAM_REGS * self.PARAM_REG_SIZE < addr + num_bytes):
+                raise ValueError(
+                    ('Capture parameter registers to access must be between 0x0 and 0x{:x}.  ({}, {} bytes, CaptureUnit_{})'
+                    .format(self.__NUM_PARAM_REGS * self.PARAM_REG_SIZE - 1, addr, num_bytes, self.__id)))
+        except Exception as e:
+            log_error(e, *self.__loggers)
+            raise
+
+
+    def __is_capture_param_unchanged(self, addr, num_regs):
+        """addr から連続する num_regs 個のレジスタの書き換えで CaptureParam の内容が変わらないか調べる"""
+        # キャプチャアドレスとキャプチャサンプル数は CaptureParam に含まれない
+        return ((CaptureParamRegs.Offset.CAPTURE_ADDR <= addr) and
+                (addr + num_regs * self.PARAM_REG_SIZE <= CaptureParamRegs.Offset.NUM_CAPTURED_SAMPLES + self.PARAM_REG_SIZE))
 
 
     def __set_default_params(self):
@@ -336,14 +434,6 @@ class CaptureUnit(object):
             self.set_param(post_blank_addr, 1)
 
 
-    def __to_int32(self, val):
-        val = val & 0xffffffff
-        return (val ^ 0x80000000) - 0x80000000
-
-
-    def __rawbits_to_float(self, val):
-        return np.frombuffer(val.to_bytes(4, 'little'), dtype='float32')[0]
-
 class CaptureUnitState(IntEnum):
     RESET = 0
     IDLE  = 1
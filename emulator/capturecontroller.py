@@ -1,4 +1,5 @@
 import sys
+import bisect
 import pathlib
 from register import RwRegister, RoRegister
 
@@ -16,6 +17,10 @@ class CaptureController(object):
         cap_unit_id : CaptureParamRegs.Addr.capture(cap_unit_id) for cap_unit_id in CaptureUnit.all() }
     __cap_unit_to_ctrl_reg_base_addr = { 
         cap_unit_id : CaptureCtrlRegs.Addr.capture(cap_unit_id) for cap_unit_id in CaptureUnit.all() }
+    __REG_SIZE = 4 # bytes
+    # キャプチャパラメータのアドレスからキャプチャユニットを引くための, ベースアドレス順に並べたキャプチャユニットとそのベースアドレスのリスト
+    __param_cap_unit_id_list = sorted(CaptureUnit.all(), key = CaptureParamRegs.Addr.capture)
+    __param_base_addr_list = [CaptureParamRegs.Addr.capture(cap_unit_id) for cap_unit_id in __param_cap_unit_id_list]
 
     def __init__(self):
         self.__cap_units = {}
@@ -87,6 +92,46 @@ class CaptureController(object):
         raise ValueError(msg)
 
 
+    def write_regs(self, addr, data):
+        """addr から連続するレジスタにまとめて値を書き込む
+
+        Args:
+            addr (int): 先頭のレジスタのアドレス
+            data (bytes-like): 書き込む値.  各レジスタの値を 4 bytes ずつリトルエンディアンで並べたもの.
+        """
+        data = memoryview(data)
+        for cap_unit_id, start, end in self.__split_by_param_region(addr, len(data)):
+            chunk = data[start - addr : end - addr]
+            if cap_unit_id is None:
+                # パラメータ以外のレジスタは書き込み時の動作があるので 1 つずつ書き込む
+                for reg_addr in range(start, end, self.__REG_SIZE):
+                    pos = reg_addr - start
+                    self.write_reg(reg_addr, int.from_bytes(chunk[pos : pos + self.__REG_SIZE], 'little'))
+            elif cap_unit_id in self.__cap_units:
+                self.__cap_units[cap_unit_id].set_params(start - self.__cap_unit_to_param_base_addr[cap_unit_id], chunk)
+
+
+    def read_regs(self, addr, num_bytes):
+        """addr から連続するレジスタの値をまとめて読み出す
+
+        Args:
+            addr (int): 先頭のレジスタのアドレス
+            num_bytes (int): 読み出すバイト数
+
+        Returns:
+            bytearray: 各レジスタの値を 4 bytes ずつリトルエンディアンで並べたもの
+        """
+        rd_data = bytearray()
+        for cap_unit_id, start, end in self.__split_by_param_region(addr, num_bytes):
+            if (cap_unit_id is not None) and (cap_unit_id in self.__cap_units):
+                rd_data += self.__cap_units[cap_unit_id].get_params(
+                    start - self.__cap_unit_to_param_base_addr[cap_unit_id], (end - start) // self.__REG_SIZE)
+            else:
+                for reg_addr in range(start, end, self.__REG_SIZE):
+                    rd_data += self.read_reg(reg_addr).to_bytes(self.__REG_SIZE, 'little')
+        return rd_data
+
+
     def on_wave_generated(self, awg_id_list, cap_mod_to_wave):
         """AWG が波形データを生成した時のイベントハンドラ
         Args:
@@ -239,13 +284,11 @@ class CaptureController(object):
 
     def __write_capture_param(self, addr, val):
         """キャプチャパラメータ書き込み"""
-        cap_unit_id_list = reversed(CaptureUnit.all())
-        for cap_unit_id in cap_unit_id_list:
-            param_base_addr = self.__cap_unit_to_param_base_addr[cap_unit_id]
-            if addr >= param_base_addr:
-                if cap_unit_id in self.__cap_units:
-                    self.__cap_units[cap_unit_id].set_param(addr - param_base_addr, val)
-                return True
+        cap_unit_id = self.__find_cap_unit_by_param_addr(addr)
+        if cap_unit_id is not None:
+            if cap_unit_id in self.__cap_units:
+                self.__cap_units[cap_unit_id].set_param(addr - self.__cap_unit_to_param_base_addr[cap_unit_id], val)
+            return True
 
 
     def __write_ctrl_reg(self, addr, val):
@@ -258,12 +301,33 @@ class CaptureController(object):
 
     def __read_wave_param(self, addr):
         """キャプチャパラメータ読み出し"""
-        cap_unit_id_list = reversed(CaptureUnit.all())
-        for cap_unit_id in cap_unit_id_list:
-            param_base_addr = self.__cap_unit_to_param_base_addr[cap_unit_id]
-            if addr >= param_base_addr:
-                if cap_unit_id in self.__cap_units:
-                    return self.__cap_units[cap_unit_id].get_param(addr - param_base_addr)
+        cap_unit_id = self.__find_cap_unit_by_param_addr(addr)
+        if (cap_unit_id is not None) and (cap_unit_id in self.__cap_units):
+            return self.__cap_units[cap_unit_id].get_param(addr - self.__cap_unit_to_param_base_addr[cap_unit_id])
+
+
+    def __find_cap_unit_by_param_addr(self, addr):
+        """addr を含むキャプチャパラメータ領域のキャプチャユニット ID を返す.  addr がキャプチャパラメータ領域に含まれない場合は None."""
+        idx = bisect.bisect_right(self.__param_base_addr_list, addr) - 1
+        return self.__param_cap_unit_id_list[idx] if idx >= 0 else None
+
+
+    def __split_by_param_region(self, addr, num_bytes):
+        """[addr, addr + num_bytes) の範囲をキャプチャユニットごとのキャプチャパラメータ領域とそれ以外に分割する
+
+        Returns:
+            list of (CaptureUnit or None, int, int):
+                | 分割した範囲を持つキャプチャユニットの ID (パラメータ以外のレジスタの範囲は None) と, その範囲の先頭と末尾 + 1 のアドレス
+        """
+        end = addr + num_bytes
+        regions = []
+        while addr < end:
+            idx = bisect.bisect_right(self.__param_base_addr_list, addr)
+            region_end = self.__param_base_addr_list[idx] if idx < len(self.__param_base_addr_list) else end
+            region_end = min(region_end, end)
+            regions.append((self.__param_cap_unit_id_list[idx - 1] if idx > 0 else None, addr, region_end))
+            addr = region_end
+        return regions
 
 
     def __read_ctrl_reg(self, addr):
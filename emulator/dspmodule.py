@@ -1,3 +1,9 @@
+"""
+キャプチャユニットの DSP の逐次処理版のモデル.
+
+| エミュレータとテストは e7awgsw.dspmodel のベクトル化された実装を使う.
+| このモジュールは, e7awgsw.dspmodel の結果と突き合わせるための参照実装として残している.
+"""
 import pathlib
 import sys
 import numpy as np
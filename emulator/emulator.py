@@ -8,10 +8,13 @@ from hbm import Hbm
 from awgcontroller import AwgController
 from capturecontroller import CaptureController
 from upldispatcher import UplDispatcher
+from timing import LinkModel
+from faultmodel import FaultModel, FaultRates
 
 lib_path = str(pathlib.Path(__file__).resolve().parents[1])
 sys.path.append(lib_path)
 from e7awgsw import CaptureUnit, CaptureModule, AWG
+from e7awgsw.uplpacket import UplPacket
 
 CAPTURE_START_DELAY = 31 # キャプチャスタートからキャプチャディレイをカウントし始めるまでの準備時間 (単位 : ワード)
 
@@ -35,26 +38,74 @@ def on_wave_generated(awg_id_to_wave, cap_ctrl):
     cap_ctrl.on_wave_generated(awg_id_to_wave.keys(), cap_mod_to_wave)
 
 
+def parse_fault_spec(spec):
+    """'モード名:drop=確率,dup=確率,delay=確率,reorder=確率' 形式の文字列を (モード ID, FaultRates) に変換する
+
+    | モード名は UplPacket のモード定数の名前から 'MODE_' を除いて小文字にしたもの (例 : wave_ram_read_reply).
+    | 全てのモードを対象にする場合は 'all' とする.
+    """
+    mode_name, _, rates_spec = spec.partition(':')
+    if mode_name == 'all':
+        mode = None
+    else:
+        mode = getattr(UplPacket, 'MODE_' + mode_name.upper(), None)
+        if not isinstance(mode, int):
+            raise ValueError('Unknown packet mode {}'.format(mode_name))
+
+    arg_names = { 'drop' : 'drop', 'dup' : 'duplicate', 'delay' : 'delay', 'reorder' : 'reorder' }
+    rates = {}
+    for item in filter(None, rates_spec.split(',')):
+        name, _, val = item.partition('=')
+        if name not in arg_names:
+            raise ValueError('Unknown fault type {}'.format(name))
+        rates[arg_names[name]] = float(val)
+    return mode, FaultRates(**rates)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--ipaddr', default='0.0.0.0')
+    parser.add_argument(
+        '--emulate-timing', action='store_true',
+        help='keep AWGs and capture units busy for the time the real hardware takes to output and capture waves')
+    parser.add_argument('--rtt', type=float, default=0, help='round trip time of the UDP link [us]')
+    parser.add_argument('--jitter', type=float, default=0, help='max one-way jitter of the UDP link [us]')
+    parser.add_argument('--bandwidth', type=float, default=None, help='bandwidth of the UDP link [Mbps]')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for the jitter and the faults')
+    parser.add_argument(
+        '--fault', action='append', default=[],
+        help="fault rates for a packet mode.  'MODE:drop=RATE,dup=RATE,delay=RATE,reorder=RATE'.  " +
+             "MODE is 'all' or a packet mode name such as 'wave_ram_read_reply'")
+    parser.add_argument('--fault-delay', type=float, default=100, help='delay of delayed packets [ms]')
+    parser.add_argument('--reorder-window', type=float, default=1000, help='max delay of reordered packets [us]')
     args = parser.parse_args()
 
     hbm = Hbm(0x200000000)
     
     cap_ctrl = CaptureController()
     for cap_unit_id in CaptureUnit.all():
-        cap_unit = capture.CaptureUnit(cap_unit_id, hbm.write, CAPTURE_START_DELAY)
+        cap_unit = capture.CaptureUnit(
+            cap_unit_id, hbm.write, CAPTURE_START_DELAY, emulate_timing = args.emulate_timing)
         cap_ctrl.add_capture_unit(cap_unit)
 
     awg_ctrl = AwgController()
     awg_ctrl.add_on_wave_generated(
         lambda awg_id_to_wave : on_wave_generated(awg_id_to_wave, cap_ctrl))
     for awg_id in AWG.all():
-        awg = Awg(awg_id, hbm.read)
+        awg = Awg(awg_id, hbm.read, emulate_timing = args.emulate_timing)
         awg_ctrl.add_awg(awg)
 
-    upl_dispatcher = UplDispatcher(args.ipaddr, hbm, awg_ctrl, cap_ctrl)
+    link_model = LinkModel(
+        rtt = args.rtt * 1e-6,
+        jitter = args.jitter * 1e-6,
+        bandwidth = None if args.bandwidth is None else args.bandwidth * 1e6 / 8,
+        seed = args.seed)
+    fault_model = FaultModel(
+        dict(parse_fault_spec(spec) for spec in args.fault),
+        delay_time = args.fault_delay * 1e-3,
+        reorder_window = args.reorder_window * 1e-6,
+        seed = args.seed)
+    upl_dispatcher = UplDispatcher(args.ipaddr, hbm, awg_ctrl, cap_ctrl, link_model, fault_model)
     upl_dispatcher.start()
 
     print('The emulator has been started.')
@@ -0,0 +1,133 @@
+import sys
+import random
+import threading
+import pathlib
+
+lib_path = str(pathlib.Path(__file__).resolve().parents[1])
+sys.path.append(lib_path)
+from e7awgsw.logger import get_file_logger, get_stderr_logger, log_error
+
+
+class FaultRates(object):
+    """1 種類のパケットに加える障害の発生確率"""
+
+    def __init__(self, drop = 0, duplicate = 0, delay = 0, reorder = 0):
+        """
+        Args:
+            drop (int or float): パケットを捨てる確率
+            duplicate (int or float): パケットを 2 回届ける確率
+            delay (int or float): パケットを FaultModel の delay_time だけ遅らせて届ける確率
+            reorder (int or float): パケットを後続のパケットに追い越させる確率
+        """
+        for name, rate in (('drop', drop), ('duplicate', duplicate), ('delay', delay), ('reorder', reorder)):
+            if not (isinstance(rate, (int, float)) and (0 <= rate <= 1)):
+                msg = "'{}' rate must be between 0 and 1 inclusive.  '{}' was set.".format(name, rate)
+                log_error(msg, get_file_logger(), get_stderr_logger())
+                raise ValueError(msg)
+
+        self.__drop = drop
+        self.__duplicate = duplicate
+        self.__delay = delay
+        self.__reorder = reorder
+
+
+    @property
+    def drop(self):
+        return self.__drop
+
+
+    @property
+    def duplicate(self):
+        return self.__duplicate
+
+
+    @property
+    def delay(self):
+        return self.__delay
+
+
+    @property
+    def reorder(self):
+        return self.__reorder
+
+
+    def __str__(self):
+        return 'drop = {}, duplicate = {}, delay = {}, reorder = {}'.format(
+            self.__drop, self.__duplicate, self.__delay, self.__reorder)
+
+
+class FaultModel(object):
+    """パケットの種類ごとに指定した確率で, UplDispatcher が送受信するパケットに障害を加える
+
+    | 障害の種類は以下の通り.
+    |   drop : パケットを捨てる.
+    |   duplicate : 同じパケットを 2 回届ける.  複製したパケットにも delay と reorder を個別に適用する.
+    |   delay : パケットを delay_time 秒遅らせて届ける.  後続のパケットはこのパケットを待たない.
+    |   reorder : パケットを [0, reorder_window] 秒の一様乱数の時間だけ遅らせて届ける.  後続のパケットはこのパケットを待たない.
+    """
+
+    def __init__(self, mode_to_rates, delay_time = 0.1, reorder_window = 1e-3, seed = None):
+        """
+        Args:
+            mode_to_rates ({int or None -> FaultRates}):
+                | key = パケットのモード ID.  None の場合, 他の key で指定されなかった全てのモード.
+                | value = そのモードのパケットに加える障害の発生確率
+            delay_time (int or float): delay の障害で遅らせる時間 (単位 : 秒)
+            reorder_window (int or float): reorder の障害で遅らせる時間の最大値 (単位 : 秒)
+            seed (int): 障害を加えるかどうかの判定に使う乱数のシード
+        """
+        self.__loggers = [get_file_logger(), get_stderr_logger()]
+        try:
+            if not all(isinstance(rates, FaultRates) for rates in mode_to_rates.values()):
+                raise ValueError('Invalid fault rates {}'.format(mode_to_rates))
+            if (not isinstance(delay_time, (int, float))) or (delay_time < 0):
+                raise ValueError('Invalid delay time {}'.format(delay_time))
+            if (not isinstance(reorder_window, (int, float))) or (reorder_window < 0):
+                raise ValueError('Invalid reorder window {}'.format(reorder_window))
+        except Exception as e:
+            log_error(e, *self.__loggers)
+            raise
+
+        self.__mode_to_rates = dict(mode_to_rates)
+        self.__delay_time = delay_time
+        self.__reorder_window = reorder_window
+        self.__rand = random.Random(seed)
+        self.__lock = threading.Lock()
+
+
+    @property
+    def is_enabled(self):
+        """障害を加えるかどうか"""
+        return any(
+            (rates.drop > 0) or (rates.duplicate > 0) or (rates.delay > 0) or (rates.reorder > 0)
+            for rates in self.__mode_to_rates.values())
+
+
+    def gen_deliveries(self, mode):
+        """mode のパケット 1 つをどのように届けるか決める
+
+        Args:
+            mode (int): パケットのモード ID
+
+        Returns:
+            list of (float, bool):
+                | 届ける各パケットの (追加の遅延時間 [秒], 後続のパケットとの順序を保つかどうか) のリスト.
+                | 空のリストはパケットを捨てることを表す.
+        """
+        rates = self.__mode_to_rates.get(mode, self.__mode_to_rates.get(None))
+        if rates is None:
+            return [(0, True)]
+
+        with self.__lock:
+            if self.__rand.random() < rates.drop:
+                return []
+            num_copies = 2 if self.__rand.random() < rates.duplicate else 1
+            deliveries = []
+            for _ in range(num_copies):
+                if self.__rand.random() < rates.delay:
+                    deliveries.append((self.__delay_time, False))
+                elif self.__rand.random() < rates.reorder:
+                    deliveries.append((self.__rand.uniform(0, self.__reorder_window), False))
+                else:
+                    deliveries.append((0, True))
+            return deliveries
@@ -0,0 +1,135 @@
+import sys
+import time
+import random
+import threading
+import heapq
+import pathlib
+
+lib_path = str(pathlib.Path(__file__).resolve().parents[1])
+sys.path.append(lib_path)
+from e7awgsw.logger import get_file_logger, get_stderr_logger, log_error
+
+# AWG とキャプチャユニットが 1 ワードを処理する時間 (単位 : 秒)
+WORD_PERIOD = 8e-9
+
+
+class LinkModel(object):
+    """ホストとエミュレータの間の UDP 通信路の遅延を計算する
+
+    | パケットがホストからエミュレータ (もしくはその逆方向) に届くまでの時間は,
+    |   帯域で決まる送信時間 + RTT / 2 + [0, jitter] の一様乱数
+    | とする.  送信時間は方向ごとに, それまでに送ったパケットが通信路を占有する時間も含む.
+    """
+
+    UPLINK = 0   # ホスト -> エミュレータ
+    DOWNLINK = 1 # エミュレータ -> ホスト
+
+    def __init__(self, rtt = 0, jitter = 0, bandwidth = None, seed = None):
+        """
+        Args:
+            rtt (int or float): 通信路の往復遅延時間 (単位 : 秒)
+            jitter (int or float): 片道ごとに加える遅延時間の揺らぎの最大値 (単位 : 秒)
+            bandwidth (int or float): 通信路の帯域 (単位 : bytes/秒).  None の場合, 帯域の制限を行わない.
+            seed (int): jitter に使う乱数のシード
+        """
+        self.__loggers = [get_file_logger(), get_stderr_logger()]
+        try:
+            if (not isinstance(rtt, (int, float))) or (rtt < 0):
+                raise ValueError('Invalid RTT {}'.format(rtt))
+            if (not isinstance(jitter, (int, float))) or (jitter < 0):
+                raise ValueError('Invalid jitter {}'.format(jitter))
+            if (bandwidth is not None) and ((not isinstance(bandwidth, (int, float))) or (bandwidth <= 0)):
+                raise ValueError('Invalid bandwidth {}'.format(bandwidth))
+        except Exception as e:
+            log_error(e, *self.__loggers)
+            raise
+
+        self.__one_way_delay = rtt / 2
+        self.__jitter = jitter
+        self.__bandwidth = bandwidth
+        self.__rand = random.Random(seed)
+        # 方向ごとの通信路が空く時刻
+        self.__link_free_time = [0, 0]
+        self.__lock = threading.Lock()
+
+
+    @property
+    def is_enabled(self):
+        """遅延を加えるかどうか"""
+        return (self.__one_way_delay > 0) or (self.__jitter > 0) or (self.__bandwidth is not None)
+
+
+    def arrival_time(self, direction, num_bytes):
+        """今送信した num_bytes bytes のパケットが相手に届く時刻を返す
+
+        Args:
+            direction (int): パケットの送信方向 (UPLINK or DOWNLINK)
+            num_bytes (int): パケットのサイズ (bytes)
+
+        Returns:
+            float: パケットが届く時刻 (time.perf_counter() の値)
+        """
+        now = time.perf_counter()
+        with self.__lock:
+            sent_time = now
+            if self.__bandwidth is not None:
+                sent_time = max(now, self.__link_free_time[direction]) + num_bytes / self.__bandwidth
+                self.__link_free_time[direction] = sent_time
+            return sent_time + self.__one_way_delay + self.__rand.uniform(0, self.__jitter)
+
+
+class DelayLine(object):
+    """登録された処理を, 指定された時刻になってから実行する"""
+
+    def __init__(self, name):
+        """
+        Args:
+            name (str): 処理を実行するスレッドの名前
+        """
+        # (実行時刻, 登録順の通し番号, 処理) のヒープ
+        self.__heap = []
+        self.__seq_no = 0
+        # 最後に順序を保って登録した処理の実行時刻
+        self.__last_time = 0
+        self.__cond = threading.Condition()
+        self.__thread = threading.Thread(target = self.__run, name = name, daemon = True)
+        self.__thread.start()
+
+
+    def put(self, exec_time, action, keep_order = True):
+        """action を exec_time 以降に実行する
+
+        Args:
+            exec_time (float): action を実行する時刻 (time.perf_counter() の値)
+            action (callable): 実行する処理
+            keep_order (bool):
+                | True の場合, 先に keep_order = True で登録した処理より後に実行する.
+                | False の場合, 後から登録した処理に追い越されることがある.
+        """
+        with self.__cond:
+            if keep_order:
+                exec_time = max(self.__last_time, exec_time)
+                self.__last_time = exec_time
+            heapq.heappush(self.__heap, (exec_time, self.__seq_no, action))
+            self.__seq_no += 1
+            self.__cond.notify()
+
+
+    def __run(self):
+        try:
+            while True:
+                with self.__cond:
+                    while True:
+                        if not self.__heap:
+                            self.__cond.wait()
+                            continue
+                        wait = self.__heap[0][0] - time.perf_counter()
+                        if wait <= 0:
+                            break
+                        self.__cond.wait(wait)
+                    _, _, action = heapq.heappop(self.__heap)
+                action()
+        except Exception as e:
+            print('ERR [{}] : {}'.format(self.__thread.name, e), file = sys.stderr)
+            print('The e7awg_hw emulator has stopped!\n', file = sys.stderr)
+            raise
@@ -1,9 +1,11 @@
 import sys
+import time
 import socket
 import pathlib
 from concurrent.futures import ThreadPoolExecutor
 from awg import Awg
 import capture as cap
+from timing import LinkModel, DelayLine
 
 lib_path = str(pathlib.Path(__file__).resolve().parents[1])
 sys.path.append(lib_path)
@@ -16,7 +18,16 @@ class UplDispatcher:
 
     __BUF_SIZE = 16384
 
-    def __init__(self, ip_addr, hbm, awg_ctrl, cap_ctrl):
+    def __init__(self, ip_addr, hbm, awg_ctrl, cap_ctrl, link_model = None, fault_model = None):
+        """
+        Args:
+            ip_addr (str): パケットを受け付ける IP アドレス
+            hbm (Hbm): 波形 RAM とキャプチャ RAM をエミュレートする Hbm オブジェクト
+            awg_ctrl (AwgController): AWG のレジスタを管理する AwgController オブジェクト
+            cap_ctrl (CaptureController): キャプチャユニットのレジスタを管理する CaptureController オブジェクト
+            link_model (LinkModel): ホストとの間の通信路の遅延を計算する LinkModel オブジェクト.  None の場合, 遅延を加えない.
+            fault_model (FaultModel): 送受信するパケットに障害を加える FaultModel オブジェクト.  None の場合, 障害を加えない.
+        """
         self.__hbm = hbm
         self.__awg_ctrl = awg_ctrl
         self.__cap_ctrl = cap_ctrl
@@ -25,6 +36,17 @@ class UplDispatcher:
         self.__awg_cap_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.__awg_cap_sock.bind((ip_addr, AWG_REG_PORT))
         self.__executor = ThreadPoolExecutor(max_workers = 2)
+        self.__link_model = link_model if (link_model is not None) and link_model.is_enabled else None
+        self.__fault_model = fault_model if (fault_model is not None) and fault_model.is_enabled else None
+        self.__uplinks = None
+        self.__downlinks = None
+        if (self.__link_model is not None) or (self.__fault_model is not None):
+            self.__uplinks = {
+                self.__hbm_sock : DelayLine('hbm_uplink'),
+                self.__awg_cap_sock : DelayLine('awg_cap_uplink') }
+            self.__downlinks = {
+                self.__hbm_sock : DelayLine('hbm_downlink'),
+                self.__awg_cap_sock : DelayLine('awg_cap_downlink') }
         self.__loggers = [get_file_logger(), get_stderr_logger()]
 
 
@@ -40,98 +62,137 @@ class UplDispatcher:
         try:
             while True:
                 recv_data, src_addr = self.__hbm_sock.recvfrom(self.__BUF_SIZE)
-                recv_packet = UplPacket.deserialize(recv_data)
-                if recv_packet.mode() == UplPacket.MODE_WAVE_RAM_READ:
-                    self.__read_from_hbm(recv_packet, src_addr)
-                elif recv_packet.mode() == UplPacket.MODE_WAVE_RAM_WRITE:
-                    self.__write_to_hbm(recv_packet, src_addr)
-                else:
-                    msg = 'Invalid HBM access mode {}'.format(recv_packet.mode())
-                    log_error(msg, *self.__loggers)
-                    raise ValueError(msg)
+                self.__on_recv(self.__hbm_sock, self.__handle_hbm_packet, recv_data, src_addr)
         except Exception as e:
             print('ERR [process_hbm_packet] : {}'.format(e), file = sys.stderr)
             print('The e7awg_hw emulator has stopped!\n', file = sys.stderr)
             raise
 
 
+    def __handle_hbm_packet(self, recv_data, src_addr):
+        recv_packet = UplPacket.deserialize(recv_data)
+        if recv_packet.mode() == UplPacket.MODE_WAVE_RAM_READ:
+            self.__read_from_hbm(recv_packet, src_addr)
+        elif recv_packet.mode() == UplPacket.MODE_WAVE_RAM_WRITE:
+            self.__write_to_hbm(recv_packet, src_addr)
+        else:
+            msg = 'Invalid HBM access mode {}'.format(recv_packet.mode())
+            log_error(msg, *self.__loggers)
+            raise ValueError(msg)
+
+
     def __read_from_hbm(self, packet, reply_addr):
         rd_data = self.__hbm.read(packet.addr(), packet.num_bytes())
         reply = UplPacket(UplPacket.MODE_WAVE_RAM_READ_REPLY, packet.addr(), len(rd_data), rd_data)
-        self.__hbm_sock.sendto(reply.serialize(), reply_addr)
+        self.__send(self.__hbm_sock, reply.serialize(), reply_addr)
 
 
     def __write_to_hbm(self, packet, reply_addr):
         self.__hbm.write(packet.addr(), packet.payload())
         reply = UplPacket(UplPacket.MODE_WAVE_RAM_WRITE_ACK, packet.addr(), len(packet.payload()))
-        self.__hbm_sock.sendto(reply.serialize(), reply_addr)
+        self.__send(self.__hbm_sock, reply.serialize(), reply_addr)
 
 
     def __process_awg_cap_packet(self):
         try:
             while True:
                 recv_data, src_addr = self.__awg_cap_sock.recvfrom(self.__BUF_SIZE)
-                recv_packet = UplPacket.deserialize(recv_data)
-                if recv_packet.mode() == UplPacket.MODE_AWG_REG_READ:
-                    self.__read_awg_reg(recv_packet, src_addr)
-                elif recv_packet.mode() == UplPacket.MODE_AWG_REG_WRITE:
-                    self.__write_awg_reg(recv_packet, src_addr)
-                elif recv_packet.mode() == UplPacket.MODE_CAPTURE_REG_READ:
-                    self.__read_cap_reg(recv_packet, src_addr)
-                elif recv_packet.mode() == UplPacket.MODE_CAPTURE_REG_WRITE:
-                    self.__write_cap_reg(recv_packet, src_addr)
-                else:
-                    msg = 'Invalid register access mode {}'.format(recv_packet.mode())
-                    log_error(msg, *self.__loggers)
-                    raise ValueError(msg)
+                self.__on_recv(self.__awg_cap_sock, self.__handle_awg_cap_packet, recv_data, src_addr)
         except Exception as e:
             print('ERR [process_awg_cap_packet] : {}'.format(e), file = sys.stderr)
             print('The e7awg_hw emulator has stopped!\n', file = sys.stderr)
             raise
 
+
+    def __handle_awg_cap_packet(self, recv_data, src_addr):
+        recv_packet = UplPacket.deserialize(recv_data)
+        if recv_packet.mode() == UplPacket.MODE_AWG_REG_READ:
+            self.__read_awg_reg(recv_packet, src_addr)
+        elif recv_packet.mode() == UplPacket.MODE_AWG_REG_WRITE:
+            self.__write_awg_reg(recv_packet, src_addr)
+        elif recv_packet.mode() == UplPacket.MODE_CAPTURE_REG_READ:
+            self.__read_cap_reg(recv_packet, src_addr)
+        elif recv_packet.mode() == UplPacket.MODE_CAPTURE_REG_WRITE:
+            self.__write_cap_reg(recv_packet, src_addr)
+        else:
+            msg = 'Invalid register access mode {}'.format(recv_packet.mode())
+            log_error(msg, *self.__loggers)
+            raise ValueError(msg)
+
+
+    def __on_recv(self, sock, handler, recv_data, src_addr):
+        """sock で受信したパケットを handler で処理する.
+
+        | 通信路の遅延を加える場合は, パケットが届く時刻まで処理を遅らせる.
+        | 障害を加える場合は, パケットを捨てたり, 複数回処理したりする.
+        """
+        if self.__uplinks is None:
+            handler(recv_data, src_addr)
+            return
+
+        arrival_time = self.__arrival_time(LinkModel.UPLINK, len(recv_data))
+        for extra_delay, keep_order in self.__gen_deliveries(recv_data):
+            self.__uplinks[sock].put(
+                arrival_time + extra_delay, lambda: handler(recv_data, src_addr), keep_order)
+
+
+    def __send(self, sock, data, dst_addr):
+        """sock からパケットを送信する.
+
+        | 通信路の遅延を加える場合は, パケットが届く時刻まで送信を遅らせる.
+        | 障害を加える場合は, パケットを捨てたり, 複数回送信したりする.
+        """
+        if self.__downlinks is None:
+            sock.sendto(data, dst_addr)
+            return
+
+        arrival_time = self.__arrival_time(LinkModel.DOWNLINK, len(data))
+        for extra_delay, keep_order in self.__gen_deliveries(data):
+            self.__downlinks[sock].put(
+                arrival_time + extra_delay, lambda: sock.sendto(data, dst_addr), keep_order)
+
+
+    def __arrival_time(self, direction, num_bytes):
+        if self.__link_model is None:
+            return time.perf_counter()
+        return self.__link_model.arrival_time(direction, num_bytes)
+
+
+    def __gen_deliveries(self, packet_data):
+        """packet_data をどのように届けるか決める.  (追加の遅延時間, 順序を保つかどうか) のリストを返す."""
+        if self.__fault_model is None:
+            return [(0, True)]
+        # パケットの先頭 1 byte がモード ID
+        return self.__fault_model.gen_deliveries(packet_data[0])
+
+
     def __read_awg_reg(self, packet, reply_addr):
         num_regs = packet.num_bytes() // Awg.PARAM_REG_SIZE
-        rd_data = bytearray()
-        for i in range(num_regs):
-            addr = packet.addr() + i * Awg.PARAM_REG_SIZE
-            val = self.__awg_ctrl.read_reg(addr)
-            rd_data += val.to_bytes(Awg.PARAM_REG_SIZE, 'little')
+        rd_data = self.__awg_ctrl.read_regs(packet.addr(), num_regs * Awg.PARAM_REG_SIZE)
 
         reply = UplPacket(UplPacket.MODE_AWG_REG_READ_REPLY, packet.addr(), len(rd_data), rd_data)
-        self.__awg_cap_sock.sendto(reply.serialize(), reply_addr)
+        self.__send(self.__awg_cap_sock, reply.serialize(), reply_addr)
 
 
     def __write_awg_reg(self, packet, reply_addr):
         num_regs = packet.num_bytes() // Awg.PARAM_REG_SIZE
-        for i in range(num_regs):
-            addr = packet.addr() + i * Awg.PARAM_REG_SIZE
-            val = packet.payload()[i * Awg.PARAM_REG_SIZE : (i + 1) * Awg.PARAM_REG_SIZE]
-            val = int.from_bytes(val, 'little')
-            self.__awg_ctrl.write_reg(addr, val)
+        self.__awg_ctrl.write_regs(packet.addr(), memoryview(packet.payload())[: num_regs * Awg.PARAM_REG_SIZE])
 
         reply = UplPacket(UplPacket.MODE_AWG_REG_WRITE_ACK, packet.addr(), len(packet.payload()))
-        self.__awg_cap_sock.sendto(reply.serialize(), reply_addr)
+        self.__send(self.__awg_cap_sock, reply.serialize(), reply_addr)
 
 
     def __read_cap_reg(self, packet, reply_addr):
         num_regs = packet.num_bytes() // cap.CaptureUnit.PARAM_REG_SIZE
-        rd_data = bytearray()
-        for i in range(num_regs):
-            addr = packet.addr() + i * cap.CaptureUnit.PARAM_REG_SIZE
-            val = self.__cap_ctrl.read_reg(addr)
-            rd_data += val.to_bytes(cap.CaptureUnit.PARAM_REG_SIZE, 'little')
+        rd_data = self.__cap_ctrl.read_regs(packet.addr(), num_regs * cap.CaptureUnit.PARAM_REG_SIZE)
 
         reply = UplPacket(UplPacket.MODE_CAPTURE_REG_READ_REPLY, packet.addr(), len(rd_data), rd_data)
-        self.__awg_cap_sock.sendto(reply.serialize(), reply_addr)
+        self.__send(self.__awg_cap_sock, reply.serialize(), reply_addr)
 
 
     def __write_cap_reg(self, packet, reply_addr):
         num_regs = packet.num_bytes() // cap.CaptureUnit.PARAM_REG_SIZE
-        for i in range(num_regs):
-            addr = packet.addr() + i * cap.CaptureUnit.PARAM_REG_SIZE
-            val = packet.payload()[i * cap.CaptureUnit.PARAM_REG_SIZE : (i + 1) * cap.CaptureUnit.PARAM_REG_SIZE]
-            val = int.from_bytes(val, 'little')
-            self.__cap_ctrl.write_reg(addr, val)
+        self.__cap_ctrl.write_regs(packet.addr(), memoryview(packet.payload())[: num_regs * cap.CaptureUnit.PARAM_REG_SIZE])
 
         reply = UplPacket(UplPacket.MODE_CAPTURE_REG_WRITE_ACK, packet.addr(), len(packet.payload()))
-        self.__awg_cap_sock.sendto(reply.serialize(), reply_addr)
+        self.__send(self.__awg_cap_sock, reply.serialize(), reply_addr)